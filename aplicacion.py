@@ -4,16 +4,18 @@
 # =====================================================
 
 import os
-import shutil
 from datetime import datetime
 from pathlib import Path
 
 import pandas as pd
 import streamlit as st
 
-from robot.downloader import descargar_sri
-from robot.parser import construir_reporte
-from robot.historial import registrar_descarga, obtener_historial   # ✅ FIX import correcto
+from robot.downloader import CONCURRENCIA_POR_DEFECTO, TIPOS_MAP, periodos_entre
+from robot.almacen import periodos_disponibles, rucs_disponibles, totales
+from robot.historial import obtener_historial, contar_historial, obtener_metricas
+from robot.indice import buscar as buscar_clave
+from robot.parser import ruta_reporte_parcial
+from robot.tareas import GestorTareas, EN_COLA, EJECUTANDO, FINALIZADA, ERROR
 
 # ==============================
 # CONFIGURACIÓN GENERAL
@@ -33,6 +35,94 @@ BASE_DIR = Path(__file__).parent
 DESC_DIR = BASE_DIR / "descargas"
 DESC_DIR.mkdir(exist_ok=True, parents=True)
 
+
+@st.cache_resource
+def gestor_tareas() -> GestorTareas:
+    """Un único gestor de tareas por proceso, compartido entre sesiones."""
+    return GestorTareas()
+
+
+def _boton_descarga(etiqueta: str, ruta, clave_widget: str):
+    if ruta and Path(ruta).exists():
+        with open(ruta, "rb") as f:
+            st.download_button(etiqueta, f, file_name=Path(ruta).name,
+                               use_container_width=True, key=clave_widget)
+
+
+def _mostrar_resultado(tarea: dict):
+    """Mensajes y botones de descarga de una tarea finalizada."""
+    resultado = tarea.get("resultado") or {}
+    estado = resultado.get("estado", "")
+    tid = tarea["id"]
+    if tarea.get("lote"):
+        st.success(
+            f"✅ Lote completado. XML: {resultado.get('n_xml', 0)} | PDF: {resultado.get('n_pdf', 0)} | "
+            f"Emitidos: {resultado.get('n_registros', 0)}"
+        )
+        st.dataframe(pd.DataFrame(resultado.get("resultados", [])), use_container_width=True)
+        if resultado.get("n_fallidas"):
+            st.warning(f"⚠️ {resultado['n_fallidas']} claves quedaron sin descargar (ver columna 'fallidas').")
+        _boton_descarga("📈 Descargar Excel consolidado del lote", resultado.get("reporte_lote"), f"lote_{tid}")
+    elif estado == "sin_descargas":
+        st.warning("⚠️ No se encontraron comprobantes para el período seleccionado.")
+    elif tarea["origen"] == "Emitidos":
+        st.success(f"✅ Reporte de emitidos generado con {resultado.get('n_registros', 0)} registros.")
+        _boton_descarga("📊 Descargar reporte Excel (Emitidos)", resultado.get("reporte"), f"rep_{tid}")
+    else:
+        st.success(f"✅ Descarga completada. XML: {resultado.get('n_xml', 0)} | PDF: {resultado.get('n_pdf', 0)}")
+        if resultado.get("n_duplicadas"):
+            st.info(f"♻️ {resultado['n_duplicadas']} comprobantes ya estaban descargados en otro período; "
+                    "no se volvieron a bajar ni se suman en este reporte.")
+        if resultado.get("n_fallidas"):
+            st.warning(f"⚠️ {resultado['n_fallidas']} claves no se pudieron descargar tras varios reintentos. "
+                       "Vuelve a ejecutar el período para reintentarlas: solo se piden las que faltan.")
+            _boton_descarga("📝 Descargar lista de claves fallidas", resultado.get("fallidas"), f"fall_{tid}")
+        _boton_descarga("⬇️ Descargar TXT semilla", resultado.get("txt"), f"txt_{tid}")
+        _boton_descarga("📈 Descargar reporte Excel (Recibidos)", resultado.get("reporte_excel"), f"xls_{tid}")
+        _boton_descarga("📦 Descargar ZIP completo", resultado.get("zip"), f"zip_{tid}")
+
+
+@st.fragment(run_every=3)
+def panel_tareas():
+    """Estado de las tareas de esta sesión; se refresca solo cada 3 segundos."""
+    ids = st.session_state.get("mis_tareas", [])
+    if not ids:
+        st.info("Aún no has enviado tareas en esta sesión.")
+        return
+    for id_tarea in ids:
+        tarea = gestor_tareas().obtener(id_tarea)
+        if not tarea:
+            continue
+        if tarea.get("lote"):
+            periodos = tarea["lote"]["periodos"]
+            (a0, m0), (a1, m1) = periodos[0], periodos[-1]
+            titulo = f"{tarea['ruc']} · Lote {m0:02d}/{a0}–{m1:02d}/{a1} · {tarea['tipo']} — {tarea['estado']}"
+        else:
+            titulo = f"{tarea['ruc']} · {tarea['origen']} · {tarea['tipo']} · {tarea['mes']:02d}/{tarea['anio']} — {tarea['estado']}"
+        with st.expander(titulo, expanded=tarea["estado"] in (EJECUTANDO, FINALIZADA)):
+            if tarea["estado"] == EN_COLA:
+                st.write("🕒 En cola, esperando un trabajador libre.")
+            elif tarea["estado"] == EJECUTANDO:
+                total = tarea.get("total") or 0
+                hechas = tarea.get("hechas") or 0
+                unidad = "Combinaciones" if tarea.get("lote") else "Claves"
+                st.progress(hechas / total if total else 0.0,
+                            text=f"{unidad} {hechas}/{total} · {(tarea.get('bytes') or 0) / 1_048_576:.1f} MB")
+                if tarea.get("eta_seg") is not None:
+                    st.caption(f"Tiempo restante estimado: {tarea['eta_seg']:.0f} s")
+                if not tarea.get("lote") and tarea["origen"] != "Emitidos":
+                    # Se regenera cada SRI_REPORTE_PARCIAL_SEG mientras avanza la descarga
+                    destino = DESC_DIR / tarea["ruc"] / f"{tarea['anio']:04d}" / f"{tarea['mes']:02d}"
+                    _boton_descarga("📄 Reporte parcial (en curso)", ruta_reporte_parcial(destino),
+                                    f"parcial_{id_tarea}")
+            elif tarea["estado"] == FINALIZADA:
+                _mostrar_resultado(tarea)
+            elif tarea["estado"] == ERROR:
+                st.error(f"❌ {tarea.get('error')}")
+            else:
+                st.warning(f"⚠️ {tarea.get('error') or tarea['estado']}")
+
+
 # ==============================
 # SIDEBAR CORPORATIVO
 # ==============================
@@ -59,111 +149,188 @@ tab1, tab2 = st.tabs(["📥 Descarga de Comprobantes", "📊 Reportes e Historia
 with tab1:
     st.markdown("#### 1️⃣ Ingreso de Credenciales y Filtros")
 
+    modo = st.radio("Modo de ejecución", ["Un período", "Lote (varios períodos y tipos)"], horizontal=True)
+    es_lote = modo.startswith("Lote")
+    anio_actual, mes_actual = datetime.now().year, datetime.now().month
+
     col1, col2, col3 = st.columns([2, 2, 1])
     with col1:
         ruc = st.text_input("RUC", placeholder="Ejemplo: 0999999999001")
         clave = st.text_input("Clave del SRI", type="password", placeholder="••••••••")
     with col2:
-        anio = st.number_input(
-            "Año", min_value=2015, max_value=datetime.now().year, value=datetime.now().year
-        )
-        mes = st.number_input(
-            "Mes (1–12)", min_value=1, max_value=12, value=datetime.now().month
-        )
+        if es_lote:
+            d1, d2 = st.columns(2)
+            with d1:
+                anio_desde = st.number_input("Año desde", min_value=2015, max_value=anio_actual, value=anio_actual)
+                anio = st.number_input("Año hasta", min_value=2015, max_value=anio_actual, value=anio_actual)
+            with d2:
+                mes_desde = st.number_input("Mes desde", min_value=1, max_value=12, value=1)
+                mes = st.number_input("Mes hasta", min_value=1, max_value=12, value=mes_actual)
+        else:
+            anio = st.number_input(
+                "Año", min_value=2015, max_value=anio_actual, value=anio_actual
+            )
+            mes = st.number_input(
+                "Mes (1–12)", min_value=1, max_value=12, value=mes_actual
+            )
     with col3:
-        tipo = st.selectbox(
-            "Tipo de comprobante",
-            ["Facturas", "Retenciones", "Notas de crédito", "Notas de débito", "Liquidación de compra"],
-        )
+        if es_lote:
+            tipos = st.multiselect("Tipos de comprobante", list(TIPOS_MAP), default=list(TIPOS_MAP))
+        else:
+            tipo = st.selectbox(
+                "Tipo de comprobante",
+                ["Facturas", "Retenciones", "Notas de crédito", "Notas de débito", "Liquidación de compra"],
+            )
 
-    col4, col5 = st.columns([2, 2])
+    col4, col5, col6 = st.columns([2, 2, 1])
     with col4:
-        origen = st.selectbox("Origen de comprobantes", ["Recibidos", "Emitidos"], index=0)
+        if es_lote:
+            origenes = st.multiselect("Orígenes de comprobantes", ["Recibidos", "Emitidos"], default=["Recibidos"])
+        else:
+            origen = st.selectbox("Origen de comprobantes", ["Recibidos", "Emitidos"], index=0)
     with col5:
         formatos = st.multiselect("Formatos a descargar", ["XML", "PDF"], default=["XML", "PDF"])
+    with col6:
+        concurrencia = st.number_input(
+            "Descargas simultáneas", min_value=1, max_value=8,
+            value=min(CONCURRENCIA_POR_DEFECTO, 8),
+            help="Páginas que descargan XML/PDF en paralelo (variable SRI_CONCURRENCIA).",
+        )
 
     st.markdown("---")
 
     if st.button("🚀 Iniciar proceso", use_container_width=True, type="primary"):
         if not ruc or not clave:
             st.warning("⚠️ Ingresa RUC y clave antes de continuar.")
+        elif es_lote:
+            periodos = periodos_entre(anio_desde, mes_desde, anio, mes)
+            if not periodos or not tipos or not origenes:
+                st.warning("⚠️ Revisa el rango de períodos, los tipos y los orígenes del lote.")
+            else:
+                id_tarea = gestor_tareas().enviar(
+                    ruc, clave, anio_desde, mes_desde, ", ".join(tipos), formatos, DESC_DIR,
+                    origen=", ".join(origenes), concurrencia=int(concurrencia),
+                    lote={"periodos": periodos, "tipos": tipos, "origenes": origenes},
+                )
+                st.session_state.setdefault("mis_tareas", []).insert(0, id_tarea)
+                st.success(
+                    f"🕒 Lote {id_tarea} en cola: {len(periodos)} períodos × {len(tipos)} tipos × "
+                    f"{len(origenes)} orígenes con un solo inicio de sesión."
+                )
         else:
             destino = DESC_DIR / ruc / f"{anio:04d}" / f"{mes:02d}"
-            destino.mkdir(parents=True, exist_ok=True)
-
-            with st.spinner(f"🔍 Conectando al SRI ({origen}) y procesando comprobantes..."):
-                resultado = descargar_sri(
-                    ruc, clave, anio, mes, tipo, formatos, destino, origen=origen
-                )
+            id_tarea = gestor_tareas().enviar(
+                ruc, clave, anio, mes, tipo, formatos, destino, origen=origen,
+                concurrencia=int(concurrencia),
+            )
+            st.session_state.setdefault("mis_tareas", []).insert(0, id_tarea)
+            st.success(f"🕒 Tarea {id_tarea} en cola ({origen} {mes:02d}/{anio}). Puedes seguir trabajando.")
 
-            # Registrar en historial
-            registrar_descarga(ruc, origen, anio, mes, tipo, resultado)
-
-            # Mostrar resultados dinámicos
-            estado = resultado.get("estado", "")
-            if estado == "sin_descargas":
-                st.warning("⚠️ No se encontraron comprobantes para el período seleccionado.")
-            elif origen == "Emitidos":
-                n_regs = resultado.get("n_registros", 0)
-                st.success(f"✅ Reporte de emitidos generado con {n_regs} registros.")
-                reporte_path = resultado.get("reporte")
-                if reporte_path and Path(reporte_path).exists():
-                    with open(reporte_path, "rb") as f:
-                        st.download_button(
-                            "📊 Descargar reporte Excel (Emitidos)",
-                            f,
-                            file_name=Path(reporte_path).name,
-                            use_container_width=True,
-                        )
-            else:
-                n_xml = resultado.get("n_xml", 0)
-                n_pdf = resultado.get("n_pdf", 0)
-                st.success(f"✅ Descarga completada. XML: {n_xml} | PDF: {n_pdf}")
-
-                txt_path = resultado.get("txt")
-                if txt_path and Path(txt_path).exists():
-                    with open(txt_path, "rb") as f:
-                        st.download_button(
-                            "⬇️ Descargar TXT semilla",
-                            f,
-                            file_name=Path(txt_path).name,
-                            use_container_width=True,
-                        )
-
-                if n_xml > 0:
-                    xml_folder = destino / "XML"
-                    excel_path = destino / f"reporte_{anio}_{mes:02d}.xlsx"
-                    construir_reporte(xml_folder, excel_path)
-                    if excel_path.exists():
-                        with open(excel_path, "rb") as f:
-                            st.download_button(
-                                "📈 Descargar reporte Excel (Recibidos)",
-                                f,
-                                file_name=excel_path.name,
-                                use_container_width=True,
-                            )
-
-                zip_path = destino.with_suffix(".zip")
-                shutil.make_archive(str(destino), "zip", destino)
-                if zip_path.exists():
-                    with open(zip_path, "rb") as f:
-                        st.download_button(
-                            "📦 Descargar ZIP completo",
-                            f,
-                            file_name=zip_path.name,
-                            use_container_width=True,
-                        )
+    st.markdown("#### 2️⃣ Tareas en curso y resultados")
+    panel_tareas()
 
 # =====================================================
 # TAB 2 — HISTORIAL Y REPORTE DE ACTIVIDAD
 # =====================================================
 with tab2:
     st.markdown("#### 📜 Historial de ejecuciones recientes")
-    historial = obtener_historial()
+
+    f1, f2, f3, f4 = st.columns([2, 1, 1, 1])
+    with f1:
+        filtro_ruc = st.text_input("Filtrar por RUC", key="hist_ruc").strip()
+    with f2:
+        filtro_anio = st.number_input("Año", min_value=0, max_value=datetime.now().year, value=0,
+                                      help="0 = todos", key="hist_anio")
+    with f3:
+        por_pagina = st.selectbox("Filas por página", [50, 100, 500], key="hist_por_pagina")
+
+    filtros = {"ruc": filtro_ruc or None, "anio": int(filtro_anio) or None}
+    total_hist = contar_historial(**filtros)
+    n_paginas = max(1, -(-total_hist // por_pagina))
+    with f4:
+        pagina = st.number_input("Página", min_value=1, max_value=n_paginas, value=1, key="hist_pagina")
+
+    historial = obtener_historial(**filtros, limite=por_pagina, desplazamiento=(pagina - 1) * por_pagina)
 
     # ✅ Evitar error “valor de verdad de un DataFrame es ambiguo”
     if isinstance(historial, pd.DataFrame) and not historial.empty:
         st.dataframe(historial, use_container_width=True)
-        st.success(f"📂 Total de operaciones registradas: {len(historial)}")
+        st.success(f"📂 Total de operaciones registradas: {total_hist} (página {pagina} de {n_paginas})")
     else:
         st.info("Aún no hay registros de descargas o reportes.")
+
+    # ⚡ Panel de rendimiento: tiempos por fase guardados con cada ejecución
+    with st.expander("⚡ Rendimiento de ejecuciones"):
+        df_metricas = obtener_metricas(**filtros, limite=por_pagina)
+        if df_metricas.empty:
+            st.info("Aún no hay ejecuciones con métricas registradas.")
+        else:
+            cols_fase = [c for c in df_metricas.columns if c.startswith("seg_") and c not in ("seg_total", "seg_por_clave")]
+            st.markdown("**Tiempo medio por fase (s)**")
+            st.bar_chart(df_metricas[cols_fase].mean().rename(lambda c: c.removeprefix("seg_")))
+            st.dataframe(df_metricas, use_container_width=True)
+            st.download_button(
+                "⬇️ Exportar métricas (JSON)",
+                df_metricas.to_json(orient="records", force_ascii=False),
+                file_name="metricas_ejecuciones.json",
+                use_container_width=True,
+            )
+
+    # =====================================================
+    # 🔑 BÚSQUEDA POR CLAVE DE ACCESO (ÍNDICE GLOBAL)
+    # =====================================================
+    st.markdown("#### 🔑 Buscar comprobante por clave de acceso")
+    clave_buscada = st.text_input("Clave de acceso (49 dígitos)", key="buscar_clave",
+                                  max_chars=49).strip()
+    if clave_buscada:
+        encontrados = buscar_clave(clave_buscada)
+        if not encontrados:
+            st.info("La clave no está en ninguna descarga de este servidor.")
+        for formato, entrada in sorted(encontrados.items()):
+            st.write(
+                f"**{formato}** · RUC {entrada['ruc']} · {entrada['mes'] or 0:02d}/{entrada['anio']} · "
+                f"parseo: {entrada['estado_parseo'] or '—'}"
+            )
+            if entrada.get("error"):
+                st.caption(entrada["error"])
+            _boton_descarga(f"⬇️ Descargar {formato}", entrada["ruta"], f"buscar_{formato}_{clave_buscada}")
+
+    # =====================================================
+    # 🗄️ ANÁLISIS ENTRE PERÍODOS (ALMACÉN PARQUET)
+    # =====================================================
+    st.markdown("#### 🗄️ Totales entre períodos")
+    periodos_alm = periodos_disponibles()
+    if not periodos_alm:
+        st.info("El almacén aún no tiene comprobantes; se llena al generar cada reporte.")
+    else:
+        etiquetas = [f"{m:02d}/{a}" for a, m in periodos_alm]
+        a1c, a2c, a3c = st.columns([2, 1, 1])
+        with a1c:
+            rucs_alm = st.multiselect("RUC", rucs_disponibles(), key="alm_rucs", help="vacío = todos")
+        with a2c:
+            por = st.selectbox("Agrupar por", ["emisor", "cliente"], key="alm_por",
+                               help="emisor: compras (Recibidos) · cliente: ventas (Emitidos)")
+        with a3c:
+            origen_alm = st.selectbox("Origen", ["Recibidos", "Emitidos", "Todos"], key="alm_origen",
+                                      index=0 if por == "emisor" else 1)
+        i0, i1 = st.select_slider("Rango de períodos", options=list(range(len(periodos_alm))),
+                                  value=(0, len(periodos_alm) - 1),
+                                  format_func=lambda i: etiquetas[i], key="alm_rango")
+        df_tot = totales(por, ruc=rucs_alm or None, origen=None if origen_alm == "Todos" else origen_alm,
+                         desde=periodos_alm[i0], hasta=periodos_alm[i1])
+        if df_tot.empty:
+            st.info("No hay comprobantes para esos filtros.")
+        else:
+            m1, m2, m3 = st.columns(3)
+            m1.metric("Comprobantes", f"{int(df_tot['comprobantes'].sum()):,}")
+            m2.metric("Total", f"$ {df_tot['total'].sum():,.2f}")
+            m3.metric("IVA", f"$ {df_tot['iva'].sum():,.2f}")
+            nombre = "razonSocialEmisor" if por == "emisor" else "razonSocialReceptor"
+            st.bar_chart(df_tot.head(15).set_index(nombre)["total"])
+            st.dataframe(df_tot, use_container_width=True)
+            st.download_button(
+                "⬇️ Exportar totales (CSV)",
+                df_tot.to_csv(index=False).encode("utf-8"),
+                file_name=f"totales_{por}_{etiquetas[i0].replace('/', '')}_{etiquetas[i1].replace('/', '')}.csv",
+                use_container_width=True,
+            )
@@ -0,0 +1,264 @@
+# =====================================================
+# 🧪 MÓDULO: CORPUS SINTÉTICO DE COMPROBANTES SRI
+# =====================================================
+# Genera, sin conexión, XMLs de comprobantes realistas para
+# todos los codDoc (factura, liquidación, notas, retención),
+# en sus variantes habituales: con espacio de nombres, sin él,
+# envueltos en <autorizacion> con el comprobante en CDATA y
+# archivos dañados; además del TXT semilla de "Descargar reporte".
+# Todo es determinista para una misma semilla.
+# =====================================================
+
+import random
+from datetime import date, timedelta
+from pathlib import Path
+
+# codDoc → (etiqueta raíz, nombre en el TXT del portal)
+TIPOS_DOC = {
+    "01": ("factura", "Factura"),
+    "03": ("liquidacionCompra", "Liquidación de compra de bienes y prestación de servicios"),
+    "04": ("notaCredito", "Notas de Crédito"),
+    "05": ("notaDebito", "Notas de Débito"),
+    "07": ("comprobanteRetencion", "Comprobante de Retención"),
+}
+
+# Proporción de cada variante de archivo en el corpus
+VARIANTES = {"plano": 0.45, "namespace": 0.15, "autorizacion": 0.35, "danado": 0.05}
+
+COLUMNAS_TXT = [
+    "COMPROBANTE", "SERIE_COMPROBANTE", "RUC_EMISOR", "RAZON_SOCIAL_EMISOR",
+    "FECHA_EMISION", "FECHA_AUTORIZACION", "TIPO_EMISION", "IDENTIFICACION_RECEPTOR",
+    "CLAVE_ACCESO", "NUMERO_AUTORIZACION", "IMPORTE_TOTAL",
+]
+
+_NOMBRES = ["Comercial", "Distribuidora", "Importadora", "Servicios", "Ferretería",
+            "Farmacias", "Constructora", "Agrícola", "Tecnología", "Transportes"]
+_APELLIDOS = ["Andina", "del Pacífico", "Núñez & Hijos", "Guayas", "Pichincha",
+              "El Ñandú", "Azuay", "Los Ríos", "Cía. Ltda.", "Oriente"]
+
+
+# =====================================================
+# 🔑 CLAVE DE ACCESO (49 DÍGITOS, MÓDULO 11)
+# =====================================================
+def _digito_verificador(base: str) -> int:
+    factores = [2, 3, 4, 5, 6, 7]
+    suma = sum(int(d) * factores[i % 6] for i, d in enumerate(reversed(base)))
+    dv = 11 - suma % 11
+    return {11: 0, 10: 1}.get(dv, dv)
+
+
+def clave_acceso(fecha: date, cod_doc: str, ruc: str, serie: str, secuencial: int,
+                 codigo: int, ambiente: str = "2") -> str:
+    base = f"{fecha:%d%m%Y}{cod_doc}{ruc}{ambiente}{serie}{secuencial:09d}{codigo:08d}1"
+    return base + str(_digito_verificador(base))
+
+
+# =====================================================
+# 🏷️ DATOS DE UN COMPROBANTE
+# =====================================================
+class _Generador:
+    def __init__(self, semilla: int, anio: int, mes: int, ruc_receptor: str, n_emisores: int = 200):
+        self.rnd = random.Random(semilla)
+        self.anio, self.mes = anio, mes
+        self.ruc_receptor = ruc_receptor
+        self.emisores = [
+            (f"{self.rnd.randint(1, 2499999999):010d}001",
+             f"{self.rnd.choice(_NOMBRES)} {self.rnd.choice(_APELLIDOS)} S.A.")
+            for _ in range(n_emisores)
+        ]
+
+    def comprobante(self, i: int) -> dict:
+        rnd = self.rnd
+        cod_doc = rnd.choices(list(TIPOS_DOC), weights=[70, 3, 10, 2, 15])[0]
+        ruc, razon = rnd.choice(self.emisores)
+        inicio = date(self.anio, self.mes, 1)
+        fecha = inicio + timedelta(days=rnd.randrange(28))
+        serie = f"{rnd.randint(1, 3):03d}{rnd.randint(1, 20):03d}"
+        detalles = [
+            {"codigo": f"P{rnd.randint(1, 9999):04d}",
+             "descripcion": f"Producto {rnd.randint(1, 500)}",
+             "cantidad": rnd.randint(1, 20),
+             "precio": round(rnd.uniform(0.5, 250), 2)}
+            for _ in range(rnd.randint(1, 8))
+        ]
+        subtotal = round(sum(d["cantidad"] * d["precio"] for d in detalles), 2)
+        iva = round(subtotal * 0.15, 2)
+        return {
+            "codDoc": cod_doc,
+            "ruc": ruc, "razonSocial": razon,
+            "fecha": fecha, "serie": serie, "secuencial": i + 1,
+            "clave": clave_acceso(fecha, cod_doc, ruc, serie, i + 1, rnd.randint(0, 99999999)),
+            "detalles": detalles,
+            "subtotal": subtotal, "iva": iva, "total": round(subtotal + iva, 2),
+        }
+
+
+# =====================================================
+# 📄 XML DEL COMPROBANTE
+# =====================================================
+def _info_tributaria(c: dict) -> str:
+    return (
+        "<infoTributaria><ambiente>2</ambiente><tipoEmision>1</tipoEmision>"
+        f"<razonSocial>{c['razonSocial'].replace('&', '&amp;')}</razonSocial>"
+        f"<ruc>{c['ruc']}</ruc><claveAcceso>{c['clave']}</claveAcceso>"
+        f"<codDoc>{c['codDoc']}</codDoc><estab>{c['serie'][:3]}</estab>"
+        f"<ptoEmi>{c['serie'][3:]}</ptoEmi><secuencial>{c['secuencial']:09d}</secuencial>"
+        "<dirMatriz>Av. Amazonas N34-123</dirMatriz></infoTributaria>"
+    )
+
+
+def _impuestos(c: dict, etiqueta: str = "totalImpuesto") -> str:
+    return (
+        f"<{etiqueta}><codigo>2</codigo><codigoPorcentaje>4</codigoPorcentaje>"
+        f"<baseImponible>{c['subtotal']:.2f}</baseImponible><valor>{c['iva']:.2f}</valor></{etiqueta}>"
+    )
+
+
+def _detalles(c: dict) -> str:
+    partes = []
+    for d in c["detalles"]:
+        total = d["cantidad"] * d["precio"]
+        partes.append(
+            f"<detalle><codigoPrincipal>{d['codigo']}</codigoPrincipal>"
+            f"<descripcion>{d['descripcion']}</descripcion><cantidad>{d['cantidad']}</cantidad>"
+            f"<precioUnitario>{d['precio']:.2f}</precioUnitario><descuento>0.00</descuento>"
+            f"<precioTotalSinImpuesto>{total:.2f}</precioTotalSinImpuesto>"
+            f"<impuestos><impuesto><codigo>2</codigo><codigoPorcentaje>4</codigoPorcentaje>"
+            f"<tarifa>15</tarifa><baseImponible>{total:.2f}</baseImponible>"
+            f"<valor>{total * 0.15:.2f}</valor></impuesto></impuestos></detalle>"
+        )
+    return f"<detalles>{''.join(partes)}</detalles>"
+
+
+def _cuerpo(c: dict, ruc_receptor: str) -> str:
+    raiz, _ = TIPOS_DOC[c["codDoc"]]
+    fecha = f"{c['fecha']:%d/%m/%Y}"
+    if c["codDoc"] == "07":
+        info = (
+            f"<infoCompRetencion><fechaEmision>{fecha}</fechaEmision>"
+            "<tipoIdentificacionSujetoRetenido>04</tipoIdentificacionSujetoRetenido>"
+            f"<razonSocialSujetoRetenido>EMPRESA AUDITADA S.A.</razonSocialSujetoRetenido>"
+            f"<identificacionSujetoRetenido>{ruc_receptor}</identificacionSujetoRetenido>"
+            f"<periodoFiscal>{c['fecha']:%m/%Y}</periodoFiscal></infoCompRetencion>"
+            "<impuestos>"
+            f"<impuesto><codigo>1</codigo><codigoRetencion>312</codigoRetencion>"
+            f"<baseImponible>{c['subtotal']:.2f}</baseImponible><porcentajeRetener>1.75</porcentajeRetener>"
+            f"<valorRetenido>{c['subtotal'] * 0.0175:.2f}</valorRetenido><codDocSustento>01</codDocSustento>"
+            f"<numDocSustento>001001{c['secuencial']:09d}</numDocSustento>"
+            f"<fechaEmisionDocSustento>{fecha}</fechaEmisionDocSustento></impuesto>"
+            f"<impuesto><codigo>2</codigo><codigoRetencion>2</codigoRetencion>"
+            f"<baseImponible>{c['iva']:.2f}</baseImponible><porcentajeRetener>30</porcentajeRetener>"
+            f"<valorRetenido>{c['iva'] * 0.3:.2f}</valorRetenido><codDocSustento>01</codDocSustento>"
+            f"<numDocSustento>001001{c['secuencial']:09d}</numDocSustento>"
+            f"<fechaEmisionDocSustento>{fecha}</fechaEmisionDocSustento></impuesto>"
+            "</impuestos>"
+        )
+        return f"<{raiz} id=\"comprobante\" version=\"1.0.0\">{_info_tributaria(c)}{info}</{raiz}>"
+
+    receptor = (
+        f"<razonSocialComprador>EMPRESA AUDITADA S.A.</razonSocialComprador>"
+        f"<identificacionComprador>{ruc_receptor}</identificacionComprador>"
+    )
+    if c["codDoc"] == "03":
+        receptor = (
+            f"<razonSocialProveedor>{c['razonSocial'].replace('&', '&amp;')}</razonSocialProveedor>"
+            f"<identificacionProveedor>{c['ruc']}</identificacionProveedor>"
+        )
+    if c["codDoc"] in ("04", "05"):
+        info_tag = "infoNotaCredito" if c["codDoc"] == "04" else "infoNotaDebito"
+        total_tag = "valorModificacion" if c["codDoc"] == "04" else "valorTotal"
+        impuestos = (f"<totalConImpuestos>{_impuestos(c)}</totalConImpuestos>" if c["codDoc"] == "04"
+                     else f"<impuestos>{_impuestos(c, 'impuesto')}</impuestos>")
+        info = (
+            f"<{info_tag}><fechaEmision>{fecha}</fechaEmision>{receptor}"
+            f"<codDocModificado>01</codDocModificado><numDocModificado>001-001-{c['secuencial']:09d}</numDocModificado>"
+            f"<totalSinImpuestos>{c['subtotal']:.2f}</totalSinImpuestos>{impuestos}"
+            f"<{total_tag}>{c['total']:.2f}</{total_tag}></{info_tag}>"
+        )
+        detalles = _detalles(c) if c["codDoc"] == "04" else ""
+        return f"<{raiz} id=\"comprobante\" version=\"1.1.0\">{_info_tributaria(c)}{info}{detalles}</{raiz}>"
+
+    info_tag = "infoFactura" if c["codDoc"] == "01" else "infoLiquidacionCompra"
+    info = (
+        f"<{info_tag}><fechaEmision>{fecha}</fechaEmision>{receptor}"
+        f"<totalSinImpuestos>{c['subtotal']:.2f}</totalSinImpuestos><totalDescuento>0.00</totalDescuento>"
+        f"<totalConImpuestos>{_impuestos(c)}</totalConImpuestos>"
+        f"<importeTotal>{c['total']:.2f}</importeTotal><moneda>DOLAR</moneda></{info_tag}>"
+    )
+    return f"<{raiz} id=\"comprobante\" version=\"1.1.0\">{_info_tributaria(c)}{info}{_detalles(c)}</{raiz}>"
+
+
+def xml_comprobante(c: dict, ruc_receptor: str, variante: str = "plano") -> str:
+    cuerpo = _cuerpo(c, ruc_receptor)
+    declaracion = '<?xml version="1.0" encoding="UTF-8"?>'
+    if variante == "namespace":
+        raiz, _ = TIPOS_DOC[c["codDoc"]]
+        cuerpo = cuerpo.replace(f"<{raiz} ", f'<{raiz} xmlns="http://www.sri.gob.ec/{raiz}" ', 1)
+    elif variante == "autorizacion":
+        cuerpo = (
+            "<autorizacion><estado>AUTORIZADO</estado>"
+            f"<numeroAutorizacion>{c['clave']}</numeroAutorizacion>"
+            f"<fechaAutorizacion>{c['fecha']:%Y-%m-%d}T10:15:00-05:00</fechaAutorizacion>"
+            "<ambiente>PRODUCCIÓN</ambiente>"
+            f"<comprobante><![CDATA[{declaracion}{cuerpo}]]></comprobante></autorizacion>"
+        )
+    elif variante == "danado":
+        return declaracion + cuerpo[: len(cuerpo) // 2]
+    return declaracion + cuerpo
+
+
+# =====================================================
+# 📦 CORPUS COMPLETO
+# =====================================================
+def generar_xmls(carpeta: Path, n: int, semilla: int = 2024, anio: int = 2024, mes: int = 1,
+                 ruc_receptor: str = "1790012345001") -> list:
+    """
+    Escribe `n` XMLs en `carpeta` con la mezcla de VARIANTES.
+    Devuelve los comprobantes generados (dicts) en orden.
+    """
+    carpeta = Path(carpeta)
+    carpeta.mkdir(parents=True, exist_ok=True)
+    gen = _Generador(semilla, anio, mes, ruc_receptor)
+    variantes = gen.rnd.choices(list(VARIANTES), weights=list(VARIANTES.values()), k=n)
+    comprobantes = []
+    for i, variante in enumerate(variantes):
+        c = gen.comprobante(i)
+        c["variante"] = variante
+        (carpeta / f"{c['clave']}.xml").write_text(xml_comprobante(c, ruc_receptor, variante), encoding="utf-8")
+        comprobantes.append(c)
+    return comprobantes
+
+
+def fila_txt(c: dict, ruc_receptor: str) -> str:
+    """Línea del TXT semilla (tabulada, sin salto de línea) para el comprobante `c`."""
+    return "\t".join([
+        TIPOS_DOC[c["codDoc"]][1],
+        f"{c['serie'][:3]}-{c['serie'][3:]}-{c['secuencial']:09d}",
+        c["ruc"], c["razonSocial"],
+        f"{c['fecha']:%d/%m/%Y}", f"{c['fecha']:%d/%m/%Y} 10:15:00",
+        "NORMAL", ruc_receptor, c["clave"], c["clave"],
+        f"{c['total']:.2f}",
+    ])
+
+
+def comprobantes(n: int, semilla: int = 2024, anio: int = 2024, mes: int = 1,
+                 ruc_receptor: str = "1790012345001"):
+    """Genera `n` comprobantes (dicts) del período, sin escribir archivos."""
+    gen = _Generador(semilla, anio, mes, ruc_receptor)
+    for i in range(n):
+        yield gen.comprobante(i)
+
+
+def generar_txt(ruta: Path, filas: int, semilla: int = 2024, anio: int = 2024, mes: int = 1,
+                ruc_receptor: str = "1790012345001", encoding: str = "utf-8") -> Path:
+    """
+    Escribe un TXT semilla como el de "Descargar reporte" (tabulado, con encabezado)
+    con `filas` comprobantes. Admite encoding="latin-1" como algunos reportes del portal.
+    """
+    ruta = Path(ruta)
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    with open(ruta, "w", encoding=encoding, newline="") as f:
+        f.write("\t".join(COLUMNAS_TXT) + "\r\n")
+        for c in comprobantes(filas, semilla, anio, mes, ruc_receptor):
+            f.write(fila_txt(c, ruc_receptor) + "\r\n")
+    return ruta
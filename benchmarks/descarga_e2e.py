@@ -0,0 +1,94 @@
+# =====================================================
+# 🚀 BENCHMARK DE PUNTA A PUNTA CONTRA EL PORTAL SIMULADO
+# =====================================================
+# Levanta el portal SRI simulado, apunta el robot a él y
+# ejecuta descargar_sri real (Chromium incluido) con varios
+# niveles de concurrencia. Reporta claves/s, tiempos por fase
+# y lo que vio el portal (peticiones, fallos, 429).
+#
+#   python -m benchmarks.descarga_e2e --comprobantes 300 --latencia-ms 200 --concurrencia 1 2 4
+#   python -m benchmarks.descarga_e2e --liviano --sin-ws        (modo liviano)
+# =====================================================
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.portal_simulado import RUTA_WS, ConfigPortal, PortalSimulado
+from robot import autorizacion_ws, downloader, indice, sesiones
+from robot.metricas import Metricas
+
+RUC_PRUEBA = "1790012345001"
+
+
+def ejecutar(config: ConfigPortal, concurrencias: list, anio: int = 2024, mes: int = 1,
+             formatos: list = None) -> list:
+    """Una corrida completa de Recibidos por nivel de concurrencia; devuelve un resumen por corrida."""
+    formatos = formatos or ["XML", "PDF"]
+    resumenes = []
+    with PortalSimulado(config) as portal, tempfile.TemporaryDirectory(prefix="sri_e2e_") as tmp:
+        downloader.configurar_url_base(portal.url)
+        autorizacion_ws.configurar_url(portal.url + RUTA_WS)
+        # Sesiones del portal simulado aparte de las reales
+        sesiones.SESIONES_DIR = Path(tmp) / ".sesiones"
+        for i, concurrencia in enumerate(concurrencias):
+            destino = Path(tmp) / f"{i}_c{concurrencia}" / RUC_PRUEBA / f"{anio:04d}" / f"{mes:02d}"
+            # Índice de claves vacío por nivel: si no, la corrida anterior deja todas
+            # las claves "en otra carpeta" y la siguiente no descarga nada
+            indice.INDICE_DB = Path(tmp) / f"indice_{i}_c{concurrencia}.sqlite3"
+            previas = dict(portal.estadisticas)
+            metricas = Metricas()
+            inicio = time.perf_counter()
+            resultado = downloader.descargar_sri(RUC_PRUEBA, "clave", anio, mes, "Facturas", formatos, destino,
+                                                 concurrencia=concurrencia, metricas=metricas)
+            segundos = time.perf_counter() - inicio
+            datos = metricas.a_dict()
+            claves = datos["contadores"].get("claves", 0)
+            resumenes.append({
+                "concurrencia": concurrencia,
+                "segundos": round(segundos, 2),
+                "claves": claves,
+                "claves_por_segundo": round(claves / segundos, 2) if segundos else 0.0,
+                "n_xml": resultado.get("n_xml", 0),
+                "n_pdf": resultado.get("n_pdf", 0),
+                "fallos": datos["contadores"].get("fallos", 0),
+                "fases": datos["fases"],
+                "portal": {k: v - previas[k] for k, v in portal.estadisticas.items()},
+            })
+    return resumenes
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark de descarga contra el portal SRI simulado.")
+    ap.add_argument("--comprobantes", type=int, default=200, help="comprobantes por período (antes de filtrar)")
+    ap.add_argument("--latencia-ms", type=int, default=100)
+    ap.add_argument("--jitter-ms", type=int, default=50)
+    ap.add_argument("--prob-fallo", type=float, default=0.0)
+    ap.add_argument("--max-rps", type=float, default=0)
+    ap.add_argument("--concurrencia", type=int, nargs="+", default=[1, 2, 4])
+    ap.add_argument("--formatos", nargs="+", default=["XML", "PDF"])
+    ap.add_argument("--sin-ws", action="store_true", help="XML por el navegador en lugar del web service")
+    ap.add_argument("--liviano", action="store_true",
+                    help="modo liviano: sin recursos pesados y formulario reutilizado entre claves")
+    ap.add_argument("--json", type=Path, help="escribe también el resumen en este archivo")
+    args = ap.parse_args(argv)
+
+    downloader.XML_POR_WS = not args.sin_ws
+    downloader.MODO_LIVIANO = args.liviano
+    config = ConfigPortal(args.comprobantes, args.latencia_ms, args.jitter_ms, args.prob_fallo, args.max_rps)
+    resumenes = ejecutar(config, args.concurrencia, formatos=args.formatos)
+
+    print(f"{'conc.':>6}{'claves':>8}{'seg':>9}{'claves/s':>10}{'fallos':>8}{'500':>6}{'429':>6}{'ws':>7}")
+    for r in resumenes:
+        print(f"{r['concurrencia']:>6}{r['claves']:>8}{r['segundos']:>9.2f}{r['claves_por_segundo']:>10.2f}"
+              f"{r['fallos']:>8}{r['portal']['fallos']:>6}{r['portal']['limitadas']:>6}{r['portal']['ws']:>7}")
+    if args.json:
+        args.json.write_text(json.dumps(resumenes, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
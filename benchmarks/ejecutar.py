@@ -0,0 +1,226 @@
+# =====================================================
+# ⏱️ BENCHMARKS DEL ROBOT (SIN CONEXIÓN)
+# =====================================================
+# Mide por etapa el tiempo, el rendimiento (elementos/s) y el
+# pico de memoria sobre un corpus sintético, y compara contra
+# una línea base guardada.
+#
+#   python -m benchmarks.ejecutar                     # medir y comparar
+#   python -m benchmarks.ejecutar --guardar-linea-base
+#   python -m benchmarks.ejecutar --xml 20000 --filas-txt 200000
+#
+# Sale con código 1 si alguna etapa es más lenta que la línea
+# base por encima de la tolerancia.
+# =====================================================
+
+import argparse
+import gc
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import pandas as pd
+
+from benchmarks.corpus import comprobantes, generar_txt, generar_xmls
+from robot import conciliacion, historial, indice, parser, txt_semilla
+from robot.downloader import _extraer_claves_desde_txt
+
+LINEA_BASE = Path(__file__).resolve().parent / "linea_base.json"
+TOLERANCIA = 0.20           # 20 % más lento que la línea base = regresión
+
+
+# =====================================================
+# 📐 MEDICIÓN
+# =====================================================
+def _medir(funcion, repeticiones: int) -> dict:
+    """
+    Ejecuta `funcion()` (que devuelve el nº de elementos procesados):
+    el mejor tiempo de `repeticiones` corridas sin trazas, y una corrida
+    aparte con tracemalloc para el pico de memoria (que sí lo ralentiza).
+    """
+    mejor, n = None, 0
+    for _ in range(repeticiones):
+        gc.collect()
+        inicio = time.perf_counter()
+        n = funcion()
+        seg = time.perf_counter() - inicio
+        mejor = seg if mejor is None else min(mejor, seg)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        funcion()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "elementos": n,
+        "segundos": round(mejor, 4),
+        "por_segundo": round(n / mejor, 1) if mejor else 0.0,
+        "pico_mb": round(pico / 1024 / 1024, 2),
+    }
+
+
+# =====================================================
+# 🧩 ETAPAS
+# =====================================================
+def _etapas(tmp: Path, n_xml: int, filas_txt: int, n_historial: int) -> dict:
+    carpeta_mes = tmp / "descargas" / "1790012345001" / "2024" / "01"
+    carpeta_xml = carpeta_mes / "XML"
+    generar_xmls(carpeta_xml, n_xml)
+    txt_utf8 = generar_txt(tmp / "semilla_utf8.txt", filas_txt)
+    txt_latin1 = generar_txt(tmp / "semilla_latin1.txt", filas_txt, encoding="latin-1")
+    xmls = sorted(carpeta_xml.glob("*.xml"))
+    excel = carpeta_mes / "reporte_2024_01.xlsx"
+    # construir_reporte consulta el índice de claves: también va a la base temporal
+    indice.INDICE_DB = tmp / "indice_claves.sqlite3"
+    cache = carpeta_mes / parser.CACHE_NOMBRE
+
+    def leer_xml():
+        for x in xmls:
+            parser._leer_xml(x)
+        return len(xmls)
+
+    def reporte_frio():
+        cache.unlink(missing_ok=True)
+        return len(parser.construir_reporte(carpeta_mes, excel))
+
+    def reporte_caliente():
+        return len(parser.construir_reporte(carpeta_mes, excel))
+
+    df_detalle, df_lineas, df_retenciones = parser._desanidar(parser._leer_lote([str(x) for x in xmls]))
+
+    def excel_reporte():
+        parser._escribir_reporte_recibidos(df_detalle, excel, df_lineas, df_retenciones)
+        return len(df_detalle)
+
+    # Conciliación TXT ↔ detalle con las mismas filas del TXT: 1 % sin XML,
+    # 1 % con otro total y algunos XML que el TXT no lista
+    semilla = txt_semilla.leer_txt(txt_utf8)
+    detalle = pd.DataFrame(
+        {"claveAcceso": c["clave"], "numero": f"{c['serie'][:3]}-{c['serie'][3:]}-{c['secuencial']:09d}",
+         "rucEmisor": c["ruc"], "razonSocial": c["razonSocial"], "fechaEmision": f"{c['fecha']:%d/%m/%Y}",
+         "total": c["total"] + (1.0 if i % 100 == 1 else 0.0)}
+        for i, c in enumerate(comprobantes(filas_txt + filas_txt // 200)) if i % 100
+    )
+
+    def conciliar():
+        conciliacion.conciliar(semilla, detalle)
+        return len(semilla)
+
+    # El historial se mide sobre una base temporal, nunca sobre la real
+    historial.HIST_PATH = tmp / "historial_descargas.json"
+    historial.HIST_DB = tmp / "historial_descargas.sqlite3"
+
+    def registrar():
+        historial.HIST_DB.unlink(missing_ok=True)
+        historial._inicializado.discard(str(historial.HIST_DB))
+        for i in range(n_historial):
+            historial.registrar_descarga("1790012345001", "Recibidos", 2024, i % 12 + 1, "Facturas",
+                                         {"estado": "completado", "n_xml": i, "n_pdf": i})
+        return n_historial
+
+    def consultar():
+        paginas = 0
+        for desplazamiento in range(0, n_historial, 50):
+            historial.obtener_historial(ruc="1790012345001", limite=50, desplazamiento=desplazamiento)
+            paginas += 1
+        return paginas
+
+    return {
+        "txt_utf8": lambda: len(_extraer_claves_desde_txt(txt_utf8)),
+        "txt_latin1": lambda: len(_extraer_claves_desde_txt(txt_latin1)),
+        "leer_xml": leer_xml,
+        "construir_reporte_frio": reporte_frio,
+        "construir_reporte_cache": reporte_caliente,
+        "excel": excel_reporte,
+        "conciliacion": conciliar,
+        "historial_registrar": registrar,
+        "historial_consultar": consultar,
+    }
+
+
+# =====================================================
+# ⚖️ COMPARACIÓN CON LA LÍNEA BASE
+# =====================================================
+def comparar(resultados: dict, base: dict, tolerancia: float = TOLERANCIA) -> list:
+    """Etapas cuyo tiempo supera al de la línea base en más de `tolerancia`."""
+    regresiones = []
+    for etapa, r in resultados.items():
+        b = base.get(etapa)
+        if not b or not b.get("segundos") or b.get("elementos") != r["elementos"]:
+            continue
+        cambio = r["segundos"] / b["segundos"] - 1
+        r["vs_base"] = f"{cambio:+.0%}"
+        if cambio > tolerancia:
+            regresiones.append(etapa)
+    return regresiones
+
+
+def _imprimir(resultados: dict):
+    print(f"{'etapa':<26}{'elem.':>9}{'seg':>10}{'elem/s':>12}{'pico MB':>10}{'vs base':>9}")
+    for etapa, r in resultados.items():
+        print(f"{etapa:<26}{r['elementos']:>9}{r['segundos']:>10.3f}{r['por_segundo']:>12.1f}"
+              f"{r['pico_mb']:>10.2f}{r.get('vs_base', '—'):>9}")
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmarks sin conexión del robot SRI.")
+    ap.add_argument("--xml", type=int, default=2000, help="XMLs en el corpus (por defecto 2000)")
+    ap.add_argument("--filas-txt", type=int, default=20000, help="filas del TXT semilla (1k–200k)")
+    ap.add_argument("--historial", type=int, default=1000, help="registros de historial a insertar")
+    ap.add_argument("--repeticiones", type=int, default=3)
+    ap.add_argument("--etapas", nargs="*", help="solo estas etapas")
+    ap.add_argument("--linea-base", type=Path, default=LINEA_BASE)
+    ap.add_argument("--guardar-linea-base", action="store_true")
+    ap.add_argument("--tolerancia", type=float, default=TOLERANCIA)
+    ap.add_argument("--json", type=Path, help="escribe también los resultados en este archivo")
+    args = ap.parse_args(argv)
+
+    # Secuencial: el pool de procesos mediría el arranque de procesos, no el parseo
+    parser.PROCESOS_PARSEO = 1
+
+    resultados = {}
+    with tempfile.TemporaryDirectory(prefix="sri_bench_") as tmp:
+        print(f"🧪 Generando corpus: {args.xml} XML, {args.filas_txt} filas TXT…")
+        etapas = _etapas(Path(tmp), args.xml, args.filas_txt, args.historial)
+        for nombre, funcion in etapas.items():
+            if args.etapas and nombre not in args.etapas:
+                continue
+            resultados[nombre] = _medir(funcion, max(1, args.repeticiones))
+
+    base = {}
+    if args.linea_base.exists():
+        base = json.loads(args.linea_base.read_text(encoding="utf-8")).get("etapas", {})
+    regresiones = comparar(resultados, base, args.tolerancia)
+    _imprimir(resultados)
+
+    salida = {
+        "fecha": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "maquina": platform.machine(),
+        "parametros": {"xml": args.xml, "filas_txt": args.filas_txt, "historial": args.historial},
+        "etapas": resultados,
+    }
+    if args.json:
+        args.json.write_text(json.dumps(salida, indent=2), encoding="utf-8")
+    if args.guardar_linea_base:
+        args.linea_base.write_text(json.dumps(salida, indent=2), encoding="utf-8")
+        print(f"💾 Línea base guardada en {args.linea_base}")
+        return 0
+
+    if regresiones:
+        print(f"❌ Regresión (> {args.tolerancia:.0%}) en: {', '.join(regresiones)}")
+        return 1
+    if base:
+        print("✅ Sin regresiones respecto de la línea base.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
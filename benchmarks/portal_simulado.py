@@ -0,0 +1,476 @@
+# =====================================================
+# 🏛️ MÓDULO: PORTAL SRI SIMULADO (LOCAL)
+# =====================================================
+# Servidor HTTP que imita las páginas que usa el robot:
+# login con captcha, consultas JSF de Recibidos/Emitidos con
+# postbacks AJAX, "Descargar reporte" (TXT), descargas XML/RIDE
+# por clave, la tabla paginada de Emitidos y el SOAP de
+# autorización por clave de acceso. Latencia, tasa de
+# fallos y límite de peticiones por segundo son configurables.
+#
+#   python -m benchmarks.portal_simulado --puerto 8765 --latencia-ms 150
+#   SRI_URL_BASE=http://127.0.0.1:8765 streamlit run aplicacion.py
+# =====================================================
+
+import argparse
+import html
+import random
+import re
+import secrets
+import threading
+import time
+import zlib
+from datetime import date
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from benchmarks.corpus import COLUMNAS_TXT, TIPOS_DOC, comprobantes, fila_txt, xml_comprobante
+
+RUTA_LOGIN = "/sri-en-linea/inicio/NAT"
+RUTA_AUTH = "/sri-en-linea/auth/ingresar"
+RUTA_PERFIL = "/sri-en-linea/contribuyente/perfil"
+RUTA_WS = "/comprobantes-electronicos-ws/AutorizacionComprobantesOffline"
+RUTAS_CONSULTA = {
+    "/comprobantes-electronicos-internet/pages/consultas/recibidos/comprobantesRecibidos.jsf": "Recibidos",
+    "/comprobantes-electronicos-internet/pages/consultas/emitidos/comprobantesEmitidos.jsf": "Emitidos",
+}
+
+_MESES = ["Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio",
+          "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"]
+_TIPO_A_COD = {nombre: cod for cod, (_, nombre) in TIPOS_DOC.items()}
+_FILAS_POR_PAGINA = [10, 20, 50, 75]
+
+# PDF mínimo válido (el manifiesto exige la firma %PDF-)
+_RIDE = (b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+         b"2 0 obj<</Type/Pages/Kids[]/Count 0>>endobj\ntrailer<</Root 1 0 R>>\n%%EOF\n")
+
+
+# =====================================================
+# ⚙️ CONFIGURACIÓN
+# =====================================================
+class ConfigPortal:
+    """
+    Comportamiento del portal simulado.
+      n_comprobantes: comprobantes por período (antes de filtrar por tipo)
+      latencia_ms / jitter_ms: demora de cada respuesta
+      prob_fallo: probabilidad de responder 500 a consultas y descargas
+      max_rps: peticiones por segundo antes de responder 429 (0 = sin límite)
+      captcha_seg: segundos que el captcha permanece en el login
+      clave: contraseña exigida en el login (None = cualquiera)
+    """
+
+    def __init__(self, n_comprobantes: int = 200, latencia_ms: int = 0, jitter_ms: int = 0,
+                 prob_fallo: float = 0.0, max_rps: float = 0, captcha_seg: float = 0,
+                 clave: str = None, semilla: int = 2024):
+        self.n_comprobantes = n_comprobantes
+        self.latencia_ms = latencia_ms
+        self.jitter_ms = jitter_ms
+        self.prob_fallo = prob_fallo
+        self.max_rps = max_rps
+        self.captcha_seg = captcha_seg
+        self.clave = clave
+        self.semilla = semilla
+
+
+# =====================================================
+# 🗃️ DATOS DEL PORTAL
+# =====================================================
+class _Datos:
+    """Comprobantes por (origen, ruc, año, mes), generados al primer uso y en caché."""
+
+    def __init__(self, config: ConfigPortal):
+        self.config = config
+        self._lock = threading.Lock()
+        self._periodos = {}
+        self._por_clave = {}
+
+    def periodo(self, origen: str, ruc: str, anio: int, mes: int) -> list:
+        llave = (origen, ruc, anio, mes)
+        with self._lock:
+            if llave not in self._periodos:
+                semilla = zlib.crc32(f"{self.config.semilla}|{origen}|{anio}|{mes}".encode())
+                lista = list(comprobantes(self.config.n_comprobantes, semilla, anio, mes, ruc))
+                self._periodos[llave] = lista
+                for c in lista:
+                    self._por_clave[c["clave"]] = (c, ruc)
+            return self._periodos[llave]
+
+    def por_clave(self, ruc: str, clave: str):
+        encontrado = self._por_clave.get(clave)
+        if encontrado is None and ruc and len(clave) == 49 and clave.isdigit():
+            # La fecha de emisión va en los 8 primeros dígitos de la clave
+            try:
+                emision = date(int(clave[4:8]), int(clave[2:4]), int(clave[:2]))
+                self.periodo("Recibidos", ruc, emision.year, emision.month)
+            except ValueError:
+                return None
+            encontrado = self._por_clave.get(clave)
+        return encontrado
+
+
+class _Limitador:
+    """Cubeta de fichas global: más de max_rps peticiones por segundo → 429."""
+
+    def __init__(self, max_rps: float):
+        self.max_rps = max_rps
+        self._fichas = max_rps
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def permitir(self) -> bool:
+        if not self.max_rps:
+            return True
+        with self._lock:
+            ahora = time.monotonic()
+            self._fichas = min(self.max_rps, self._fichas + (ahora - self._ultimo) * self.max_rps)
+            self._ultimo = ahora
+            if self._fichas >= 1:
+                self._fichas -= 1
+                return True
+            return False
+
+
+# =====================================================
+# 🖼️ HTML DE LAS PÁGINAS
+# =====================================================
+_SCRIPT_CONSULTA = """
+<script>
+var modo = 'periodo', pagina = 1, filas = 10;
+function postback(extra) {
+  var f = document.getElementById('frmPrincipal');
+  var datos = new URLSearchParams(new FormData(f));
+  datos.set('modo', modo); datos.set('pagina', pagina); datos.set('filas', filas);
+  for (var k in (extra || {})) datos.set(k, extra[k]);
+  return fetch(location.pathname, {method: 'POST', body: datos,
+      headers: {'Content-Type': 'application/x-www-form-urlencoded', 'Faces-Request': 'partial/ajax'}})
+    .then(function (r) { return r.text().then(function (t) { return [r.status, t]; }); })
+    .then(function (rt) {
+      document.getElementById('resultados').innerHTML = rt[0] === 200 ? rt[1]
+        : '<div class="ui-messages-error">Error ' + rt[0] + ' consultando el portal</div>';
+    });
+}
+function consultar() { pagina = 1; postback(); }
+function irPagina(n) { pagina = n; postback(); }
+function cambiarFilas(v) { filas = parseInt(v, 10); pagina = 1; postback(); }
+function modoClave() { modo = 'clave'; }
+function descargar(q) { location.href = location.pathname + '?' + q; }
+</script>
+"""
+
+
+def _pagina_login(config: ConfigPortal, error: bool) -> str:
+    captcha = ""
+    if config.captcha_seg:
+        captcha = (
+            '<img alt="captcha" id="captcha" src="data:image/gif;base64,R0lGODlhAQABAAAAACw=">'
+            f"<script>setTimeout(function () {{ document.getElementById('captcha').remove(); }},"
+            f" {int(config.captcha_seg * 1000)});</script>"
+        )
+    aviso = '<div class="ui-messages-error">Usuario o contraseña incorrectos</div>' if error else ""
+    return (
+        "<!DOCTYPE html><html><head><meta charset='utf-8'><title>SRI en línea</title></head><body>"
+        f"{aviso}<form method='post' action='{RUTA_AUTH}'>"
+        "<input name='usuario' placeholder='Ruc/Cédula/Pasaporte'>"
+        "<input name='password' type='password' placeholder='Contraseña'>"
+        f"{captcha}<button type='submit'>Ingresar</button></form></body></html>"
+    )
+
+
+def _pagina_consulta(origen: str) -> str:
+    anios = "".join(f"<option value='{a}'>{a}</option>" for a in range(2015, date.today().year + 2))
+    meses = "".join(f"<option value='{i}'>{m}</option>" for i, m in enumerate(_MESES, 1))
+    dias = "<option value='0'>Todos</option>" + "".join(f"<option value='{d}'>{d}</option>" for d in range(1, 32))
+    tipos = "".join(f"<option>{html.escape(nombre)}</option>" for nombre in _TIPO_A_COD)
+    extra_recibidos = ""
+    if origen == "Recibidos":
+        extra_recibidos = "<button type='button' onclick=\"descargar('descargar=reporte')\">Descargar reporte</button>"
+    clave = ""
+    if origen == "Recibidos":
+        clave = ("<input id='frmPrincipal:txtClaveAcceso' name='clave' size='49'>"
+                 "<span class='ui-tabview-title' onclick='modoClave()'>Clave de acceso</span>")
+    return (
+        "<!DOCTYPE html><html><head><meta charset='utf-8'>"
+        f"<title>Comprobantes {origen}</title></head><body>"
+        "<form id='frmPrincipal' onsubmit='return false'>"
+        f"{clave}"
+        "<div aria-label='Período emisión'>"
+        f"<select name='anio'>{anios}</select><select name='mes'>{meses}</select><select name='dia'>{dias}</select>"
+        "</div>"
+        f"<div aria-label='Tipo de comprobante'><select name='tipo'>{tipos}</select></div>"
+        "<button type='button' onclick='consultar()'>Consultar</button>"
+        f"{extra_recibidos}</form>"
+        f"<div id='resultados'></div>{_SCRIPT_CONSULTA}</body></html>"
+    )
+
+
+def _tabla(filas_html: list, pagina: int, filas: int, total: int) -> str:
+    ultima = max(1, -(-total // filas))
+    rpp = "".join(f"<option value='{n}'{' selected' if n == filas else ''}>{n}</option>" for n in _FILAS_POR_PAGINA)
+    siguiente = "ui-paginator-next" + (" ui-state-disabled" if pagina >= ultima else "")
+    cuerpo = "".join(filas_html) or "<tr class='ui-datatable-empty-message'><td colspan='7'>No existen datos</td></tr>"
+    return (
+        "<div class='ui-datatable'><table><tbody id='frmPrincipal:tablaComprobantes_data'>"
+        f"{cuerpo}</tbody></table>"
+        f"<div class='ui-paginator'><span class='ui-paginator-current'>({pagina} de {ultima})</span>"
+        f"<a class='{siguiente}' onclick='irPagina({pagina + 1})'>Siguiente</a>"
+        f"<select class='ui-paginator-rpp-options' onchange='cambiarFilas(this.value)'>{rpp}</select>"
+        "</div></div>"
+    )
+
+
+def _fila(c: dict, origen: str, con_botones: bool = False) -> str:
+    celdas = [
+        f"{c['fecha']:%d/%m/%Y}", TIPOS_DOC[c["codDoc"]][1],
+        f"{c['serie'][:3]}-{c['serie'][3:]}-{c['secuencial']:09d}",
+        c["ruc"], c["razonSocial"], f"{c['total']:.2f}", "AUTORIZADO",
+    ]
+    tds = "".join(f"<td>{html.escape(v)}</td>" for v in celdas)
+    if con_botones:
+        tds += (f"<td><button type='button' onclick=\"descargar('descargar=xml&clave={c['clave']}')\">XML</button>"
+                f"<button type='button' onclick=\"descargar('descargar=ride&clave={c['clave']}')\">RIDE</button></td>")
+    return f"<tr data-ri='{c['clave']}'>{tds}</tr>"
+
+
+# =====================================================
+# 🌐 SERVIDOR
+# =====================================================
+class PortalSimulado:
+    """
+    Portal en un hilo propio. Uso:
+        with PortalSimulado(ConfigPortal(latencia_ms=100)) as portal:
+            configurar_url_base(portal.url)
+    """
+
+    def __init__(self, config: ConfigPortal = None, host: str = "127.0.0.1", puerto: int = 0):
+        self.config = config or ConfigPortal()
+        self.datos = _Datos(self.config)
+        self.limitador = _Limitador(self.config.max_rps)
+        self.sesiones = {}               # token → {"ruc": ..., "consulta": {...}}
+        self.estadisticas = {"peticiones": 0, "fallos": 0, "limitadas": 0, "descargas": 0, "ws": 0}
+        self._lock = threading.Lock()
+        self._servidor = ThreadingHTTPServer((host, puerto), _crear_manejador(self))
+        self._servidor.daemon_threads = True
+        self._hilo = None
+
+    @property
+    def url(self) -> str:
+        host, puerto = self._servidor.server_address[:2]
+        return f"http://{host}:{puerto}"
+
+    def contar(self, nombre: str):
+        with self._lock:
+            self.estadisticas[nombre] += 1
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._servidor.serve_forever, name="portal-simulado", daemon=True)
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.detener()
+
+
+def _crear_manejador(portal: PortalSimulado):
+    config = portal.config
+
+    class _Manejador(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        # ---------- Utilidades ----------
+        def _responder(self, estado: int, cuerpo, tipo: str = "text/html; charset=utf-8", cabeceras: dict = None):
+            datos = cuerpo.encode("utf-8") if isinstance(cuerpo, str) else cuerpo
+            self.send_response(estado)
+            self.send_header("Content-Type", tipo)
+            self.send_header("Content-Length", str(len(datos)))
+            for k, v in (cabeceras or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(datos)
+
+        def _redirigir(self, ruta: str, cabeceras: dict = None):
+            self._responder(302, "", cabeceras={"Location": ruta, **(cabeceras or {})})
+
+        def _sesion(self):
+            cookie = SimpleCookie(self.headers.get("Cookie", ""))
+            token = cookie["JSESSIONID"].value if "JSESSIONID" in cookie else None
+            return portal.sesiones.get(token)
+
+        def _formulario(self) -> dict:
+            largo = int(self.headers.get("Content-Length") or 0)
+            self._cuerpo_crudo = self.rfile.read(largo).decode("utf-8") if largo else ""
+            return {k: v[-1] for k, v in parse_qs(self._cuerpo_crudo).items()}
+
+        def _simular_red(self, con_fallos: bool) -> bool:
+            """Latencia, límite de peticiones y fallos inyectados. False si ya se respondió."""
+            portal.contar("peticiones")
+            if config.latencia_ms or config.jitter_ms:
+                time.sleep((config.latencia_ms + random.uniform(0, config.jitter_ms)) / 1000)
+            if not portal.limitador.permitir():
+                portal.contar("limitadas")
+                self._responder(429, "Demasiadas solicitudes", cabeceras={"Retry-After": "1"})
+                return False
+            if con_fallos and config.prob_fallo and random.random() < config.prob_fallo:
+                portal.contar("fallos")
+                self._responder(500, "<html><body>Error interno del servidor</body></html>")
+                return False
+            return True
+
+        # ---------- GET ----------
+        def do_GET(self):
+            partes = urlsplit(self.path)
+            query = {k: v[-1] for k, v in parse_qs(partes.query).items()}
+            if not self._simular_red(con_fallos="descargar" in query):
+                return
+
+            if partes.path == RUTA_LOGIN:
+                return self._responder(200, _pagina_login(config, "error" in query))
+            if partes.path == RUTA_PERFIL:
+                if not self._sesion():
+                    return self._redirigir(RUTA_LOGIN)
+                return self._responder(200, "<html><body><h1>Bienvenido</h1></body></html>")
+
+            origen = RUTAS_CONSULTA.get(partes.path)
+            if origen is None:
+                return self._responder(404, "No encontrado")
+            sesion = self._sesion()
+            if sesion is None:
+                return self._redirigir(RUTA_LOGIN)
+            if "descargar" in query:
+                return self._descargar(sesion, query)
+            return self._responder(200, _pagina_consulta(origen))
+
+        def _descargar(self, sesion: dict, query: dict):
+            portal.contar("descargas")
+            que = query["descargar"]
+            if que == "reporte":
+                consulta = sesion.get("consulta")
+                if not consulta:
+                    return self._responder(200, "<html><body>Realice primero una consulta</body></html>")
+                lista = _filtrar(portal.datos.periodo("Recibidos", sesion["ruc"], consulta["anio"], consulta["mes"]),
+                                 consulta["tipo"])
+                lineas = ["\t".join(COLUMNAS_TXT)] + [fila_txt(c, sesion["ruc"]) for c in lista]
+                return self._responder(
+                    200, "\r\n".join(lineas) + "\r\n", "text/plain; charset=utf-8",
+                    {"Content-Disposition": f"attachment; filename=\"{sesion['ruc']}_Recibidos.txt\""},
+                )
+            encontrado = portal.datos.por_clave(sesion["ruc"], query.get("clave", ""))
+            if encontrado is None:
+                return self._responder(404, "Comprobante no encontrado")
+            c, ruc = encontrado
+            if que == "xml":
+                return self._responder(
+                    200, xml_comprobante(c, ruc, "autorizacion"), "application/xml; charset=utf-8",
+                    {"Content-Disposition": f"attachment; filename=\"{c['clave']}.xml\""},
+                )
+            return self._responder(200, _RIDE, "application/pdf",
+                                   {"Content-Disposition": f"attachment; filename=\"{c['clave']}.pdf\""})
+
+        # ---------- POST ----------
+        def do_POST(self):
+            partes = urlsplit(self.path)
+            form = self._formulario()
+            if partes.path == RUTA_WS:
+                if not self._simular_red(con_fallos=True):
+                    return
+                portal.contar("ws")
+                return self._responder(200, _respuesta_soap(portal, self._cuerpo_crudo), "text/xml; charset=utf-8")
+            if partes.path == RUTA_AUTH:
+                if not self._simular_red(con_fallos=False):
+                    return
+                if not form.get("usuario") or (config.clave is not None and form.get("password") != config.clave):
+                    return self._redirigir(f"{RUTA_LOGIN}?error=1")
+                token = secrets.token_hex(16)
+                portal.sesiones[token] = {"ruc": form["usuario"], "consulta": None}
+                return self._redirigir(RUTA_PERFIL, {"Set-Cookie": f"JSESSIONID={token}; Path=/; HttpOnly"})
+
+            origen = RUTAS_CONSULTA.get(partes.path)
+            if origen is None:
+                return self._responder(404, "No encontrado")
+            if not self._simular_red(con_fallos=True):
+                return
+            sesion = self._sesion()
+            if sesion is None:
+                return self._responder(403, "Sesión expirada")
+            self._postback(origen, sesion, form)
+
+        def _postback(self, origen: str, sesion: dict, form: dict):
+            pagina = max(1, int(form.get("pagina") or 1))
+            filas = int(form.get("filas") or 10)
+            if form.get("modo") == "clave":
+                encontrado = portal.datos.por_clave(sesion["ruc"], form.get("clave", "").strip())
+                filas_html = [_fila(encontrado[0], origen, con_botones=True)] if encontrado else []
+                return self._responder(200, _tabla(filas_html, 1, filas, len(filas_html)))
+
+            anio, mes = int(form.get("anio") or date.today().year), int(form.get("mes") or 1)
+            tipo = form.get("tipo") or "Factura"
+            sesion["consulta"] = {"anio": anio, "mes": mes, "tipo": tipo}
+            lista = _filtrar(portal.datos.periodo(origen, sesion["ruc"], anio, mes), tipo)
+            desde = (pagina - 1) * filas
+            filas_html = [_fila(c, origen) for c in lista[desde:desde + filas]]
+            self._responder(200, _tabla(filas_html, pagina, filas, len(lista)))
+
+    return _Manejador
+
+
+def _respuesta_soap(portal: PortalSimulado, sobre: str) -> str:
+    """Respuesta de autorizacionComprobante, con el comprobante en CDATA."""
+    clave = re.search(r"<claveAccesoComprobante>\s*(\d+)\s*</claveAccesoComprobante>", sobre)
+    clave = clave.group(1) if clave else ""
+    encontrado = portal.datos.por_clave(None, clave)
+    autorizaciones = ""
+    if encontrado:
+        c, ruc = encontrado
+        autorizaciones = xml_comprobante(c, ruc, "autorizacion").split("?>", 1)[1]
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body>'
+        '<ns2:autorizacionComprobanteResponse xmlns:ns2="http://ec.gob.sri.ws.autorizacion">'
+        f"<RespuestaAutorizacionComprobante><claveAccesoConsultada>{clave}</claveAccesoConsultada>"
+        f"<numeroComprobantes>{1 if encontrado else 0}</numeroComprobantes>"
+        f"<autorizaciones>{autorizaciones}</autorizaciones></RespuestaAutorizacionComprobante>"
+        "</ns2:autorizacionComprobanteResponse></soap:Body></soap:Envelope>"
+    )
+
+
+def _filtrar(lista: list, tipo_visible: str) -> list:
+    cod = _TIPO_A_COD.get(tipo_visible)
+    return [c for c in lista if c["codDoc"] == cod] if cod else lista
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Portal SRI simulado para pruebas locales del robot.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--puerto", type=int, default=8765)
+    ap.add_argument("--comprobantes", type=int, default=200, help="comprobantes por período")
+    ap.add_argument("--latencia-ms", type=int, default=0)
+    ap.add_argument("--jitter-ms", type=int, default=0)
+    ap.add_argument("--prob-fallo", type=float, default=0.0)
+    ap.add_argument("--max-rps", type=float, default=0)
+    ap.add_argument("--captcha-seg", type=float, default=0)
+    args = ap.parse_args(argv)
+
+    config = ConfigPortal(args.comprobantes, args.latencia_ms, args.jitter_ms, args.prob_fallo,
+                          args.max_rps, args.captcha_seg)
+    portal = PortalSimulado(config, args.host, args.puerto).iniciar()
+    print(f"🏛️ Portal SRI simulado en {portal.url} (Ctrl+C para detener)")
+    print(f"   SRI_URL_BASE={portal.url}")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        portal.detener()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+# =====================================================
+# 🗄️ MÓDULO: ALMACÉN PARQUET DE COMPROBANTES
+# =====================================================
+# Guarda las filas parseadas (Recibidos desde XML, Emitidos
+# desde la tabla del portal) en un dataset Parquet particionado
+# por ruc/anio/mes/origen (estilo Hive). Las consultas entre
+# períodos y RUC leen solo las particiones y columnas necesarias,
+# sin reparsear XML ni abrir los Excel de cada mes.
+# =====================================================
+
+import os
+import re
+import unicodedata
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+ALMACEN_DIR = Path(os.environ.get("SRI_ALMACEN_DIR", BASE_DIR / "almacen"))
+
+# Columnas de partición (forman la ruta: ruc=.../anio=.../mes=.../origen=...)
+PARTICIONES = pa.schema([
+    ("ruc", pa.string()),
+    ("anio", pa.int16()),
+    ("mes", pa.int8()),
+    ("origen", pa.string()),
+])
+
+# Esquema común de Recibidos y Emitidos (lo que no aplica queda nulo)
+ESQUEMA = pa.schema([
+    ("fechaEmision", pa.date32()),
+    ("tipoDocumento", pa.string()),
+    ("numero", pa.string()),
+    ("claveAcceso", pa.string()),
+    ("rucEmisor", pa.string()),
+    ("razonSocialEmisor", pa.string()),
+    ("rucReceptor", pa.string()),
+    ("razonSocialReceptor", pa.string()),
+    ("subtotal", pa.float64()),
+    ("iva", pa.float64()),
+    ("total", pa.float64()),
+    ("retenido", pa.float64()),
+    ("estado", pa.string()),
+    ("archivo", pa.string()),
+    ("error", pa.string()),
+])
+
+# Nombres del reporte de Recibidos / tabla de Emitidos → esquema común
+_RENOMBRAR = {
+    "Recibidos": {"razonSocial": "razonSocialEmisor"},
+    "Emitidos": {
+        "Fecha Emisión": "fechaEmision", "Tipo": "tipoDocumento", "Número": "numero",
+        "RUC Receptor": "rucReceptor", "Razón Social": "razonSocialReceptor",
+        "Total": "total", "Estado": "estado",
+    },
+}
+
+# Agrupaciones de totales: por quién emite (Recibidos) o a quién se emite (Emitidos)
+AGRUPACIONES = {
+    "emisor": ["rucEmisor", "razonSocialEmisor"],
+    "cliente": ["rucReceptor", "razonSocialReceptor"],
+}
+
+
+def _slug(texto: str) -> str:
+    texto = unicodedata.normalize("NFKD", texto.lower()).encode("ascii", "ignore").decode()
+    return re.sub(r"[^a-z0-9]+", "_", texto).strip("_") or "datos"
+
+
+def _dataset(raiz: Path = None) -> ds.Dataset:
+    return ds.dataset(raiz or ALMACEN_DIR, format="parquet", schema=pa.unify_schemas([ESQUEMA, PARTICIONES]),
+                      partitioning=ds.partitioning(PARTICIONES, flavor="hive"))
+
+
+# =====================================================
+# 💾 ESCRITURA
+# =====================================================
+def _numero(col: pd.Series, campo: str) -> pd.Series:
+    """
+    Importes a float aceptando "1.234,56", "1,234.56" y "12,50": el último
+    separador es el decimal y el otro, de miles (como en los TXT del SRI).
+    Cada valor que no se puede convertir se avisa y queda vacío.
+    """
+    if pd.api.types.is_numeric_dtype(col):
+        return col.astype(float)
+    texto = col.astype("string").str.strip().str.replace(r"[\s$]", "", regex=True)
+    coma_decimal = (texto.str.rfind(",").fillna(-1) > texto.str.rfind(".").fillna(-1)).astype(bool)
+    texto = texto.where(coma_decimal, texto.str.replace(",", "", regex=False))
+    texto = texto.where(~coma_decimal, texto.str.replace(".", "", regex=False).str.replace(",", ".", regex=False))
+    numero = pd.to_numeric(texto, errors="coerce")
+    fallidos = numero.isna() & texto.notna() & (texto != "")
+    for valor in col[fallidos].unique():
+        print(f"[WARN] {campo}: {valor!r} no es un importe válido; se guarda vacío en el almacén.")
+    return numero.astype(float)
+
+
+def _normalizar(df: pd.DataFrame, ruc: str, origen: str) -> pa.Table:
+    df = df.rename(columns=_RENOMBRAR.get(origen, {}))
+    if origen == "Emitidos":
+        df = df.assign(rucEmisor=ruc)
+    datos = {}
+    for campo in ESQUEMA:
+        col = df[campo.name] if campo.name in df.columns else pd.Series(None, index=df.index, dtype=object)
+        if pa.types.is_date32(campo.type):
+            col = pd.to_datetime(col, format="%d/%m/%Y", errors="coerce").dt.date
+        elif pa.types.is_floating(campo.type):
+            col = _numero(col, campo.name)
+        else:
+            col = col.where(col.notna(), None).map(lambda v: v if v is None else str(v))
+        datos[campo.name] = col
+    return pa.Table.from_pandas(pd.DataFrame(datos), schema=ESQUEMA, preserve_index=False)
+
+
+def guardar_periodo(df: pd.DataFrame, ruc: str, anio: int, mes: int, origen: str,
+                    nombre: str = "comprobantes", raiz: Path = None) -> Path:
+    """
+    Reemplaza las filas de (ruc, anio, mes, origen, nombre) en el almacén.
+    `nombre` separa los archivos dentro de una partición (Emitidos guarda uno
+    por tipo de comprobante). La escritura es atómica: las consultas en curso
+    ven la versión anterior o la nueva, nunca una a medias.
+    """
+    particion = (Path(raiz or ALMACEN_DIR) / f"ruc={ruc}" / f"anio={int(anio)}"
+                 / f"mes={int(mes)}" / f"origen={origen}")
+    particion.mkdir(parents=True, exist_ok=True)
+    ruta = particion / f"{_slug(nombre)}.parquet"
+    # Los archivos que empiezan con "." no forman parte del dataset
+    tmp = particion / f".{ruta.name}.tmp"
+    pq.write_table(_normalizar(df, ruc, origen), tmp, compression="zstd")
+    os.replace(tmp, ruta)
+    return ruta
+
+
+def guardar_seguro(df: pd.DataFrame, ruc: str, anio: int, mes: int, origen: str, nombre: str = "comprobantes"):
+    """guardar_periodo sin cortar el flujo: el almacén es un extra del reporte."""
+    if df is None or df.empty or not ruc:
+        return None
+    try:
+        return guardar_periodo(df, ruc, anio, mes, origen, nombre)
+    except Exception as e:
+        print(f"[WARN] No se pudo actualizar el almacén Parquet ({ruc} {mes:02d}/{anio} {origen}): {e}")
+        return None
+
+
+# =====================================================
+# 🔎 CONSULTAS
+# =====================================================
+def _filtro(ruc=None, origen=None, desde=None, hasta=None):
+    """
+    Expresión sobre las columnas de partición (poda carpetas enteras).
+    `desde` / `hasta` son (anio, mes) inclusivos.
+    """
+    filtro = None
+
+    def _y(expr):
+        nonlocal filtro
+        filtro = expr if filtro is None else filtro & expr
+
+    for campo, valor in (("ruc", ruc), ("origen", origen)):
+        if isinstance(valor, (list, tuple, set)):
+            _y(ds.field(campo).isin(list(valor)))
+        elif valor not in (None, ""):
+            _y(ds.field(campo) == valor)
+    if desde:
+        a, m = desde
+        _y((ds.field("anio") > a) | ((ds.field("anio") == a) & (ds.field("mes") >= m)))
+    if hasta:
+        a, m = hasta
+        _y((ds.field("anio") < a) | ((ds.field("anio") == a) & (ds.field("mes") <= m)))
+    return filtro
+
+
+def consultar(ruc=None, origen=None, desde=None, hasta=None, columnas: list = None,
+              raiz: Path = None) -> pd.DataFrame:
+    """Filas del almacén que cumplen los filtros; solo lee las columnas pedidas."""
+    if not Path(raiz or ALMACEN_DIR).exists():
+        return pd.DataFrame(columns=columnas or [f.name for f in ESQUEMA] + PARTICIONES.names)
+    tabla = _dataset(raiz).to_table(columns=columnas, filter=_filtro(ruc, origen, desde, hasta))
+    return tabla.to_pandas()
+
+
+def totales(por: str = "emisor", ruc=None, origen=None, desde=None, hasta=None,
+            raiz: Path = None) -> pd.DataFrame:
+    """
+    Subtotal, IVA, total y número de comprobantes agrupados por emisor o
+    cliente (ver AGRUPACIONES) en el rango indicado, de mayor a menor total.
+    """
+    claves = AGRUPACIONES[por]
+    montos = ["subtotal", "iva", "total"]
+    if not Path(raiz or ALMACEN_DIR).exists():
+        return pd.DataFrame(columns=claves + montos + ["comprobantes"])
+    tabla = _dataset(raiz).to_table(columns=claves + montos, filter=_filtro(ruc, origen, desde, hasta))
+    agrupado = tabla.group_by(claves).aggregate(
+        [(c, "sum") for c in montos] + [(claves[0], "count")]
+    )
+    df = agrupado.to_pandas().rename(
+        columns={**{f"{c}_sum": c for c in montos}, f"{claves[0]}_count": "comprobantes"}
+    )
+    return df[claves + montos + ["comprobantes"]].sort_values("total", ascending=False, ignore_index=True)
+
+
+def periodos_disponibles(ruc=None, raiz: Path = None) -> list:
+    """(anio, mes) con datos en el almacén, ordenados."""
+    raiz = Path(raiz or ALMACEN_DIR)
+    patron = f"ruc={ruc}" if ruc else "ruc=*"
+    vistos = set()
+    for carpeta in raiz.glob(f"{patron}/anio=*/mes=*"):
+        try:
+            vistos.add((int(carpeta.parent.name.split("=", 1)[1]), int(carpeta.name.split("=", 1)[1])))
+        except ValueError:
+            continue
+    return sorted(vistos)
+
+
+def rucs_disponibles(raiz: Path = None) -> list:
+    raiz = Path(raiz or ALMACEN_DIR)
+    return sorted(p.name.split("=", 1)[1] for p in raiz.glob("ruc=*") if p.is_dir())
@@ -0,0 +1,183 @@
+# =====================================================
+# 📨 MÓDULO: XML POR EL WEB SERVICE DE AUTORIZACIÓN DEL SRI
+# =====================================================
+# Obtiene el XML autorizado de cada clave de acceso con el
+# servicio SOAP AutorizacionComprobantesOffline, sin abrir el
+# navegador. Conexiones HTTP persistentes (keep-alive) en un
+# pool acotado, compartido por varios hilos.
+# Cada consulta pasa por el gobernador del host (ritmo, reintentos
+# y disyuntor). El navegador solo hace falta para el TXT semilla
+# y los RIDE.
+# =====================================================
+
+import copy
+import http.client
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from lxml import etree
+
+from robot.gobernador import gobernador
+from robot.manifiesto import Manifiesto
+
+URL_WS = os.environ.get(
+    "SRI_WS_AUTORIZACION",
+    "https://cel.sri.gob.ec/comprobantes-electronicos-ws/AutorizacionComprobantesOffline",
+)
+# Conexiones simultáneas al servicio (= consultas en vuelo)
+CONEXIONES_WS = max(1, int(os.environ.get("SRI_WS_CONEXIONES", "8") or 8))
+TIMEOUT_WS = float(os.environ.get("SRI_WS_TIMEOUT", "30") or 30)
+# Ritmo del servicio (consultas/s): es más liviano que el portal y admite más
+TASA_WS = float(os.environ.get("SRI_WS_TASA_INICIAL", "10") or 10)
+TASA_MAX_WS = float(os.environ.get("SRI_WS_TASA_MAX", "50") or 50)
+
+_SOBRE = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" '
+    'xmlns:ec="http://ec.gob.sri.ws.autorizacion">'
+    "<soapenv:Header/><soapenv:Body><ec:autorizacionComprobante>"
+    "<claveAccesoComprobante>{clave}</claveAccesoComprobante>"
+    "</ec:autorizacionComprobante></soapenv:Body></soapenv:Envelope>"
+)
+
+# strip_cdata=False: el comprobante se guarda tal cual, dentro de su CDATA
+_PARSER = etree.XMLParser(strip_cdata=False, resolve_entities=False, huge_tree=True)
+
+# Errores de una conexión keep-alive que el servidor cerró mientras estaba libre
+_CONEXION_CAIDA = (http.client.RemoteDisconnected, http.client.CannotSendRequest,
+                   ConnectionResetError, BrokenPipeError)
+
+
+def configurar_url(url: str):
+    """Cambia el servicio usado por defecto (p. ej. el SOAP del portal simulado)."""
+    global URL_WS
+    URL_WS = url
+
+
+# =====================================================
+# 🔍 RESPUESTA SOAP → XML AUTORIZADO
+# =====================================================
+def extraer_autorizacion(respuesta: bytes):
+    """
+    Devuelve (estado, xml) de la primera <autorizacion> de la respuesta.
+    `xml` es el documento <autorizacion> con el comprobante en CDATA (el mismo
+    formato que entrega el portal), o None si no hay autorización.
+    """
+    raiz = etree.fromstring(respuesta, _PARSER)
+    fallo = raiz.find(".//{*}Fault")
+    if fallo is not None:
+        raise RuntimeError(f"SOAP Fault: {''.join(fallo.itertext()).strip()}")
+    aut = raiz.find(".//{*}autorizaciones/{*}autorizacion")
+    if aut is None:
+        return "NO ENCONTRADO", None
+    estado = (aut.findtext("{*}estado") or "").strip()
+    if estado != "AUTORIZADO":
+        return estado or "DESCONOCIDO", None
+    # Copia suelta del sobre SOAP para no arrastrar sus declaraciones de namespace
+    aut = copy.deepcopy(aut)
+    etree.cleanup_namespaces(aut)
+    return estado, etree.tostring(aut, encoding="UTF-8", xml_declaration=True)
+
+
+# =====================================================
+# 🔌 CLIENTE CON POOL DE CONEXIONES
+# =====================================================
+class ClienteAutorizacion:
+    """
+    Cliente del servicio de autorización, seguro entre hilos.
+    Como mucho `max_conexiones` peticiones en vuelo; las conexiones libres
+    se reutilizan (keep-alive) en lugar de abrir una por clave.
+    """
+
+    def __init__(self, url: str = None, max_conexiones: int = CONEXIONES_WS, timeout: float = TIMEOUT_WS):
+        partes = urlsplit(url or URL_WS)
+        self._clase = http.client.HTTPSConnection if partes.scheme == "https" else http.client.HTTPConnection
+        self._host = partes.netloc
+        self._ruta = partes.path or "/"
+        self.timeout = timeout
+        self.max_conexiones = max_conexiones
+        self._libres = queue.LifoQueue()
+        self._cupos = threading.BoundedSemaphore(max_conexiones)
+
+    @contextmanager
+    def _conexion(self):
+        """Presta una conexión del pool; si algo falla, se cierra y no vuelve al pool."""
+        with self._cupos:
+            try:
+                conn, reutilizada = self._libres.get_nowait(), True
+            except queue.Empty:
+                conn, reutilizada = self._clase(self._host, timeout=self.timeout), False
+            try:
+                yield conn, reutilizada
+            except BaseException:
+                conn.close()
+                raise
+            self._libres.put(conn)
+
+    def _post(self, cuerpo: bytes) -> bytes:
+        for intento in range(2):
+            with self._conexion() as (conn, reutilizada):
+                try:
+                    conn.request("POST", self._ruta, body=cuerpo, headers={
+                        "Content-Type": "text/xml; charset=utf-8",
+                        "SOAPAction": '""',
+                        "Connection": "keep-alive",
+                    })
+                    resp = conn.getresponse()
+                    datos = resp.read()
+                except _CONEXION_CAIDA:
+                    # Conexión persistente vencida: reintentar una vez con una nueva
+                    if reutilizada and intento == 0:
+                        conn.close()
+                        continue
+                    raise
+                if resp.will_close:
+                    conn.close()
+            if resp.status != 200 and b"Fault" not in datos:
+                raise RuntimeError(f"HTTP {resp.status} del servicio de autorización")
+            return datos
+
+    def consultar(self, clave: str):
+        """(estado, xml) de una clave de acceso; xml es None si no está autorizada."""
+        return extraer_autorizacion(self._post(_SOBRE.format(clave=clave).encode("utf-8")))
+
+    def guardar(self, clave: str, manifiesto: Manifiesto, metricas=None):
+        """
+        Guarda y registra en el manifiesto el XML de la clave.
+        Devuelve (bytes, segundos), o None si no se obtuvo (no autorizada, error):
+        el llamador decide si lo intenta por otra vía.
+        """
+        inicio = time.perf_counter()
+        try:
+            # Errores de red/HTTP se reintentan; una clave no autorizada es una respuesta válida
+            estado, xml = gobernador(self._host, tasa=TASA_WS, tasa_max=TASA_MAX_WS).ejecutar(
+                self.consultar, clave, metricas=metricas)
+            if xml is None:
+                raise RuntimeError(f"estado {estado}")
+            ruta = manifiesto.ruta_archivo(clave, "XML")
+            ruta.parent.mkdir(parents=True, exist_ok=True)
+            ruta.write_bytes(xml)
+            n_bytes = manifiesto.registrar(clave, "XML")["tamano"]
+        except Exception as e:
+            print(f"[WARN] Web service sin XML para {clave}: {e}")
+            return None
+        return n_bytes, time.perf_counter() - inicio
+
+    def descargar(self, claves: list, manifiesto: Manifiesto, concurrencia: int = None, metricas=None) -> dict:
+        """{clave: (bytes, segundos)} de las claves cuyo XML se obtuvo."""
+        hilos = max(1, min(concurrencia or self.max_conexiones, self.max_conexiones, len(claves) or 1))
+        with ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="ws-autorizacion") as ejecutor:
+            resultados = ejecutor.map(lambda c: self.guardar(c, manifiesto, metricas), claves)
+            return {c: r for c, r in zip(claves, resultados) if r is not None}
+
+    def cerrar(self):
+        while True:
+            try:
+                self._libres.get_nowait().close()
+            except queue.Empty:
+                return
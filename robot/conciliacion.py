@@ -0,0 +1,213 @@
+# =====================================================
+# ⚖️ MÓDULO: CONCILIACIÓN TXT ↔ XML ↔ EMITIDOS
+# =====================================================
+# Cruza en bloque (merge de pandas sobre columnas enteras):
+#   - las filas del TXT semilla de "Descargar reporte",
+#   - el DataFrame de construir_reporte (XML parseados),
+#   - los Emitidos del almacén de los emisores del período.
+# TXT ↔ XML por claveAcceso; Recibidos ↔ Emitidos por emisor +
+# número (estab + ptoEmi + secuencial). Solo se cruzan los
+# emisores que tienen Emitidos en el almacén, es decir, los RUC
+# propios: una factura que la empresa A emitió a la B debe
+# figurar igual en los Emitidos de A. Solo se listan las filas
+# con novedad: faltantes, sobrantes y diferencias de importe.
+# =====================================================
+
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from robot import txt_semilla
+
+# Diferencia máxima (en dólares) que se acepta entre dos totales
+TOLERANCIA = float(os.environ.get("SRI_CONCILIACION_TOLERANCIA", "0.01") or 0.01)
+
+FALTA_XML = "Falta XML"
+XML_CON_ERROR = "XML con error"
+SIN_FILA_TXT = "Sin fila en TXT"
+DIFERENCIA_TXT = "Diferencia de importe"
+FALTA_EMITIDOS = "Falta en Emitidos"
+DIFERENCIA_EMITIDOS = "Diferencia con Emitidos"
+
+COLUMNAS = ["estado", "claveAcceso", "numero", "tipoDocumento", "rucEmisor", "razonSocialEmisor",
+            "fechaEmision", "total_txt", "total_xml", "total_emitidos", "diferencia", "detalle"]
+
+# Nombres de la tabla de Emitidos (portal o almacén) → nombres usados aquí;
+# en el almacén la partición `ruc` de los Emitidos es el emisor
+_EMITIDOS = {"Número": "numero", "Total": "total", "Estado": "estado", "ruc": "rucEmisor"}
+# Datos del comprobante que pueden venir del TXT o del XML (manda el TXT si los trae)
+_DESCRIPTIVAS = ("numero", "tipoDocumento", "rucEmisor", "razonSocialEmisor", "fechaEmision")
+
+
+def _texto(col: pd.Series) -> pd.Series:
+    # Cadenas de Arrow: strip, comparaciones y merge corren en C, no fila por fila
+    return col.astype("string[pyarrow]").fillna("").str.strip()
+
+
+def _numero(col: pd.Series) -> pd.Series:
+    """Solo los dígitos del número: '001-002-000000123' y '001002000000123' coinciden."""
+    return _texto(col).str.replace(r"\D", "", regex=True)
+
+
+def _importe(col: pd.Series) -> pd.Series:
+    if pd.api.types.is_numeric_dtype(col):
+        return col.astype(float)
+    # float64 con NaN, no Float64 con NA: np.select no acepta máscaras con NA
+    return pd.to_numeric(_texto(col).str.replace(r"[^\d.\-]", "", regex=True), errors="coerce").astype(float)
+
+
+# =====================================================
+# 📥 FUENTES → COLUMNAS COMUNES
+# =====================================================
+def leer_semillas(rutas: list) -> pd.DataFrame:
+    """TXT semilla de uno o varios tipos del mismo mes, sin claves repetidas."""
+    partes = [txt_semilla.leer_txt(Path(r)) for r in rutas if r and Path(r).exists()]
+    if not partes:
+        return pd.DataFrame(columns=list(txt_semilla.COLUMNAS))
+    return pd.concat(partes, ignore_index=True).drop_duplicates("clave", ignore_index=True)
+
+
+def _lado_txt(semilla: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame({
+        "claveAcceso": _texto(semilla["clave"]),
+        "numero": _texto(semilla["serie"]),
+        "tipoDocumento": _texto(semilla["tipo"]),
+        "rucEmisor": _texto(semilla["rucEmisor"]),
+        "razonSocialEmisor": _texto(semilla["razonSocialEmisor"]),
+        "fechaEmision": _texto(semilla["fecha"]),
+        "total_txt": _importe(semilla["total"]),
+    }).drop_duplicates("claveAcceso")
+
+
+def _lado_xml(reporte: pd.DataFrame) -> pd.DataFrame:
+    def _col(nombre):
+        return reporte[nombre] if nombre in reporte.columns else pd.Series("", index=reporte.index)
+
+    total = _importe(_col("total")).fillna(0.0)
+    # Las retenciones no traen importeTotal propio (el TXT lista el del documento
+    # sustento): su importe no se compara
+    retenido = _importe(_col("retenido")).fillna(0.0)
+    total = total.where((total != 0) | (retenido == 0))
+    # Un XML dañado no trae su clave, pero el archivo se guarda como <clave>.xml
+    clave = _texto(_col("claveAcceso"))
+    del_archivo = _texto(_col("archivo")).str.extract(r"(\d{49})\.xml$", expand=False).fillna("")
+    xml = pd.DataFrame({
+        "claveAcceso": clave.where(clave != "", del_archivo),
+        "numero": _texto(_col("numero")),
+        "tipoDocumento": _texto(_col("tipoDocumento")),
+        "rucEmisor": _texto(_col("rucEmisor")),
+        "razonSocialEmisor": _texto(_col("razonSocial")),
+        "fechaEmision": _texto(_col("fechaEmision")),
+        "total_xml": total,
+        "error": _texto(_col("error")),
+    })
+    # Sin clave no hay cruce posible: esas filas ya figuran en "Errores"
+    return xml[xml["claveAcceso"] != ""].drop_duplicates("claveAcceso")
+
+
+# =====================================================
+# ⚖️ CRUCES
+# =====================================================
+def _cruce_txt(txt: pd.DataFrame, xml: pd.DataFrame, tolerancia: float) -> pd.DataFrame:
+    """
+    Join completo por claveAcceso (sin repetidos en ningún lado) con tablas
+    hash; estado vacío en las filas que cuadran. No usa merge(how="outer"),
+    que ordena todas las claves.
+    """
+    claves_txt = pd.Index(txt["claveAcceso"].to_numpy(object))
+    claves_xml = pd.Index(xml["claveAcceso"].to_numpy(object))
+    pos = claves_xml.get_indexer(claves_txt)            # -1: la clave del TXT no tiene XML
+    # XML alineado fila a fila con el TXT (NaN donde falta)
+    par = xml.drop(columns="claveAcceso").reset_index(drop=True).reindex(pos).reset_index(drop=True)
+    m = txt.reset_index(drop=True)
+    for campo in _DESCRIPTIVAS:
+        m[campo] = m[campo].where(m[campo] != "", par[campo].fillna(""))
+    m["total_xml"] = par["total_xml"]
+    m["error"] = par["error"].fillna("")
+    con_xml = pos >= 0
+
+    sobrantes = xml[claves_txt.get_indexer(claves_xml) < 0]
+    m = pd.concat([m, sobrantes], ignore_index=True)
+    en_txt = np.concatenate([np.ones(len(txt), bool), np.zeros(len(sobrantes), bool)])
+    con_xml = np.concatenate([con_xml, np.ones(len(sobrantes), bool)])
+
+    m["diferencia"] = (m["total_txt"] - m["total_xml"]).round(2)
+    ambos = en_txt & con_xml
+    m["estado"] = np.select(
+        [~con_xml, ~en_txt, ambos & (m["error"] != ""), ambos & (m["diferencia"].abs() > tolerancia)],
+        [FALTA_XML, SIN_FILA_TXT, XML_CON_ERROR, DIFERENCIA_TXT],
+        default="",
+    )
+    m["detalle"] = m["error"].where(m["estado"] == XML_CON_ERROR, "")
+    return m.drop(columns="error")
+
+
+def _cruce_emitidos(recibidos: pd.DataFrame, emitidos: pd.DataFrame, tolerancia: float) -> pd.DataFrame:
+    """
+    Recibidos de emisores que tienen Emitidos (RUC propios) frente a esa
+    tabla, por emisor + número. Los demás emisores no se cruzan.
+    """
+    emitidos = emitidos.rename(columns=_EMITIDOS)
+    if "estado" in emitidos.columns:
+        emitidos = emitidos[~_texto(emitidos["estado"]).str.upper().str.startswith("ANUL")]
+    tabla = pd.DataFrame({"rucEmisor": _texto(emitidos["rucEmisor"]),
+                          "_numero": _numero(emitidos["numero"]),
+                          "total_emitidos": _importe(emitidos["total"])})
+    tabla = tabla[(tabla["rucEmisor"] != "") & (tabla["_numero"] != "")].drop_duplicates(["rucEmisor", "_numero"])
+
+    emisores = pd.Index(tabla["rucEmisor"].unique().to_numpy(object))
+    propios = recibidos[emisores.get_indexer(recibidos["rucEmisor"].to_numpy(object)) >= 0].copy()
+    if propios.empty:
+        return propios.assign(estado="")
+    propios["_numero"] = _numero(propios["numero"])
+    m = propios.merge(tabla, on=["rucEmisor", "_numero"], how="left", indicator=True).drop(columns="_numero")
+    # Monto del lado Recibidos: el del XML si se parseó, si no el del TXT
+    monto = m["total_xml"].fillna(m["total_txt"])
+    diferencia = (monto - m["total_emitidos"]).round(2)
+    m["estado"] = np.select(
+        [m["_merge"] == "left_only", diferencia.abs() > tolerancia],
+        [FALTA_EMITIDOS, DIFERENCIA_EMITIDOS],
+        default="",
+    )
+    m["diferencia"] = diferencia.where(m["estado"] == DIFERENCIA_EMITIDOS, np.nan)
+    m["detalle"] = ""
+    return m.drop(columns="_merge")
+
+
+def conciliar(semilla: pd.DataFrame = None, reporte: pd.DataFrame = None, emitidos: pd.DataFrame = None,
+              tolerancia: float = TOLERANCIA) -> pd.DataFrame:
+    """
+    Filas con novedad entre el TXT semilla (txt_semilla.leer_txt), el detalle
+    de construir_reporte y `emitidos` (filas de Emitidos con rucEmisor o la
+    partición ruc del almacén, numero, total y estado; de uno o varios RUC).
+    Sin TXT no se buscan faltantes ni sobrantes de XML; sin Emitidos no se
+    cruza con ellos. Columnas: ver COLUMNAS.
+    """
+    if semilla is None:
+        semilla = pd.DataFrame(columns=list(txt_semilla.COLUMNAS))
+    txt = _lado_txt(semilla)
+    xml = _lado_xml(reporte if reporte is not None else pd.DataFrame())
+    if txt.empty and xml.empty:
+        return pd.DataFrame(columns=COLUMNAS)
+    cruce = _cruce_txt(txt, xml, tolerancia)
+    if txt.empty:
+        cruce["estado"] = ""           # Sin semilla no hay faltantes ni sobrantes que buscar
+    partes = [cruce[cruce["estado"] != ""]]
+
+    if emitidos is not None and not emitidos.empty:
+        # Los que no tienen XML ya figuran como "Falta XML"; se cruzan igual con su total del TXT
+        em = _cruce_emitidos(cruce.drop(columns=["estado", "diferencia", "detalle"]), emitidos, tolerancia)
+        partes.append(em[em["estado"] != ""])
+
+    partes = [p for p in partes if not p.empty]
+    if not partes:
+        return pd.DataFrame(columns=COLUMNAS)
+    res = pd.concat(partes, ignore_index=True).reindex(columns=COLUMNAS)
+    return res.sort_values(["estado", "claveAcceso"], kind="stable", ignore_index=True)
+
+
+def resumen(conciliacion: pd.DataFrame) -> dict:
+    """{estado: cantidad de filas}."""
+    return conciliacion["estado"].value_counts().to_dict() if not conciliacion.empty else {}
@@ -0,0 +1,374 @@
+# =====================================================
+# 🖥️ MÓDULO: EJECUCIÓN POR LOTES SIN INTERFAZ
+# =====================================================
+# Corre desde cron (o la imagen Docker) las descargas de una
+# cartera de RUC descrita en un JSON, sin Streamlit:
+#
+#   python -m robot.consola lote.json
+#   python -m robot.consola lote.json --procesos 3 --navegadores 6
+#   python -m robot.consola lote.json --validar     # solo muestra el plan
+#
+# Cada RUC va en su propio proceso (sesión, navegadores, ritmo
+# y errores aislados) con un tope global de navegadores. Todas
+# las combinaciones origen × período × tipo de un RUC pasan por
+# procesar_lote con un solo login: la misma carpeta descargas/,
+# reportes, ZIP e historial que un lote de la interfaz. Al final imprime en stdout un resumen JSON (los
+# avisos van a stderr); código de salida 0 = todo bien,
+# 1 = algún RUC o período falló, 2 = configuración inválida.
+# =====================================================
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, datetime
+from pathlib import Path
+
+from robot import autorizacion_ws, gobernador, historial
+from robot.downloader import (CONCURRENCIA_POR_DEFECTO, MAX_NAVEGADORES_DESCARGA, TIPOS_MAP,
+                              configurar_url_base, periodos_entre)
+from robot.tareas import procesar_lote
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DESC_DIR = BASE_DIR / "descargas"
+
+PROCESOS = max(1, int(os.environ.get("SRI_CLI_PROCESOS", "2") or 2))
+# Chromium abiertos a la vez entre todos los procesos
+NAVEGADORES = max(1, int(os.environ.get("SRI_CLI_NAVEGADORES", "4") or 4))
+
+ORIGENES = ("Recibidos", "Emitidos")
+FORMATOS = ("XML", "PDF")
+
+# Campos que cada RUC puede redefinir sobre los valores generales del archivo
+_POR_RUC = ("periodos", "tipos", "origenes", "formatos", "concurrencia")
+
+SALIDA_OK, SALIDA_FALLOS, SALIDA_CONFIG = 0, 1, 2
+
+
+class ConfiguracionInvalida(ValueError):
+    """El archivo de lote no se puede ejecutar tal como está."""
+
+
+def _ahora() -> str:
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+# =====================================================
+# 📄 CONFIGURACIÓN → TRABAJOS (UNO POR RUC)
+# =====================================================
+def _mes(texto: str) -> tuple:
+    try:
+        anio, mes = (int(p) for p in str(texto).split("-"))
+    except ValueError:
+        raise ConfiguracionInvalida(f"período inválido {texto!r} (se espera AAAA-MM)")
+    if not 1 <= mes <= 12:
+        raise ConfiguracionInvalida(f"período inválido {texto!r} (mes fuera de rango)")
+    return anio, mes
+
+
+def _periodos(valor, hoy: date = None) -> list:
+    """
+    "mes_anterior" | "mes_actual" | ["AAAA-MM", ...] | {"desde": "AAAA-MM", "hasta": "AAAA-MM"}.
+    Los nombres relativos permiten dejar un mismo archivo en cron.
+    """
+    hoy = hoy or date.today()
+    if valor == "mes_actual":
+        return [(hoy.year, hoy.month)]
+    if valor == "mes_anterior":
+        return [(hoy.year - 1, 12) if hoy.month == 1 else (hoy.year, hoy.month - 1)]
+    if isinstance(valor, dict) and "desde" in valor:
+        desde = _mes(valor["desde"])
+        hasta = _mes(valor.get("hasta") or valor["desde"])
+        periodos = periodos_entre(*desde, *hasta)
+    elif isinstance(valor, list):
+        periodos = sorted({_mes(v) for v in valor})
+    else:
+        raise ConfiguracionInvalida(f"periodos inválidos: {valor!r}")
+    if not periodos:
+        raise ConfiguracionInvalida(f"rango de períodos vacío: {valor!r}")
+    return periodos
+
+
+def _validar_lista(nombre: str, valores, permitidos) -> list:
+    if isinstance(valores, str):
+        valores = [valores]
+    elif not isinstance(valores, list):
+        raise ConfiguracionInvalida(f"{nombre} inválidos: {valores!r} (se espera una lista)")
+    desconocidos = [v for v in valores if v not in permitidos]
+    if desconocidos or not valores:
+        raise ConfiguracionInvalida(
+            f"{nombre} inválidos: {desconocidos or valores} (use {', '.join(permitidos)})"
+        )
+    return valores
+
+
+def fuente_clave(entrada: dict) -> tuple:
+    """
+    (tipo, nombre) de donde se lee la clave del RUC: {"clave_env": VAR},
+    {"clave_archivo": ruta} (p. ej. un secreto de Docker) o, por defecto,
+    la variable SRI_CLAVE_<RUC>. La clave nunca va en el archivo de lote.
+    """
+    if entrada.get("clave_archivo"):
+        return "archivo", str(entrada["clave_archivo"])
+    return "env", entrada.get("clave_env") or f"SRI_CLAVE_{entrada['ruc']}"
+
+
+def leer_clave(entrada: dict) -> str:
+    tipo, nombre = fuente_clave(entrada)
+    if tipo == "archivo":
+        try:
+            clave = Path(nombre).read_text(encoding="utf-8").strip()
+        except OSError as e:
+            raise ConfiguracionInvalida(f"no se pudo leer la clave de {entrada['ruc']} en {nombre}: {e}")
+    else:
+        clave = os.environ.get(nombre, "").strip()
+    if not clave:
+        raise ConfiguracionInvalida(f"sin clave para {entrada['ruc']} ({tipo} {nombre})")
+    return clave
+
+
+def navegadores_necesarios(concurrencia: int) -> int:
+    """Chromium que abre una corrida: el de la sesión más los de descarga en paralelo."""
+    return 1 + (min(concurrencia, MAX_NAVEGADORES_DESCARGA) if concurrencia > 1 else 0)
+
+
+def cargar_trabajos(config: dict, navegadores: int = NAVEGADORES, hoy: date = None) -> list:
+    """
+    Un trabajo por RUC con sus combinaciones ya resueltas. La concurrencia de
+    cada RUC se recorta para que sus navegadores quepan en el tope global.
+    """
+    if not isinstance(config, dict):
+        raise ConfiguracionInvalida("el archivo de lote debe ser un objeto JSON ({\"rucs\": [...], ...})")
+    if config.get("clave"):
+        raise ConfiguracionInvalida("la clave no va en el archivo de lote: use clave_env o clave_archivo")
+    rucs = config.get("rucs") or []
+    if not isinstance(rucs, list):
+        raise ConfiguracionInvalida(f"rucs debe ser una lista, no {rucs!r}")
+    if not rucs:
+        raise ConfiguracionInvalida("el archivo de lote no tiene rucs")
+    generales = {
+        "periodos": config.get("periodos", "mes_anterior"),
+        "tipos": config.get("tipos", list(TIPOS_MAP)),
+        "origenes": config.get("origenes", ["Recibidos"]),
+        "formatos": config.get("formatos", ["XML"]),
+        "concurrencia": config.get("concurrencia", CONCURRENCIA_POR_DEFECTO),
+    }
+    trabajos, vistos = [], set()
+    for entrada in rucs:
+        # "1790011223001", 1790011223001 o {"ruc": ..., <opciones del RUC>}
+        if isinstance(entrada, (str, int)) and not isinstance(entrada, bool):
+            entrada = {"ruc": str(entrada)}
+        elif isinstance(entrada, dict):
+            entrada = dict(entrada)
+        else:
+            raise ConfiguracionInvalida(f"entrada de rucs inválida: {entrada!r}")
+        ruc = str(entrada.get("ruc") or "").strip()
+        if not (ruc.isdigit() and len(ruc) == 13):
+            raise ConfiguracionInvalida(f"RUC inválido: {ruc!r}")
+        if ruc in vistos:
+            raise ConfiguracionInvalida(f"RUC repetido: {ruc} (un solo trabajo por RUC)")
+        if entrada.get("clave"):
+            raise ConfiguracionInvalida(f"{ruc}: la clave no va en el archivo de lote")
+        vistos.add(ruc)
+        opciones = {**generales, **{k: entrada[k] for k in _POR_RUC if k in entrada}}
+        try:
+            concurrencia = max(1, int(opciones["concurrencia"] or 1))
+        except (TypeError, ValueError):
+            raise ConfiguracionInvalida(f"{ruc}: concurrencia inválida {opciones['concurrencia']!r}")
+        # Sesión + descargas en paralelo deben caber en el tope global
+        while concurrencia > 1 and navegadores_necesarios(concurrencia) > navegadores:
+            concurrencia -= 1
+        trabajos.append({
+            "ruc": ruc,
+            "fuente_clave": dict(zip(("tipo", "nombre"), fuente_clave({**entrada, "ruc": ruc}))),
+            "periodos": _periodos(opciones["periodos"], hoy),
+            "tipos": _validar_lista("tipos", opciones["tipos"], list(TIPOS_MAP)),
+            "origenes": _validar_lista("origenes", opciones["origenes"], ORIGENES),
+            "formatos": _validar_lista("formatos", opciones["formatos"], FORMATOS),
+            "concurrencia": concurrencia,
+            "navegadores": navegadores_necesarios(concurrencia),
+            "descargas": str(Path(config.get("descargas") or DESC_DIR)),
+            "url_base": config.get("url_base"),
+            "_entrada": {**entrada, "ruc": ruc},
+        })
+    return trabajos
+
+
+# =====================================================
+# 👷 TRABAJO DE UN RUC (EN SU PROPIO PROCESO)
+# =====================================================
+def _iniciar_proceso():
+    # stdout queda libre para el resumen JSON del proceso principal
+    sys.stdout = sys.stderr
+
+
+def _resumen_corrida(r: dict) -> dict:
+    campos = ("estado", "n_xml", "n_pdf", "n_registros", "n_fallidas", "reporte_excel", "zip",
+              "fallidas", "error")
+    return {c: r[c] for c in campos if r.get(c) is not None}
+
+
+def ejecutar_ruc(trabajo: dict, ejecutor=procesar_lote) -> dict:
+    """
+    Todas las combinaciones origen × período × tipo de un RUC como un solo
+    lote: un login y un navegador de sesión para todo el RUC; un fallo en
+    una combinación no detiene las demás.
+    """
+    inicio = time.perf_counter()
+    ruc = trabajo["ruc"]
+    resultado = {"ruc": ruc, "pid": os.getpid(), "inicio": _ahora(), "corridas": []}
+    try:
+        if trabajo.get("url_base"):
+            configurar_url_base(trabajo["url_base"])
+        clave = leer_clave(trabajo["_entrada"])
+    except Exception as e:
+        resultado.update(estado="error", error=str(e), segundos=round(time.perf_counter() - inicio, 2))
+        return resultado
+
+    try:
+        lote = ejecutor(ruc, clave, trabajo["periodos"], trabajo["tipos"], trabajo["origenes"],
+                        trabajo["formatos"], Path(trabajo["descargas"]), concurrencia=trabajo["concurrencia"])
+    except Exception as e:
+        # Sin login (clave, portal caído...) no hay combinación que valga
+        print(f"[WARN] Lote de {ruc} falló: {e}")
+        resultado.update(estado="error", error=str(e), segundos=round(time.perf_counter() - inicio, 2))
+        return resultado
+
+    for r in lote["resultados"]:
+        corrida = {c: r[c] for c in ("origen", "anio", "mes", "tipo")}
+        corrida.update(_resumen_corrida(r))
+        resultado["corridas"].append(corrida)
+    resultado["reporte_lote"] = lote.get("reporte_lote")
+
+    errores = sum(c.get("estado") == "error" for c in resultado["corridas"])
+    resultado["estado"] = "ok" if not errores else ("error" if errores == len(resultado["corridas"]) else "parcial")
+    resultado["segundos"] = round(time.perf_counter() - inicio, 2)
+    return resultado
+
+
+# =====================================================
+# 🚦 PLANIFICADOR: PROCESOS Y TOPE GLOBAL DE NAVEGADORES
+# =====================================================
+def _repartir_ritmo(procesos: int) -> dict:
+    """
+    Cada proceso tiene su propio gobernador por host: se le da su parte del
+    ritmo configurado para que el total hacia el SRI no se multiplique.
+    """
+    return {
+        "SRI_TASA_INICIAL": str(gobernador.TASA_INICIAL / procesos),
+        "SRI_TASA_MAX": str(gobernador.TASA_MAX / procesos),
+        "SRI_WS_TASA_INICIAL": str(autorizacion_ws.TASA_WS / procesos),
+        "SRI_WS_TASA_MAX": str(autorizacion_ws.TASA_MAX_WS / procesos),
+    }
+
+
+def ejecutar_trabajos(trabajos: list, procesos: int = PROCESOS, navegadores: int = NAVEGADORES,
+                      ejecutor=procesar_lote) -> list:
+    """
+    Reparte los trabajos en un pool de procesos nuevos (uno por RUC) sin
+    superar `navegadores` Chromium abiertos entre todos. Si un proceso muere
+    (p. ej. sin memoria), sus trabajos en curso se dan por fallidos y el
+    resto sigue en un pool nuevo.
+    """
+    procesos = max(1, min(procesos, len(trabajos)))
+    # Los procesos hijos heredan el entorno al crearse
+    os.environ.update(_repartir_ritmo(procesos))
+    # Historial creado (y migrado) una sola vez, antes de que escriban los procesos
+    historial._conectar().close()
+
+    def _cupo(trabajo):
+        # Un trabajo que pide más que el tope igual corre, pero solo
+        return min(trabajo["navegadores"], navegadores)
+
+    pendientes = list(trabajos)
+    resultados = []
+    while pendientes:
+        libres = navegadores
+        en_curso = {}
+        with ProcessPoolExecutor(max_workers=procesos, mp_context=multiprocessing.get_context("spawn"),
+                                 max_tasks_per_child=1, initializer=_iniciar_proceso) as pool:
+            try:
+                while pendientes or en_curso:
+                    while pendientes and len(en_curso) < procesos and _cupo(pendientes[0]) <= libres:
+                        en_curso[pool.submit(ejecutar_ruc, pendientes[0], ejecutor)] = pendientes[0]
+                        libres -= _cupo(pendientes.pop(0))
+                    hechos, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+                    for futuro in hechos:
+                        resultados.append(futuro.result())
+                        libres += _cupo(en_curso.pop(futuro))
+            except BrokenProcessPool as e:
+                # Sin trabajos en curso el pool no llegó a arrancar: se descarta el siguiente
+                # para no reintentar sin fin
+                caidos = list(en_curso.values()) or pendientes[:1]
+                del pendientes[:0 if en_curso else 1]
+                for trabajo in caidos:
+                    resultados.append({"ruc": trabajo["ruc"], "estado": "error", "corridas": [],
+                                       "error": f"el proceso terminó de forma inesperada: {e}"})
+    orden = {t["ruc"]: i for i, t in enumerate(trabajos)}
+    return sorted(resultados, key=lambda r: orden.get(r["ruc"], len(orden)))
+
+
+def resumen(resultados: list, inicio: str, segundos: float) -> dict:
+    corridas = [c for r in resultados for c in r.get("corridas", [])]
+    totales = {
+        "rucs": len(resultados),
+        "rucs_con_error": sum(r.get("estado") != "ok" for r in resultados),
+        "corridas": len(corridas),
+        "corridas_con_error": sum(c.get("estado") == "error" for c in corridas),
+    }
+    for campo in ("n_xml", "n_pdf", "n_registros", "n_fallidas"):
+        totales[campo] = sum(c.get(campo, 0) for c in corridas)
+    estado = "ok" if not totales["rucs_con_error"] else (
+        "error" if totales["rucs_con_error"] == len(resultados) else "parcial")
+    return {"estado": estado, "inicio": inicio, "fin": _ahora(), "segundos": round(segundos, 2),
+            "totales": totales, "rucs": resultados}
+
+
+# =====================================================
+# 🚀 ENTRADA
+# =====================================================
+def _plan(trabajos: list) -> list:
+    return [{k: v for k, v in t.items() if not k.startswith("_")} for t in trabajos]
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Descargas del SRI por lotes, sin interfaz (para cron).")
+    ap.add_argument("config", type=Path, help="archivo JSON del lote (RUC, períodos, tipos, claves)")
+    ap.add_argument("--procesos", type=int, default=PROCESOS, help="RUC en paralelo (un proceso cada uno)")
+    ap.add_argument("--navegadores", type=int, default=NAVEGADORES, help="tope global de Chromium abiertos")
+    ap.add_argument("--salida", type=Path, help="escribe también el resumen JSON en este archivo")
+    ap.add_argument("--validar", action="store_true", help="solo valida el archivo y muestra el plan")
+    args = ap.parse_args(argv)
+
+    inicio, t0 = _ahora(), time.perf_counter()
+    try:
+        config = json.loads(args.config.read_text(encoding="utf-8"))
+        trabajos = cargar_trabajos(config, max(1, args.navegadores))
+        if args.validar:
+            # Las claves también se validan, sin mostrarlas
+            for t in trabajos:
+                leer_clave(t["_entrada"])
+    except (OSError, ValueError) as e:
+        print(json.dumps({"estado": "config_invalida", "error": str(e)}, ensure_ascii=False))
+        return SALIDA_CONFIG
+
+    if args.validar:
+        print(json.dumps({"estado": "valido", "trabajos": _plan(trabajos)}, ensure_ascii=False, indent=2))
+        return SALIDA_OK
+
+    resultados = ejecutar_trabajos(trabajos, max(1, args.procesos), max(1, args.navegadores))
+    salida = resumen(resultados, inicio, time.perf_counter() - t0)
+    texto = json.dumps(salida, ensure_ascii=False, indent=2)
+    if args.salida:
+        args.salida.parent.mkdir(parents=True, exist_ok=True)
+        args.salida.write_text(texto, encoding="utf-8")
+    print(texto)
+    return SALIDA_OK if salida["estado"] == "ok" else SALIDA_FALLOS
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,52 @@
-from playwright.sync_api import sync_playwright
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from urllib.parse import urlsplit
 import pandas as pd
-import csv, re, json, os, time
+import re, os, queue, threading, time, unicodedata, weakref
+
+from robot.manifiesto import Manifiesto
+from robot.navegadores import aplicar_modo_liviano, pool_navegadores
+from robot.sesiones import cargar_sesion, guardar_sesion, invalidar_sesion
+from robot.tabla_emitidos import COLUMNAS_EMITIDOS, iterar_paginas
+from robot.esperas import esperar_ajax, esperar_resultados, limpiar_resultados
+from robot.metricas import Metricas
+from robot.gobernador import ErrorDefinitivo, PortalNoDisponible, gobernador
+from robot import almacen, autorizacion_ws, indice, txt_semilla
 
 # ====== Configuración global ======
 os.environ["PLAYWRIGHT_BROWSERS_PATH"] = "/root/.cache/ms-playwright"
 os.environ["PYPPETEER_HOME"] = "/root/.cache/ms-playwright"
 
-URLS = {
-    "Recibidos": "https://srienlinea.sri.gob.ec/comprobantes-electronicos-internet/pages/consultas/recibidos/comprobantesRecibidos.jsf",
-    "Emitidos":  "https://srienlinea.sri.gob.ec/comprobantes-electronicos-internet/pages/consultas/emitidos/comprobantesEmitidos.jsf",
+# URL base del portal; SRI_URL_BASE permite apuntar a un portal local de pruebas
+URL_BASE = os.environ.get("SRI_URL_BASE", "https://srienlinea.sri.gob.ec").rstrip("/")
+RUTAS = {
+    "Recibidos": "/comprobantes-electronicos-internet/pages/consultas/recibidos/comprobantesRecibidos.jsf",
+    "Emitidos":  "/comprobantes-electronicos-internet/pages/consultas/emitidos/comprobantesEmitidos.jsf",
 }
+RUTA_LOGIN = "/sri-en-linea/inicio/NAT"
+URLS = {origen: URL_BASE + ruta for origen, ruta in RUTAS.items()}
+URL_LOGIN = URL_BASE + RUTA_LOGIN
+
+# Número de páginas que descargan claves en paralelo (sobrescribible desde la UI)
+CONCURRENCIA_POR_DEFECTO = max(1, int(os.environ.get("SRI_CONCURRENCIA", "1") or 1))
+
+# Trabajadores de descarga por corrida (cada uno abre un Chromium del pool)
+MAX_NAVEGADORES_DESCARGA = max(1, int(os.environ.get("SRI_MAX_NAVEGADORES", "8") or 8))
+
+# XML por el web service de autorización (el navegador queda para el TXT y los RIDE)
+XML_POR_WS = os.environ.get("SRI_XML_POR_WS", "1") != "0"
+
+# Modo liviano: sin imágenes/fuentes/CSS ni hosts de terceros, y las claves se
+# consultan sobre el formulario ya cargado en lugar de recargar la página cada vez
+MODO_LIVIANO = os.environ.get("SRI_MODO_LIVIANO", "0") == "1"
+# Claves que ya estaban en otra carpeta (no es un TXT semilla)
+ARCHIVO_DUPLICADAS = "claves_duplicadas.txt"
+# Páginas con el formulario de consulta por clave listo para la siguiente clave
+_FORMULARIO_LISTO = weakref.WeakSet()
+_CLIENTES_WS = {}
+_LOCK_CLIENTES_WS = threading.Lock()
 
 TIPOS_MAP = {
     "Facturas": "Factura",
@@ -20,212 +56,682 @@ TIPOS_MAP = {
     "Liquidación de compra": "Liquidación de compra de bienes y prestación de servicios",
 }
 
+def configurar_url_base(url_base: str):
+    """Cambia en caliente el portal contra el que trabaja el robot (p. ej. el simulado)."""
+    global URL_BASE, URL_LOGIN
+    URL_BASE = url_base.rstrip("/")
+    URLS.update({origen: URL_BASE + ruta for origen, ruta in RUTAS.items()})
+    URL_LOGIN = URL_BASE + RUTA_LOGIN
+
 # ====== Funciones auxiliares ======
 def _mes_a_texto(mes: int) -> str:
     return ["Enero","Febrero","Marzo","Abril","Mayo","Junio",
             "Julio","Agosto","Septiembre","Octubre","Noviembre","Diciembre"][mes-1]
 
-def _es_clave(valor: str) -> bool:
-    return bool(re.fullmatch(r"\d{49}", (valor or "").strip()))
-
-def _detectar_delimitador(sample: str) -> str:
-    counts = { ';': sample.count(';'), ',': sample.count(','), '\t': sample.count('\t') }
-    return max(counts, key=counts.get) if any(counts.values()) else ';'
+def _iterar_claves_desde_txt(txt_path: Path):
+    """Genera {clave, tipo, fecha, ...} por cada fila del TXT con clave de acceso, sin cargarlo entero."""
+    return txt_semilla.iterar_claves(txt_path)
 
 def _extraer_claves_desde_txt(txt_path: Path):
-    claves = []
-    sample = txt_path.read_text(encoding="utf-8", errors="ignore")[:4096]
-    sep = _detectar_delimitador(sample)
-    with open(txt_path, "r", encoding="utf-8", errors="ignore") as f:
-        reader = csv.reader(f, delimiter=sep)
-        for row in reader:
-            if not row: 
-                continue
-            clave = next((c.strip() for c in row if _es_clave(c)), None)
-            if not clave:
-                continue
-            tipo = next((c.strip() for c in row if c.lower().startswith(("factura","comprobante","nota","liquidación"))), "")
-            fecha = next((c.strip() for c in row if re.fullmatch(r"\d{2}/\d{2}/\d{4}", c.strip())), "")
-            claves.append({"clave": clave, "tipo": tipo, "fecha": fecha})
-    return claves
+    return list(_iterar_claves_desde_txt(txt_path))
+
+def _contar_filas(txt_path: Path) -> int:
+    """Estimación rápida de claves del TXT (líneas menos encabezado) para el avance."""
+    n = 0
+    with open(txt_path, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            n += bloque.count(b"\n")
+    return max(0, n - 1)
+
+_ESTRATEGIAS_CLICK = [
+    lambda page, texto: page.get_by_role("button", name=texto, exact=False),
+    lambda page, texto: page.get_by_text(texto, exact=False),
+    lambda page, texto: page.locator(f"//button[contains(., '{texto}') or @title[contains(.,'{texto}')]]"),
+]
+# Estrategia que funcionó la última vez para cada (portal, texto de botón)
+_ESTRATEGIA_CACHE = {}
+_LOCK_ESTRATEGIAS = threading.Lock()
 
 def _click_texto(page, texto: str) -> bool:
-    for metodo in [
-        lambda: page.get_by_role("button", name=texto, exact=False),
-        lambda: page.get_by_text(texto, exact=False),
-        lambda: page.locator(f"//button[contains(., '{texto}') or @title[contains(.,'{texto}')]]")
-    ]:
+    # Por portal: el real y el simulado (o dos versiones del sitio) no comparten botones
+    url = urlsplit(page.url)
+    llave = (url.scheme, url.netloc, texto)
+    with _LOCK_ESTRATEGIAS:
+        cacheada = _ESTRATEGIA_CACHE.get(llave)
+    orden = list(range(len(_ESTRATEGIAS_CLICK)))
+    if cacheada is not None:
+        orden.remove(cacheada)
+        orden.insert(0, cacheada)
+    for i in orden:
         try:
-            metodo().first.click(timeout=3000)
+            _ESTRATEGIAS_CLICK[i](page, texto).first.click(timeout=3000)
+            with _LOCK_ESTRATEGIAS:
+                _ESTRATEGIA_CACHE[llave] = i
             return True
         except Exception:
             continue
     return False
 
+def _consultar(page):
+    """Pulsa Consultar y espera la respuesta del portal y el render de resultados."""
+    esperar_ajax(page, lambda: _click_texto(page, "Consultar"))
+    esperar_resultados(page)
+
 def _seleccionar(page, etiqueta: str, valor_visible: str):
-    try:
-        sel = page.get_by_label(etiqueta, exact=False).locator("select")
-        sel.select_option(label=valor_visible)
-        return
-    except Exception:
-        pass
-    try:
-        page.locator(f"text={etiqueta}").locator("xpath=..").locator("select").select_option(label=valor_visible)
-    except Exception:
-        pass
+    # Bajo una misma etiqueta puede haber varios <select> (año, mes, día):
+    # se usa el que tenga una opción con ese texto
+    for contenedor in (page.get_by_label(etiqueta, exact=False),
+                       page.locator(f"text={etiqueta}").locator("xpath=..")):
+        try:
+            selects = contenedor.locator("select")
+            for i in range(selects.count()):
+                sel = selects.nth(i)
+                if sel.locator("option", has_text=valor_visible).count():
+                    sel.select_option(label=valor_visible)
+                    return
+        except Exception:
+            continue
 
 def _espera_captcha(page):
+    # Comprobación instantánea: solo se espera si el captcha está en el DOM
     try:
-        loc = page.locator("img[alt='captcha']")
-        if loc.is_visible(timeout=1500):
+        if page.locator("img[alt='captcha']").count():
             page.wait_for_selector("img[alt='captcha']", state="detached", timeout=60000)
     except Exception:
         pass
 
-def _login(context, page, ruc, clave, cookies_path: Path):
-    if cookies_path.exists():
-        try:
-            context.add_cookies(json.loads(cookies_path.read_text()))
-            return
-        except Exception:
-            pass
-    page.goto("https://srienlinea.sri.gob.ec/sri-en-linea/inicio/NAT", timeout=60000)
-    page.wait_for_load_state("domcontentloaded")
+def _en_login(page) -> bool:
+    """True si el portal nos devolvió al formulario de ingreso (sesión vencida)."""
+    if "/auth/" in page.url or "inicio/NAT" in page.url:
+        return True
+    try:
+        return page.locator("input[name='password']").count() > 0
+    except Exception:
+        return False
+
+def _portal():
+    """Gobernador (ritmo, reintentos, disyuntor) del host del portal."""
+    return gobernador(URL_BASE)
+
+def _abrir_consulta(page, origen: str, metricas: Metricas = None) -> bool:
+    """Abre la página de consulta; False si la sesión no es válida."""
+    _FORMULARIO_LISTO.discard(page)
+    _portal().ejecutar(page.goto, URLS.get(origen, URLS["Recibidos"]), timeout=60000,
+                       wait_until="domcontentloaded", metricas=metricas)
+    return not _en_login(page)
+
+def _login(page, ruc, clave, metricas: Metricas = None):
+    page.goto(URL_LOGIN, timeout=60000, wait_until="domcontentloaded")
     try:
         page.fill("input[name='usuario']", ruc)
         page.fill("input[name='password']", clave)
     except Exception:
         page.get_by_placeholder("Ruc/Cédula/Pasaporte").fill(ruc)
         page.get_by_placeholder("Contraseña").fill(clave)
-    _espera_captcha(page)
+    with (metricas or Metricas()).fase("captcha"):
+        _espera_captcha(page)
     _click_texto(page, "Ingresar")
-    page.wait_for_load_state("networkidle")
+    # Listo cuando el portal sale del formulario de autenticación
     try:
-        cookies_path.write_text(json.dumps(context.cookies()))
+        page.wait_for_url(lambda url: "/auth/" not in url and "inicio/NAT" not in url, timeout=60000)
     except Exception:
         pass
 
 # ============================================================
 # 🔹 DESCARGA DE COMPROBANTES RECIBIDOS (TXT + XML + PDF)
 # ============================================================
-def _flujo_recibidos(page, destino: Path, anio: int, mes: int, tipo: str, formatos: list):
-    _seleccionar(page, "Período emisión", str(anio))
-    _seleccionar(page, "Período emisión", _mes_a_texto(mes))
-    try: _seleccionar(page, "Período emisión", "Todos")
-    except Exception: pass
-    tipo_visible = TIPOS_MAP.get(tipo, tipo)
-    _seleccionar(page, "Tipo de comprobante", tipo_visible)
-    _click_texto(page, "Consultar")
-    page.wait_for_load_state("networkidle")
-    time.sleep(1)
-
-    with page.expect_download() as dl_info:
-        if not _click_texto(page, "Descargar reporte"):
-            raise RuntimeError("No se encontró el botón 'Descargar reporte'.")
-    dl = dl_info.value
-    txt_path = destino / (dl.suggested_filename or f"RECIBIDOS_{anio}_{mes:02d}.txt")
-    dl.save_as(str(txt_path))
-    claves = _extraer_claves_desde_txt(txt_path)
+def _liviano(context, metricas: Metricas = None):
+    """Activa el filtro de recursos del modo liviano en `context` (si está habilitado)."""
+    if MODO_LIVIANO:
+        aplicar_modo_liviano(context, [urlsplit(URL_BASE).hostname],
+                             al_bloquear=(lambda: metricas.contar("recursos_bloqueados")) if metricas else None)
 
-    destino_xml = destino / "XML"; destino_pdf = destino / "PDF"
-    destino_xml.mkdir(exist_ok=True); destino_pdf.mkdir(exist_ok=True)
-    n_xml = n_pdf = 0
+def _descargar_clave(page, clave: str, manifiesto: Manifiesto, formatos: list):
+    """
+    Consulta una clave de acceso en la página de Recibidos y guarda su XML/PDF.
+    Cada archivo se valida y anota en el manifiesto del destino.
+    Devuelve (n_xml, n_pdf, bytes) descargados; lanza excepción si la consulta falla.
+    En modo liviano, si la clave anterior terminó bien en esta página, se reutiliza
+    su formulario; ante cualquier error la siguiente consulta recarga la página.
+    """
+    n_xml = n_pdf = n_bytes = 0
+    if page in _FORMULARIO_LISTO:
+        _FORMULARIO_LISTO.discard(page)
+        limpiar_resultados(page)
+    else:
+        page.goto(URLS["Recibidos"], timeout=60000, wait_until="domcontentloaded")
+        _espera_captcha(page)
+        page.get_by_text("Clave de acceso", exact=False).click()
+    page.fill("input", clave)
+    _consultar(page)
+    if "XML" in formatos:
+        with page.expect_download() as dlinfo:
+            _click_texto(page, "XML") or _click_texto(page, "Descargar XML")
+        d = dlinfo.value
+        d.save_as(str(manifiesto.ruta_archivo(clave, "XML")))
+        n_bytes += manifiesto.registrar(clave, "XML")["tamano"]
+        n_xml += 1
+    if "PDF" in formatos:
+        with page.expect_download() as dlinfo:
+            _click_texto(page, "RIDE") or _click_texto(page, "PDF")
+        d = dlinfo.value
+        d.save_as(str(manifiesto.ruta_archivo(clave, "PDF")))
+        n_bytes += manifiesto.registrar(clave, "PDF")["tamano"]
+        n_pdf += 1
+    if MODO_LIVIANO:
+        _FORMULARIO_LISTO.add(page)
+    return n_xml, n_pdf, n_bytes
+
+def _descargar_clave_gobernada(page, clave: str, manifiesto: Manifiesto, formatos: list, metricas: Metricas = None):
+    """
+    _descargar_clave a través del gobernador del portal. Cada reintento pide solo
+    los formatos que siguen faltando; el resultado cuenta todo lo bajado entre intentos.
+    """
+    def _intento():
+        return _descargar_clave(page, clave, manifiesto, manifiesto.pendientes(clave, formatos))
+
+    _portal().ejecutar(_intento, metricas=metricas)
+    n_bytes = sum(manifiesto.ruta_archivo(clave, f).stat().st_size for f in formatos)
+    return int("XML" in formatos), int("PDF" in formatos), n_bytes
+
+def _descargar_claves_en_paralelo(storage_state: dict, tareas: list, manifiesto: Manifiesto, concurrencia: int,
+                                  al_terminar=None, al_fallar=None, metricas: Metricas = None):
+    """
+    Reparte las tareas (clave, formatos pendientes; lista o generador) entre `concurrencia` trabajadores
+    que comparten la sesión ya autenticada (storage_state). La API síncrona de
+    Playwright no puede usarse entre hilos, así que cada trabajador usa el Chromium
+    de su hilo (pool de navegadores) y consume una cola acotada.
+    `al_fallar(clave, formatos, error)` recibe cada clave que no se pudo completar.
+    Los hilos son propios de cada llamada: un trabajo no deja sin trabajadores a otro.
+    """
+    cola = queue.Queue(maxsize=concurrencia * 2)
+    lock = threading.Lock()
+    totales = {"n_xml": 0, "n_pdf": 0}
+    hilos = []
 
-    for i, item in enumerate(claves, start=1):
-        clave = item["clave"]
+    def _avisar(fn, *args):
+        # Un error en el callback (progreso, manifiesto...) no debe matar al trabajador
         try:
-            page.goto(URLS["Recibidos"], timeout=60000)
-            page.wait_for_load_state("domcontentloaded")
-            _espera_captcha(page)
-            page.get_by_text("Clave de acceso", exact=False).click()
-            page.fill("input", clave)
-            _click_texto(page, "Consultar")
-            page.wait_for_load_state("networkidle")
-            time.sleep(0.5)
-            if "XML" in formatos:
-                with page.expect_download() as dlinfo:
-                    _click_texto(page, "XML") or _click_texto(page, "Descargar XML")
-                d = dlinfo.value
-                d.save_as(str(destino_xml / f"{clave}.xml"))
-                n_xml += 1
-            if "PDF" in formatos:
-                with page.expect_download() as dlinfo:
-                    _click_texto(page, "RIDE") or _click_texto(page, "PDF")
-                d = dlinfo.value
-                d.save_as(str(destino_pdf / f"{clave}.pdf"))
-                n_pdf += 1
+            fn(*args)
         except Exception as e:
-            print(f"[WARN] No se pudo descargar {clave}: {e}")
-            continue
+            print(f"[WARN] Error en el aviso de descarga {getattr(fn, '__name__', fn)}: {e}")
+
+    def _encolar(tarea):
+        # Si todos los trabajadores terminaron nadie vaciará la cola: no bloquear para siempre
+        while True:
+            try:
+                cola.put(tarea, timeout=1)
+                return
+            except queue.Full:
+                if all(h.done() for h in hilos):
+                    raise RuntimeError("los trabajadores de descarga terminaron con tareas pendientes")
+
+    def _consumir(page):
+        while True:
+            tarea = cola.get()
+            if tarea is None:
+                return
+            clave, formatos = tarea
+            n_bytes, ok, inicio = 0, False, time.perf_counter()
+            try:
+                if page is None:
+                    raise RuntimeError("el trabajador no pudo abrir el navegador")
+                x, pdf, n_bytes = _descargar_clave_gobernada(page, clave, manifiesto, formatos, metricas)
+                with lock:
+                    totales["n_xml"] += x; totales["n_pdf"] += pdf
+                ok = True
+            except Exception as e:
+                print(f"[WARN] No se pudo descargar {clave}: {e}")
+                if al_fallar:
+                    _avisar(al_fallar, clave, formatos, e)
+            if al_terminar:
+                _avisar(al_terminar, n_bytes, time.perf_counter() - inicio, ok)
+
+    def _trabajador():
+        page_lista = []
+        try:
+            with pool_navegadores().contexto(accept_downloads=True, storage_state=storage_state) as context:
+                _liviano(context, metricas)
+                page_lista.append(context.new_page())
+                _consumir(page_lista[0])
+        except Exception as e:
+            # Si el navegador no arranca, seguir vaciando la cola para no bloquear al productor
+            print(f"[WARN] Trabajador de descarga sin navegador: {e}")
+            if not page_lista:
+                _consumir(None)
+        finally:
+            # El hilo muere con la llamada: su navegador no debe quedar abierto
+            pool_navegadores().liberar()
+
+    # `tareas` puede ser un generador: los navegadores se abren a medida que llegan tareas
+    n_hilos = min(concurrencia, MAX_NAVEGADORES_DESCARGA)
+    with ThreadPoolExecutor(max_workers=n_hilos, thread_name_prefix="descarga") as ejecutor:
+        try:
+            for tarea in tareas:
+                if len(hilos) < n_hilos:
+                    hilos.append(ejecutor.submit(_trabajador))
+                _encolar(tarea)
+        finally:
+            for _ in hilos:
+                try:
+                    _encolar(None)
+                except RuntimeError:
+                    break
+            for h in hilos:
+                h.result()
+    return totales["n_xml"], totales["n_pdf"]
+
+def _cliente_ws() -> autorizacion_ws.ClienteAutorizacion:
+    """Cliente compartido por URL del servicio: sus conexiones siguen vivas entre corridas."""
+    with _LOCK_CLIENTES_WS:
+        cliente = _CLIENTES_WS.get(autorizacion_ws.URL_WS)
+        if cliente is None:
+            cliente = _CLIENTES_WS[autorizacion_ws.URL_WS] = autorizacion_ws.ClienteAutorizacion()
+        return cliente
+
+def _xml_por_ws(tareas, manifiesto: Manifiesto, al_obtener, metricas: Metricas = None):
+    """
+    Etapa de la tubería de claves: pide al web service el XML de cada tarea que lo
+    necesite (varias consultas en vuelo) y deja pasar hacia el navegador lo que
+    falte (PDF, o el XML si el servicio no lo dio), a medida que se resuelve.
+    `al_obtener(n_bytes, segundos, completa)` se llama por cada XML obtenido.
+    """
+    cliente = _cliente_ws()
+    en_vuelo = deque()
+
+    def _resolver(clave, pendientes, futuro):
+        obtenido = futuro.result()
+        if obtenido is None:
+            return clave, pendientes
+        resto = [f for f in pendientes if f != "XML"]
+        al_obtener(*obtenido, not resto)
+        return (clave, resto) if resto else None
 
-    return {"estado": "ok", "n_xml": n_xml, "n_pdf": n_pdf, "txt": str(txt_path)}
+    with ThreadPoolExecutor(max_workers=cliente.max_conexiones, thread_name_prefix="ws-autorizacion") as ejecutor:
+        for clave, pendientes in tareas:
+            if "XML" not in pendientes:
+                yield clave, pendientes
+                continue
+            en_vuelo.append((clave, pendientes, ejecutor.submit(cliente.guardar, clave, manifiesto, metricas)))
+            # Ventana acotada: salen en orden las ya resueltas; si hay demasiadas en vuelo, se espera
+            while en_vuelo and (en_vuelo[0][2].done() or len(en_vuelo) >= 2 * cliente.max_conexiones):
+                tarea = _resolver(*en_vuelo.popleft())
+                if tarea:
+                    yield tarea
+        while en_vuelo:
+            tarea = _resolver(*en_vuelo.popleft())
+            if tarea:
+                yield tarea
+
+def _flujo_recibidos(page, destino: Path, anio: int, mes: int, tipo: str, formatos: list, concurrencia: int = 1,
+                     progreso=None, metricas: Metricas = None, al_guardar=None):
+    metricas = metricas or Metricas()
+    # La consulta por período cambia el formulario: la primera clave recarga la página
+    _FORMULARIO_LISTO.discard(page)
+    with metricas.fase("consulta"):
+        _seleccionar(page, "Período emisión", str(anio))
+        _seleccionar(page, "Período emisión", _mes_a_texto(mes))
+        try: _seleccionar(page, "Período emisión", "Todos")
+        except Exception: pass
+        tipo_visible = TIPOS_MAP.get(tipo, tipo)
+        _seleccionar(page, "Tipo de comprobante", tipo_visible)
+        _consultar(page)
+
+    def _descargar_txt():
+        with page.expect_download() as dl_info:
+            if not _click_texto(page, "Descargar reporte"):
+                raise ErrorDefinitivo("No se encontró el botón 'Descargar reporte'.")
+        dl = dl_info.value
+        ruta = destino / (dl.suggested_filename or f"RECIBIDOS_{anio}_{mes:02d}.txt")
+        dl.save_as(str(ruta))
+        return ruta
+
+    with metricas.fase("txt"):
+        txt_path = _portal().ejecutar(_descargar_txt, metricas=metricas)
+        if al_guardar:
+            al_guardar(destino, txt_path)
+
+    destino_xml = destino / "XML"; destino_pdf = destino / "PDF"
+    destino_xml.mkdir(exist_ok=True); destino_pdf.mkdir(exist_ok=True)
+
+    # Tubería: TXT (claves leídas de a una) → manifiesto → web service → navegador.
+    # Cada archivo guardado se avisa por al_guardar (ZIP, parseo) apenas llega.
+    manifiesto = Manifiesto(destino, al_registrar=(lambda ruta: al_guardar(destino, ruta)) if al_guardar else None)
+    try:
+        manifiesto.indexar()
+    except Exception as e:
+        print(f"[WARN] No se pudo actualizar el índice de claves: {e}")
+    conteo = {"claves": 0, "n_xml": 0, "n_pdf": 0, "n_omitidos": 0, "n_duplicadas": 0}
+    # Claves que agotaron sus reintentos: {clave: (formatos, error)}
+    fallidas = {}
+    lock_fallidas = threading.Lock()
+    portal = {"caido": False}
+
+    def _fallida(clave: str, pendientes: list, error: Exception):
+        with lock_fallidas:
+            fallidas[clave] = (pendientes, f"{type(error).__name__}: {error}")
+            portal["caido"] |= isinstance(error, PortalNoDisponible)
+
+    # Avance: progreso(claves_hechas, claves_totales, bytes_descargados). Mientras se
+    # lee el TXT, el total es una estimación por número de líneas.
+    avance = {"hechas": 0, "bytes": 0, "total": _contar_filas(txt_path)}
+    lock_avance = threading.Lock()
+
+    def _hecha(n_bytes: int = 0):
+        with lock_avance:
+            avance["hechas"] += 1
+            avance["bytes"] += n_bytes
+            if progreso:
+                progreso(avance["hechas"], max(avance["total"], conteo["claves"]), avance["bytes"])
+
+    def _avanzar(n_bytes: int, segundos: float, ok: bool):
+        metricas.observar("clave_segundos", segundos)
+        metricas.contar("bytes", n_bytes)
+        if not ok:
+            metricas.contar("fallos")
+        _hecha(n_bytes)
+
+    # Claves que el índice ya tiene en otra carpeta: {clave: ruta del XML} para el reporte
+    duplicadas = {}
+
+    def _en_otras_carpetas(claves: list) -> dict:
+        """{formato: {clave: ruta}} de lo que ya está descargado fuera de este período."""
+        fuera = {}
+        for formato in formatos:
+            try:
+                fuera[formato] = indice.en_otras_carpetas(claves, formato, destino)
+            except Exception as e:
+                print(f"[WARN] No se pudo consultar el índice de claves: {e}")
+                fuera[formato] = {}
+        return fuera
+
+    def _tareas():
+        # Reanudación: solo se piden los formatos que aún no están completos y válidos.
+        # Los ya presentes cuentan en n_xml/n_pdf como si se hubieran descargado.
+        # Lo que el índice ya tiene en otra carpeta (otro período/tipo) no se vuelve a
+        # bajar ni se cuenta aquí: va a n_duplicadas. El índice se consulta por lotes
+        # del TXT, no clave por clave.
+        claves = _iterar_claves_desde_txt(txt_path)
+        while lote := [(item["clave"], manifiesto.pendientes(item["clave"], formatos))
+                       for item in islice(claves, indice.LOTE_CONSULTA)]:
+            fuera = _en_otras_carpetas([clave for clave, _ in lote])
+            for clave, pendientes in lote:
+                conteo["claves"] += 1
+                conteo["n_xml"] += ("XML" in formatos and "XML" not in pendientes)
+                conteo["n_pdf"] += ("PDF" in formatos and "PDF" not in pendientes)
+                repetidos = [f for f in pendientes if clave in fuera[f]]
+                if repetidos:
+                    conteo["n_duplicadas"] += 1
+                    if "XML" in repetidos:
+                        duplicadas[clave] = fuera["XML"][clave]
+                    pendientes = [f for f in pendientes if f not in repetidos]
+                if pendientes:
+                    yield clave, pendientes
+                else:
+                    conteo["n_omitidos"] += 1
+                    _hecha()
+
+    def _xml_obtenido(n_bytes: int, segundos: float, completa: bool):
+        metricas.contar("xml_ws")
+        conteo["n_xml"] += 1
+        if completa:
+            _avanzar(n_bytes, segundos, True)
+        else:
+            metricas.contar("bytes", n_bytes)
+
+    if progreso:
+        progreso(0, avance["total"], 0)
+
+    tareas = _tareas()
+    if XML_POR_WS and "XML" in formatos:
+        # XML directo del web service; lo que no se obtenga por ahí sigue por el navegador
+        tareas = _xml_por_ws(tareas, manifiesto, _xml_obtenido, metricas)
+
+    def _descargar(tareas, al_terminar):
+        if concurrencia > 1:
+            x, p = _descargar_claves_en_paralelo(page.context.storage_state(), tareas, manifiesto, concurrencia,
+                                                 al_terminar=al_terminar, al_fallar=_fallida, metricas=metricas)
+            conteo["n_xml"] += x; conteo["n_pdf"] += p
+            return
+        for clave, pendientes in tareas:
+            n_bytes, ok, inicio = 0, False, time.perf_counter()
+            try:
+                x, p, n_bytes = _descargar_clave_gobernada(page, clave, manifiesto, pendientes, metricas)
+                conteo["n_xml"] += x; conteo["n_pdf"] += p
+                ok = True
+            except Exception as e:
+                print(f"[WARN] No se pudo descargar {clave}: {e}")
+                _fallida(clave, pendientes, e)
+            finally:
+                al_terminar(n_bytes, time.perf_counter() - inicio, ok)
+
+    with metricas.fase("claves"):
+        _descargar(tareas, _avanzar)
+
+    # Repesca: las fallidas vuelven a la cola una vez al final, cuando el portal ya
+    # tuvo tiempo de recuperarse (salvo que el disyuntor lo haya dado por caído)
+    if fallidas and not portal["caido"]:
+        with metricas.fase("repesca"):
+            repesca = [(c, manifiesto.pendientes(c, f)) for c, (f, _) in fallidas.items()]
+            fallidas.clear()
+            _descargar([(c, f) for c, f in repesca if f],
+                       lambda n_bytes, segundos, ok: metricas.contar("bytes", n_bytes))
+
+    metricas.contar("claves", conteo["claves"])
+    metricas.contar("claves_omitidas", conteo["n_omitidos"])
+    metricas.contar("claves_duplicadas", conteo["n_duplicadas"])
+    metricas.contar("claves_fallidas", len(fallidas))
+    n_xml, n_pdf, n_omitidos = conteo["n_xml"], conteo["n_pdf"], conteo["n_omitidos"]
+    return {"estado": "ok", "n_xml": n_xml, "n_pdf": n_pdf, "n_omitidos": n_omitidos,
+            "n_duplicadas": conteo["n_duplicadas"], "txt": str(txt_path),
+            **_registrar_duplicadas(destino, duplicadas),
+            **_resumen_fallidas(destino, fallidas)}
+
+def leer_duplicadas(destino: Path) -> dict:
+    """{clave: ruta del XML en otra carpeta} anotadas en claves_duplicadas.txt de `destino`."""
+    res = {}
+    try:
+        with open(Path(destino) / ARCHIVO_DUPLICADAS, encoding="utf-8") as f:
+            next(f, None)
+            for linea in f:
+                clave, _, ruta = linea.rstrip("\r\n").partition("\t")
+                if clave and ruta:
+                    res[clave] = Path(ruta)
+    except OSError:
+        pass
+    return res
+
+def _registrar_duplicadas(destino: Path, duplicadas: dict) -> dict:
+    """
+    Suma las claves de esta corrida a claves_duplicadas.txt (CLAVE_ACCESO, RUTA):
+    varios tipos comparten la carpeta del mes y el reporte debe verlas todas
+    como descargadas, no como "Falta XML".
+    """
+    if not duplicadas:
+        return {}
+    todas = {**leer_duplicadas(destino), **duplicadas}
+    ruta = destino / ARCHIVO_DUPLICADAS
+    tmp = ruta.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8", newline="") as f:
+        f.write("CLAVE_ACCESO\tRUTA\r\n")
+        for clave, ubicacion in sorted(todas.items()):
+            f.write(f"{clave}\t{ubicacion}\r\n")
+    os.replace(tmp, ruta)
+    return {"duplicadas": str(ruta)}
+
+def _resumen_fallidas(destino: Path, fallidas: dict) -> dict:
+    """
+    Escribe claves_fallidas.txt (tabulado, con encabezado CLAVE_ACCESO: sirve
+    como TXT semilla) con lo que quedó sin bajar. Volver a ejecutar el período
+    las reintenta: el manifiesto hace que solo se pidan las que faltan.
+    """
+    ruta = destino / "claves_fallidas.txt"
+    if not fallidas:
+        ruta.unlink(missing_ok=True)
+        return {"n_fallidas": 0}
+    with open(ruta, "w", encoding="utf-8", newline="") as f:
+        f.write("CLAVE_ACCESO\tFORMATOS\tERROR\r\n")
+        for clave, (formatos, error) in sorted(fallidas.items()):
+            error = " ".join(error.split())[:300]
+            f.write(f"{clave}\t{','.join(formatos)}\t{error}\r\n")
+    print(f"[WARN] {len(fallidas)} claves sin descargar tras los reintentos; detalle en {ruta}")
+    return {"n_fallidas": len(fallidas), "fallidas": str(ruta)}
 
 # ============================================================
 # 🔹 LECTURA DE TABLA PARA COMPROBANTES EMITIDOS (sin TXT)
 # ============================================================
-def _flujo_emitidos(page, destino: Path, anio: int, mes: int, tipo: str):
-    _seleccionar(page, "Período emisión", str(anio))
-    _seleccionar(page, "Período emisión", _mes_a_texto(mes))
-    tipo_visible = TIPOS_MAP.get(tipo, tipo)
-    _seleccionar(page, "Tipo de comprobante", tipo_visible)
-    _click_texto(page, "Consultar")
-    page.wait_for_load_state("networkidle")
-    time.sleep(1)
-
-    html = page.content()
-    rows = re.findall(
-        r"<tr[^>]*>\s*(.*?)\s*</tr>",
-        html,
-        flags=re.DOTALL
-    )
-
-    data = []
-    for r in rows:
-        cols = re.findall(r"<td[^>]*>(.*?)</td>", r, flags=re.DOTALL)
-        if len(cols) < 6:
-            continue
-        data.append({
-            "Fecha Emisión": re.sub("<.*?>", "", cols[0]).strip(),
-            "Tipo": re.sub("<.*?>", "", cols[1]).strip(),
-            "Número": re.sub("<.*?>", "", cols[2]).strip(),
-            "RUC Receptor": re.sub("<.*?>", "", cols[3]).strip(),
-            "Razón Social": re.sub("<.*?>", "", cols[4]).strip(),
-            "Total": re.sub("<.*?>", "", cols[5]).strip(),
-            "Estado": re.sub("<.*?>", "", cols[6]).strip() if len(cols) > 6 else "",
-        })
+def _flujo_emitidos(page, destino: Path, anio: int, mes: int, tipo: str, metricas: Metricas = None,
+                    ruc: str = None, por_tipo: bool = False):
+    """
+    Tabla de emitidos del período a emitidos_reporte_<anio>_<mes>.xlsx. Con `por_tipo`
+    (lotes con varios tipos en la misma carpeta) el nombre lleva además el tipo.
+    """
+    metricas = metricas or Metricas()
+    with metricas.fase("consulta"):
+        _seleccionar(page, "Período emisión", str(anio))
+        _seleccionar(page, "Período emisión", _mes_a_texto(mes))
+        tipo_visible = TIPOS_MAP.get(tipo, tipo)
+        _seleccionar(page, "Tipo de comprobante", tipo_visible)
+        _consultar(page)
+
+    # Filas del datatable de todas las páginas del paginador
+    with metricas.fase("tabla_emitidos"):
+        data = list(iterar_paginas(page))
 
     if not data:
         return {"estado": "sin_resultados", "mensaje": "No se encontraron filas en la tabla"}
 
-    df = pd.DataFrame(data)
-    excel_path = destino / f"emitidos_reporte_{anio}_{mes:02d}.xlsx"
+    df = pd.DataFrame(data, columns=COLUMNAS_EMITIDOS)
+    slug = unicodedata.normalize("NFKD", tipo.lower()).encode("ascii", "ignore").decode()
+    slug = re.sub(r"[^a-z0-9]+", "_", slug).strip("_")
+    sufijo = f"_{slug}" if por_tipo else ""
+    excel_path = destino / f"emitidos_reporte_{anio}_{mes:02d}{sufijo}.xlsx"
     df.to_excel(excel_path, index=False)
+    with metricas.fase("almacen"):
+        almacen.guardar_seguro(df, ruc, anio, mes, "Emitidos", nombre=slug)
     return {"estado": "ok", "n_registros": len(df), "reporte": str(excel_path)}
 
 # ============================================================
 # FUNCIÓN PRINCIPAL
 # ============================================================
-def descargar_sri(ruc: str, clave: str, anio: int, mes: int, tipo: str, formatos: list, destino: Path, origen: str = "Recibidos"):
+def _asegurar_sesion(context, page, ruc: str, clave: str, origen: str, sesion=None, metricas: Metricas = None):
+    """
+    Deja `page` en la página de consulta de `origen` con una sesión válida.
+    Usa la sesión guardada si sigue viva; si no, inicia sesión y la guarda.
+    """
+    metricas = metricas or Metricas()
+    with metricas.fase("login"):
+        if not (sesion and _abrir_consulta(page, origen, metricas)):
+            if sesion:
+                invalidar_sesion(ruc)
+                context.clear_cookies()
+            _login(page, ruc, clave, metricas)
+            metricas.contar("logins")
+            if not _abrir_consulta(page, origen, metricas):
+                raise RuntimeError("No se pudo iniciar sesión en el SRI (revisa RUC y clave).")
+            guardar_sesion(ruc, clave, context.storage_state())
+    with metricas.fase("captcha"):
+        _espera_captcha(page)
+
+def descargar_sri(ruc: str, clave: str, anio: int, mes: int, tipo: str, formatos: list, destino: Path, origen: str = "Recibidos",
+                  concurrencia: int = None, progreso=None, metricas: Metricas = None, al_guardar=None):
+    """
+    Descarga los comprobantes de un período. `progreso`, si se indica, recibe
+    (claves_hechas, claves_totales, bytes_descargados) tras cada clave (Recibidos).
+    `metricas` acumula tiempos por fase y latencias por clave de la corrida.
+    `al_guardar(destino, ruta)` se llama con cada archivo guardado (TXT, XML, PDF).
+    """
+    metricas = metricas or Metricas()
     destino.mkdir(parents=True, exist_ok=True)
-    cookies_path = Path(f"cookies_{ruc}.json")
-
-    with sync_playwright() as p:
-        browser = p.chromium.launch(
-            headless=True,
-            args=["--no-sandbox", "--disable-setuid-sandbox", "--disable-dev-shm-usage", "--disable-gpu"]
-        )
-        context = browser.new_context(accept_downloads=True)
-        page = context.new_page()
+    concurrencia = max(1, int(concurrencia or CONCURRENCIA_POR_DEFECTO))
+    sesion = cargar_sesion(ruc, clave)
 
-        _login(context, page, ruc, clave, cookies_path)
-        page.goto(URLS.get(origen, URLS["Recibidos"]), timeout=60000)
-        page.wait_for_load_state("domcontentloaded")
-        _espera_captcha(page)
+    # Contexto aislado para este RUC sobre un Chromium ya iniciado (pool por hilo),
+    # con la sesión guardada si aún no expiró
+    inicio = time.perf_counter()
+    with pool_navegadores().contexto(accept_downloads=True, storage_state=sesion) as context:
+        metricas.registrar_fase("navegador", time.perf_counter() - inicio)
+        page = context.new_page()
+        _asegurar_sesion(context, page, ruc, clave, origen, sesion, metricas)
+        _liviano(context, metricas)
 
         if origen == "Emitidos":
-            resultado = _flujo_emitidos(page, destino, anio, mes, tipo)
+            resultado = _flujo_emitidos(page, destino, anio, mes, tipo, metricas, ruc=ruc)
         else:
-            resultado = _flujo_recibidos(page, destino, anio, mes, tipo, formatos)
+            resultado = _flujo_recibidos(page, destino, anio, mes, tipo, formatos, concurrencia, progreso, metricas,
+                                         al_guardar)
 
-        browser.close()
+        # La sesión siguió activa durante la corrida: renovar su vigencia
+        guardar_sesion(ruc, clave, context.storage_state())
         return resultado
+
+# ============================================================
+# 🔹 LOTES: VARIOS PERÍODOS / TIPOS / ORÍGENES EN UNA SESIÓN
+# ============================================================
+def periodos_entre(anio_desde: int, mes_desde: int, anio_hasta: int, mes_hasta: int) -> list:
+    """Lista [(anio, mes), ...] desde/hasta inclusive."""
+    periodos = []
+    a, m = int(anio_desde), int(mes_desde)
+    while (a, m) <= (int(anio_hasta), int(mes_hasta)):
+        periodos.append((a, m))
+        a, m = (a + 1, 1) if m == 12 else (a, m + 1)
+    return periodos
+
+def descargar_sri_lote(ruc: str, clave: str, periodos: list, tipos: list, origenes: list, formatos: list,
+                       destino_base: Path, concurrencia: int = None, progreso=None, metricas: Metricas = None,
+                       al_guardar=None):
+    """
+    Ejecuta todas las combinaciones origen × período × tipo con un solo login.
+    Cada combinación escribe en destino_base/<ruc>/<anio>/<mes> como una corrida
+    normal; un fallo en una combinación no detiene el resto del lote.
+    `progreso` recibe (combinaciones_hechas, combinaciones_totales, bytes_descargados).
+    """
+    concurrencia = max(1, int(concurrencia or CONCURRENCIA_POR_DEFECTO))
+    metricas = metricas or Metricas()
+    combinaciones = [(o, a, m, t) for o in origenes for (a, m) in periodos for t in tipos]
+    resultados = []
+    avance = {"bytes_previos": 0, "bytes": 0}
+
+    def _progreso_clave(hechas, total, n_bytes):
+        avance["bytes"] = avance["bytes_previos"] + n_bytes
+
+    sesion = cargar_sesion(ruc, clave)
+    inicio = time.perf_counter()
+    with pool_navegadores().contexto(accept_downloads=True, storage_state=sesion) as context:
+        metricas.registrar_fase("navegador", time.perf_counter() - inicio)
+        page = context.new_page()
+        _asegurar_sesion(context, page, ruc, clave, combinaciones[0][0] if combinaciones else "Recibidos",
+                         sesion, metricas)
+        _liviano(context, metricas)
+
+        for i, (origen, anio, mes, tipo) in enumerate(combinaciones):
+            destino = destino_base / ruc / f"{anio:04d}" / f"{mes:02d}"
+            destino.mkdir(parents=True, exist_ok=True)
+            try:
+                if i > 0 and not _abrir_consulta(page, origen, metricas):
+                    # La sesión caducó a mitad del lote: volver a ingresar
+                    _asegurar_sesion(context, page, ruc, clave, origen, metricas=metricas)
+                _espera_captcha(page)
+                if origen == "Emitidos":
+                    r = _flujo_emitidos(page, destino, anio, mes, tipo, metricas, ruc=ruc, por_tipo=len(tipos) > 1)
+                else:
+                    r = _flujo_recibidos(page, destino, anio, mes, tipo, formatos, concurrencia, _progreso_clave,
+                                         metricas, al_guardar)
+            except Exception as e:
+                print(f"[WARN] Lote {ruc} {origen} {tipo} {mes:02d}/{anio} falló: {e}")
+                r = {"estado": "error", "error": str(e)}
+            resultados.append({"origen": origen, "anio": anio, "mes": mes, "tipo": tipo, "destino": str(destino), **r})
+            avance["bytes_previos"] = avance["bytes"]
+            if progreso:
+                progreso(i + 1, len(combinaciones), avance["bytes"])
+
+        guardar_sesion(ruc, clave, context.storage_state())
+
+    return {
+        "estado": "ok" if any(r.get("estado") == "ok" for r in resultados) else "sin_descargas",
+        "n_xml": sum(r.get("n_xml", 0) for r in resultados),
+        "n_pdf": sum(r.get("n_pdf", 0) for r in resultados),
+        "n_registros": sum(r.get("n_registros", 0) for r in resultados),
+        "n_fallidas": sum(r.get("n_fallidas", 0) for r in resultados),
+        "resultados": resultados,
+    }
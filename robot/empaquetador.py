@@ -0,0 +1,192 @@
+# =====================================================
+# 📦 MÓDULO: ZIP INCREMENTAL DE CADA CARPETA DE DESCARGA
+# =====================================================
+# Arma el ZIP del mes a medida que llegan los archivos, en vez
+# de recomprimir toda la carpeta al final. Los PDF (y otros
+# formatos ya comprimidos) se guardan sin comprimir; XML y TXT
+# con deflate. En una nueva corrida solo se agrega lo nuevo sobre
+# el ZIP existente; lo modificado o borrado obliga a reescribirlo.
+# =====================================================
+
+import os
+import shutil
+import threading
+import time
+import zipfile
+from pathlib import Path
+
+# Ya vienen comprimidos: deflate solo gastaría CPU
+EXT_SIN_COMPRIMIR = {".pdf", ".zip", ".xlsx", ".png", ".jpg", ".jpeg", ".gz"}
+
+# Archivos internos del robot que no forman parte del entregable
+EXCLUIDOS = {"manifiesto.jsonl", "metricas.json", "metricas.prom"}
+
+
+def _excluido(relativa: Path) -> bool:
+    return (relativa.name in EXCLUIDOS or relativa.suffix == ".tmp"
+            or any(p.startswith(".") for p in relativa.parts))
+
+
+def _fecha_zip(fecha: tuple) -> tuple:
+    # El formato ZIP guarda la hora con resolución de 2 s
+    return tuple(fecha[:5]) + (fecha[5] - fecha[5] % 2,)
+
+
+# =====================================================
+# 🗜️ ZIP DE UNA CARPETA
+# =====================================================
+class EmpaquetadorZip:
+    """
+    ZIP de `carpeta` (por defecto junto a ella: <carpeta>.zip) que se actualiza
+    archivo por archivo. Seguro entre hilos. Si un archivo ya empaquetado cambia
+    o desaparece, el ZIP se copia sin esa entrada a un archivo nuevo que
+    reemplaza al anterior; sincronizar junta todos los cambios (p. ej. los
+    reportes, que se regeneran en cada corrida) en una sola copia.
+    """
+
+    def __init__(self, carpeta: Path, ruta_zip: Path = None):
+        self.carpeta = Path(carpeta)
+        self.ruta_zip = Path(ruta_zip) if ruta_zip else self.carpeta.with_suffix(".zip")
+        self._lock = threading.Lock()
+        self._zip = None
+
+    def _abrir(self) -> zipfile.ZipFile:
+        if self._zip is None:
+            self.ruta_zip.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                self._zip = zipfile.ZipFile(self.ruta_zip, "a", zipfile.ZIP_DEFLATED)
+            except zipfile.BadZipFile:
+                # ZIP a medio escribir (corrida interrumpida): se rehace desde cero
+                print(f"[WARN] {self.ruta_zip.name} dañado; se vuelve a generar.")
+                self.ruta_zip.unlink()
+                self._zip = zipfile.ZipFile(self.ruta_zip, "a", zipfile.ZIP_DEFLATED)
+        return self._zip
+
+    def _al_dia(self, info: zipfile.ZipInfo, ruta: Path) -> bool:
+        try:
+            st = ruta.stat()
+        except OSError:
+            return False
+        return (info.file_size == st.st_size
+                and _fecha_zip(info.date_time) == _fecha_zip(time.localtime(st.st_mtime)[:6]))
+
+    def _reconstruir(self, quitar: set) -> zipfile.ZipFile:
+        """
+        zipfile no sabe quitar entradas: copia el ZIP sin las de `quitar` a un
+        archivo nuevo, lo pone en lugar del anterior y lo deja abierto para agregar.
+        """
+        self._zip.close()
+        self._zip = None
+        tmp = self.ruta_zip.with_name(self.ruta_zip.name + ".tmp")
+        try:
+            with zipfile.ZipFile(self.ruta_zip) as viejo, zipfile.ZipFile(tmp, "w") as nuevo:
+                for info in viejo.infolist():
+                    if info.filename in quitar:
+                        continue
+                    # Misma ZipInfo: conserva fecha, tamaño y compresión de la entrada
+                    with viejo.open(info) as origen, nuevo.open(info, "w") as destino:
+                        shutil.copyfileobj(origen, destino, 1 << 20)
+            os.replace(tmp, self.ruta_zip)
+        finally:
+            tmp.unlink(missing_ok=True)
+        return self._abrir()
+
+    def _escribir(self, zf: zipfile.ZipFile, ruta: Path, nombre: str):
+        compresion = zipfile.ZIP_STORED if ruta.suffix.lower() in EXT_SIN_COMPRIMIR else zipfile.ZIP_DEFLATED
+        zf.write(ruta, nombre, compress_type=compresion)
+
+    def agregar(self, ruta: Path):
+        """Agrega (o reemplaza, si cambió) un archivo de la carpeta."""
+        ruta = Path(ruta)
+        try:
+            nombre = ruta.relative_to(self.carpeta).as_posix()
+        except ValueError:
+            return
+        if _excluido(Path(nombre)) or not ruta.is_file():
+            return
+        with self._lock:
+            zf = self._abrir()
+            try:
+                info = zf.getinfo(nombre)
+            except KeyError:
+                info = None
+            if info is not None:
+                if self._al_dia(info, ruta):
+                    return
+                zf = self._reconstruir({nombre})
+            self._escribir(zf, ruta, nombre)
+
+    def sincronizar(self):
+        """
+        Deja el ZIP igual a la carpeta: quita (en una sola copia) lo que ya no
+        existe o cambió y agrega lo nuevo o modificado. Subcarpetas (XML/, PDF/)
+        primero y archivos sueltos (reportes, TXT) al final.
+        """
+        archivos = sorted(
+            (p for p in self.carpeta.rglob("*") if p.is_file() and not _excluido(p.relative_to(self.carpeta))),
+            key=lambda p: (len(p.relative_to(self.carpeta).parts) == 1, p.as_posix()),
+        )
+        with self._lock:
+            zf = self._abrir()
+            presentes = {p.relative_to(self.carpeta).as_posix() for p in archivos}
+            viejas = {i.filename for i in zf.infolist()
+                      if i.filename not in presentes or not self._al_dia(i, self.carpeta / i.filename)}
+            if viejas:
+                self._reconstruir(viejas)
+        for ruta in archivos:
+            self.agregar(ruta)
+
+    def cerrar(self) -> Path:
+        """Sincroniza con la carpeta y escribe el directorio central."""
+        self.sincronizar()
+        self.liberar()
+        return self.ruta_zip
+
+    def liberar(self):
+        """Cierra el ZIP tal como está, sin sincronizar (p. ej. tras una descarga fallida)."""
+        with self._lock:
+            if self._zip is not None:
+                self._zip.close()
+                self._zip = None
+
+
+# =====================================================
+# 🗂️ UN ZIP POR CARPETA DESTINO
+# =====================================================
+class Empaquetadores:
+    """
+    Callback al_guardar(destino, ruta) para el downloader: abre un
+    EmpaquetadorZip por carpeta destino al recibir su primer archivo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._zips = {}
+
+    def para(self, destino: Path) -> EmpaquetadorZip:
+        destino = Path(destino)
+        with self._lock:
+            if destino not in self._zips:
+                self._zips[destino] = EmpaquetadorZip(destino)
+            return self._zips[destino]
+
+    def __call__(self, destino: Path, ruta: Path):
+        try:
+            self.para(destino).agregar(ruta)
+        except Exception as e:
+            # El ZIP se completa al cerrar; un fallo aquí no debe cortar la descarga
+            print(f"[WARN] No se pudo agregar {Path(ruta).name} al ZIP: {e}")
+
+    def cerrar(self, destino: Path) -> Path:
+        """Completa y cierra el ZIP de `destino` (lo crea si aún no existía)."""
+        return self.para(destino).cerrar()
+
+    def liberar(self):
+        """Cierra los ZIP que sigan abiertos, tal como estén, sin cortar el flujo."""
+        with self._lock:
+            empaquetadores = list(self._zips.values())
+        for empaquetador in empaquetadores:
+            try:
+                empaquetador.liberar()
+            except Exception as e:
+                print(f"[WARN] No se pudo cerrar {empaquetador.ruta_zip.name}: {e}")
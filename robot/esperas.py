@@ -0,0 +1,71 @@
+# =====================================================
+# ⏳ MÓDULO: ESPERAS POR EVENTO EN EL PORTAL SRI
+# =====================================================
+# En lugar de networkidle + time.sleep fijos, cada paso espera
+# la señal concreta que necesita: la respuesta AJAX del JSF,
+# el render de la tabla de resultados o el inicio de la descarga.
+# =====================================================
+
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+# Filas del datatable (incluida la fila "sin registros") o mensajes del portal
+SEL_RESULTADOS = (
+    "tbody[id$='_data'] > tr, "
+    ".ui-messages-error, .ui-messages-warn, .ui-messages-info, "
+    ".ui-growl-item"
+)
+
+TIMEOUT_AJAX = 30000
+
+
+def _es_postback(respuesta) -> bool:
+    """Respuesta a un POST de JSF/PrimeFaces (parcial o completo)."""
+    try:
+        return respuesta.request.method == "POST"
+    except Exception:
+        return False
+
+
+def esperar_ajax(page, accion, timeout: int = TIMEOUT_AJAX):
+    """
+    Ejecuta `accion()` (un clic, un select) y espera la respuesta del postback
+    que dispara. Devuelve lo que devuelva `accion`; sus errores (incluido un
+    timeout del propio clic) se propagan. Si `accion` devuelve False (p. ej.
+    _click_texto sin botón) no se espera. Si el portal no responde en
+    `timeout`, se sigue: el paso siguiente hace su propia espera de contenido.
+    """
+    # La escucha debe empezar antes de la acción; se maneja a mano para que solo
+    # la espera de la respuesta (al salir) quede dentro del try
+    espera = page.expect_response(_es_postback, timeout=timeout)
+    espera.__enter__()
+    try:
+        resultado = accion()
+    except BaseException as e:
+        espera.__exit__(type(e), e, e.__traceback__)      # cancela la escucha
+        raise
+    if resultado is False:
+        error = RuntimeError("acción sin efecto")
+        espera.__exit__(RuntimeError, error, None)
+        return resultado
+    try:
+        espera.__exit__(None, None, None)                 # espera la respuesta
+    except PlaywrightTimeoutError:
+        pass
+    return resultado
+
+
+def esperar_resultados(page, timeout: int = TIMEOUT_AJAX) -> bool:
+    """Espera a que la tabla de resultados (o un mensaje del portal) esté en el DOM."""
+    try:
+        page.wait_for_selector(SEL_RESULTADOS, state="attached", timeout=timeout)
+        return True
+    except Exception:
+        return False
+
+
+def limpiar_resultados(page):
+    """
+    Quita del DOM los resultados y mensajes de la consulta anterior, para que
+    esperar_resultados no dé por buena la tabla de otra clave (formulario reutilizado).
+    """
+    page.evaluate("sel => document.querySelectorAll(sel).forEach(e => e.remove())", SEL_RESULTADOS)
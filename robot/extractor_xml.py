@@ -0,0 +1,307 @@
+# =====================================================
+# 🧬 MÓDULO: EXTRACCIÓN DE COMPROBANTES XML EN UNA PASADA
+# =====================================================
+# Cada tipo de comprobante (codDoc) se describe con un esquema
+# declarativo: ruta → campo, más los grupos repetidos (líneas de
+# detalle, impuestos, retenciones). Los esquemas se compilan a
+# tablas de búsqueda por ruta y un solo recorrido iterparse de
+# lxml llena la fila. Admite XML con o sin espacio de nombres y
+# el formato <autorizacion><comprobante><![CDATA[...]]> del SRI.
+# En XML grandes (iterparse) las líneas ya leídas se liberan:
+# memoria plana aunque haya miles de líneas de detalle.
+# =====================================================
+
+import io
+import os
+from pathlib import Path
+
+from lxml import etree
+
+
+def _num(val) -> float:
+    try:
+        return float(val.replace(",", "").strip()) if val else 0.0
+    except Exception:
+        return 0.0
+
+
+def _txt(val) -> str:
+    return (val or "").strip()
+
+
+# =====================================================
+# 📐 ESQUEMAS POR TIPO DE COMPROBANTE
+# =====================================================
+# Campos de la fila y su valor por defecto (forma fija, también para la caché)
+CAMPOS_FILA = {
+    "fechaEmision": "", "rucEmisor": "", "razonSocial": "", "rucReceptor": "",
+    "razonSocialReceptor": "", "claveAcceso": "", "tipoDocumento": "", "numero": "",
+    "numeroAutorizacion": "", "fechaAutorizacion": "",
+    "subtotal": 0.0, "iva": 0.0, "total": 0.0, "retenido": 0.0,
+}
+
+_TRIBUTARIA = {
+    "infoTributaria/ruc": "rucEmisor",
+    "infoTributaria/razonSocial": "razonSocial",
+    "infoTributaria/claveAcceso": "claveAcceso",
+    "infoTributaria/codDoc": "tipoDocumento",
+    "infoTributaria/estab": "estab",
+    "infoTributaria/ptoEmi": "ptoEmi",
+    "infoTributaria/secuencial": "secuencial",
+}
+
+_DETALLE = {
+    "codigoPrincipal": "codigo",
+    "descripcion": "descripcion",
+    "cantidad": ("cantidad", _num),
+    "precioUnitario": ("precioUnitario", _num),
+    "descuento": ("descuento", _num),
+    "precioTotalSinImpuesto": ("precioTotalSinImpuesto", _num),
+}
+
+_IMPUESTO = {
+    "codigo": "codigo",
+    "codigoPorcentaje": "codigoPorcentaje",
+    "baseImponible": ("baseImponible", _num),
+    "valor": ("valor", _num),
+}
+
+_RETENCION = {
+    "codigo": "codigo",
+    "codigoRetencion": "codigoRetencion",
+    "baseImponible": ("baseImponible", _num),
+    "porcentajeRetener": ("porcentajeRetener", _num),
+    "valorRetenido": ("valorRetenido", _num),
+    "codDocSustento": "codDocSustento",
+    "numDocSustento": "numDocSustento",
+}
+
+
+def _info(etiqueta: str, campos: dict) -> dict:
+    return {f"{etiqueta}/{ruta}": campo for ruta, campo in campos.items()}
+
+
+# etiqueta raíz → {"campos": {ruta: campo | (campo, conversor)}, "grupos": {nombre: (ruta, campos)}}
+ESQUEMAS = {
+    "factura": {
+        "campos": {**_TRIBUTARIA, **_info("infoFactura", {
+            "fechaEmision": "fechaEmision",
+            "identificacionComprador": "rucReceptor",
+            "razonSocialComprador": "razonSocialReceptor",
+            "totalSinImpuestos": ("subtotal", _num),
+            "importeTotal": ("total", _num),
+        })},
+        "grupos": {
+            "impuestos": ("infoFactura/totalConImpuestos/totalImpuesto", _IMPUESTO),
+            "detalles": ("detalles/detalle", _DETALLE),
+        },
+    },
+    "liquidacionCompra": {
+        "campos": {**_TRIBUTARIA, **_info("infoLiquidacionCompra", {
+            "fechaEmision": "fechaEmision",
+            "identificacionProveedor": "rucReceptor",
+            "razonSocialProveedor": "razonSocialReceptor",
+            "totalSinImpuestos": ("subtotal", _num),
+            "importeTotal": ("total", _num),
+        })},
+        "grupos": {
+            "impuestos": ("infoLiquidacionCompra/totalConImpuestos/totalImpuesto", _IMPUESTO),
+            "detalles": ("detalles/detalle", _DETALLE),
+        },
+    },
+    "notaCredito": {
+        "campos": {**_TRIBUTARIA, **_info("infoNotaCredito", {
+            "fechaEmision": "fechaEmision",
+            "identificacionComprador": "rucReceptor",
+            "razonSocialComprador": "razonSocialReceptor",
+            "totalSinImpuestos": ("subtotal", _num),
+            "valorModificacion": ("total", _num),
+        })},
+        "grupos": {
+            "impuestos": ("infoNotaCredito/totalConImpuestos/totalImpuesto", _IMPUESTO),
+            "detalles": ("detalles/detalle", {**_DETALLE, "codigoInterno": "codigo"}),
+        },
+    },
+    "notaDebito": {
+        "campos": {**_TRIBUTARIA, **_info("infoNotaDebito", {
+            "fechaEmision": "fechaEmision",
+            "identificacionComprador": "rucReceptor",
+            "razonSocialComprador": "razonSocialReceptor",
+            "totalSinImpuestos": ("subtotal", _num),
+            "valorTotal": ("total", _num),
+        })},
+        "grupos": {
+            "impuestos": ("infoNotaDebito/impuestos/impuesto", _IMPUESTO),
+            "detalles": ("motivos/motivo", {"razon": "descripcion", "valor": ("precioTotalSinImpuesto", _num)}),
+        },
+    },
+    "comprobanteRetencion": {
+        "campos": {**_TRIBUTARIA, **_info("infoCompRetencion", {
+            "fechaEmision": "fechaEmision",
+            "identificacionSujetoRetenido": "rucReceptor",
+            "razonSocialSujetoRetenido": "razonSocialReceptor",
+        })},
+        "grupos": {
+            # Versión 1.0.0 y versión 2.0.0 (retenciones agrupadas por documento sustento)
+            "retenciones": ("impuestos/impuesto", _RETENCION),
+            "retenciones_v2": ("docsSustento/docSustento/retenciones/retencion", _RETENCION),
+        },
+    },
+}
+
+# Desde este tamaño el XML se recorre con iterparse, liberando lo ya leído
+UMBRAL_ITERPARSE = 1 << 20
+
+_PARSER = etree.XMLParser(huge_tree=True, resolve_entities=False, remove_comments=True)
+
+# Datos de la autorización cuando el comprobante viene envuelto
+_ENVOLTURA = {"numeroAutorizacion": "numeroAutorizacion", "fechaAutorizacion": "fechaAutorizacion"}
+
+
+# =====================================================
+# ⚙️ COMPILACIÓN: RUTAS → TABLA DE DESPACHO
+# =====================================================
+def _accion(spec):
+    return spec if isinstance(spec, tuple) else (spec, _txt)
+
+
+def _compilar(raiz: str, esquema: dict) -> dict:
+    """
+    Tabla (padre, etiqueta) → acción, con nombres locales:
+      ("campo", campo, conversor)       valor de la fila
+      ("grupo", nombre, {hijo: (campo, conversor)})   elemento repetido
+    Dentro de un mismo tipo, padre + etiqueta identifican la ruta; si dos rutas
+    del esquema chocan, el error aparece al importar, no al parsear.
+    """
+    tabla, origen = {}, {}
+    entradas = [(r, ("campo",) + _accion(s)) for r, s in esquema["campos"].items()]
+    entradas += [(r, ("grupo", nombre, {h: _accion(s) for h, s in sub.items()}))
+                 for nombre, (r, sub) in esquema["grupos"].items()]
+    for ruta, accion in entradas:
+        partes = ruta.split("/")
+        clave = (partes[-2] if len(partes) > 1 else raiz, partes[-1])
+        if clave in tabla:
+            raise ValueError(f"Esquema {raiz}: {ruta} y {origen[clave]} son ambiguas")
+        tabla[clave], origen[clave] = accion, ruta
+    return tabla
+
+
+_COMPILADOS = {raiz: _compilar(raiz, e) for raiz, e in ESQUEMAS.items()}
+
+# Solo estos elementos llegan a Python; el resto lo recorre lxml en C
+_ETIQUETAS = sorted({hoja for tabla in _COMPILADOS.values() for _, hoja in tabla}
+                    | set(_ENVOLTURA) | {"comprobante"})
+_FILTRO = [f"{{*}}{t}" for t in _ETIQUETAS]
+
+
+# =====================================================
+# 🔁 RECORRIDO ÚNICO (ITERPARSE)
+# =====================================================
+def _local(tag: str) -> str:
+    return tag.rpartition("}")[2]
+
+
+def _tipo(elem):
+    """Tabla del comprobante que contiene a `elem` (None si está fuera de uno conocido)."""
+    while elem is not None:
+        tabla = _COMPILADOS.get(_local(elem.tag))
+        if tabla is not None:
+            return tabla
+        elem = elem.getparent()
+    return None
+
+
+def _elementos(fuente, tamano: int):
+    """
+    Elementos de interés de `fuente` en un solo recorrido. Los XML grandes van
+    por iterparse (se liberan a medida que se leen); los chicos, que son casi
+    todos, se parsean de una vez en C y se recorren con el mismo filtro.
+    """
+    if tamano < UMBRAL_ITERPARSE:
+        raiz = (etree.fromstring(fuente, _PARSER) if isinstance(fuente, bytes)
+                else etree.parse(fuente, _PARSER).getroot())
+        return raiz.iter(*_FILTRO), False
+    if isinstance(fuente, bytes):
+        fuente = io.BytesIO(fuente)
+    eventos = etree.iterparse(fuente, events=("end",), tag=_FILTRO, huge_tree=True,
+                              resolve_entities=False, remove_comments=True)
+    return (elem for _, elem in eventos), True
+
+
+def _recorrer(fuente, tamano: int, fila: dict, grupos_fila: dict) -> bool:
+    """
+    Llena `fila` y `grupos_fila` con un solo recorrido de `fuente` (ruta o bytes).
+    Devuelve True si encontró un comprobante de tipo conocido.
+    """
+    tabla = None
+    interno = None              # texto CDATA de <comprobante>
+
+    elementos, liberar = _elementos(fuente, tamano)
+    for elem in elementos:
+        tag = elem.tag
+        nombre = tag[tag.find("}") + 1:]
+        if tabla is None:
+            if nombre in _ENVOLTURA:
+                fila[_ENVOLTURA[nombre]] = _txt(elem.text)
+                continue
+            if nombre == "comprobante":
+                if elem.text and elem.text.strip():
+                    interno = elem.text.strip()
+                continue
+            # El tipo se resuelve una vez, con el primer elemento de interés
+            tabla = _tipo(elem)
+            if tabla is None:
+                continue
+        padre = elem.getparent()
+        if padre is None:
+            continue
+        tag = padre.tag
+        accion = tabla.get((tag[tag.find("}") + 1:], nombre))
+        if accion is None:
+            continue
+        if accion[0] == "campo":
+            fila[accion[1]] = accion[2](elem.text)
+            continue
+        hijos = accion[2]
+        item = {}
+        for hijo in elem:
+            tag = hijo.tag
+            if isinstance(tag, str):
+                sub = hijos.get(tag[tag.find("}") + 1:])
+                if sub:
+                    item[sub[0]] = sub[1](hijo.text)
+        grupos_fila.setdefault(accion[1], []).append(item)
+        if liberar:
+            # Elemento repetido ya leído: se suelta junto con los anteriores (memoria plana)
+            elem.clear()
+            while elem.getprevious() is not None:
+                del padre[0]
+
+    if tabla is None and interno:
+        # Comprobante como texto (CDATA) dentro de la autorización
+        datos = interno.encode("utf-8")
+        return _recorrer(datos, len(datos), fila, grupos_fila)
+    return tabla is not None
+
+
+def extraer(xml_path: Path) -> dict:
+    """
+    Fila del comprobante: CAMPOS_FILA más `detalles` (líneas) y `retenciones`
+    (listas de dicts). Si el archivo no se puede leer, la fila lleva `error`.
+    """
+    fila = {"archivo": Path(xml_path).name, **CAMPOS_FILA}
+    grupos = {}
+    try:
+        if not _recorrer(str(xml_path), os.path.getsize(xml_path), fila, grupos):
+            fila["error"] = f"Error leyendo {fila['archivo']}: tipo de comprobante no reconocido"
+    except Exception as e:
+        fila["error"] = f"Error leyendo {fila['archivo']}: {e}"
+
+    partes = [fila.pop(k, "") for k in ("estab", "ptoEmi", "secuencial")]
+    fila["numero"] = "-".join(partes) if all(partes) else ""
+    # Suma sin redondeo, en el orden del XML: los mismos valores que el lector anterior
+    fila["iva"] = sum((i.get("valor", 0.0) for i in grupos.get("impuestos", []) if i.get("codigo") == "2"), 0.0)
+    fila["detalles"] = grupos.get("detalles", [])
+    fila["retenciones"] = grupos.get("retenciones", []) + grupos.get("retenciones_v2", [])
+    fila["retenido"] = sum((r.get("valorRetenido", 0.0) for r in fila["retenciones"]), 0.0)
+    return fila
@@ -0,0 +1,227 @@
+# =====================================================
+# 🚦 MÓDULO: GOBERNADOR DE PETICIONES AL SRI
+# =====================================================
+# Toda navegación, descarga y consulta al web service pasa por
+# el gobernador de su host:
+#   - Cubeta de fichas adaptativa: sube el ritmo de a poco
+#     mientras el host responde bien y lo recorta ante errores
+#     o latencias crecientes (aumento aditivo, recorte
+#     multiplicativo).
+#   - Reintentos con espera exponencial y jitter.
+#   - Disyuntor: tras varios fallos seguidos pausa a todos los
+#     trabajadores; si el host sigue caído, corta la corrida
+#     con PortalNoDisponible en lugar de insistir.
+# Un gobernador por host, compartido por todas las corridas.
+# =====================================================
+
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+REINTENTOS = max(0, int(os.environ.get("SRI_REINTENTOS", "3") or 0))
+ESPERA_BASE = float(os.environ.get("SRI_ESPERA_BASE_SEG", "1") or 1)
+ESPERA_MAX = float(os.environ.get("SRI_ESPERA_MAX_SEG", "30") or 30)
+
+# Peticiones por segundo y por host: inicial, mínimo y máximo del ritmo adaptativo
+TASA_INICIAL = float(os.environ.get("SRI_TASA_INICIAL", "4") or 4)
+TASA_MIN = 0.2
+TASA_MAX = float(os.environ.get("SRI_TASA_MAX", "20") or 20)
+# Latencia media por encima de FACTOR_LENTITUD × la mejor observada = host saturado
+# (por debajo de LATENCIA_LENTA segundos las variaciones no cuentan)
+FACTOR_LENTITUD = 2.5
+LATENCIA_LENTA = 0.5
+
+# Disyuntor: fallos seguidos para abrirlo, pausa inicial (se duplica) y aperturas
+# seguidas sin un solo acierto antes de dar el host por caído
+CIRCUITO_FALLOS = max(1, int(os.environ.get("SRI_CIRCUITO_FALLOS", "5") or 5))
+CIRCUITO_PAUSA = float(os.environ.get("SRI_CIRCUITO_PAUSA_SEG", "30") or 30)
+CIRCUITO_APERTURAS = max(1, int(os.environ.get("SRI_CIRCUITO_APERTURAS", "4") or 4))
+
+
+class PortalNoDisponible(RuntimeError):
+    """El host no respondió tras varias pausas del disyuntor: no tiene sentido seguir."""
+
+
+class ErrorDefinitivo(RuntimeError):
+    """Fallo que no se arregla reintentando (p. ej. falta un botón); no cuenta contra el host."""
+
+
+# =====================================================
+# 🪣 CUBETA DE FICHAS ADAPTATIVA
+# =====================================================
+class CubetaAdaptativa:
+    """Limita las peticiones por segundo; el ritmo se ajusta con cada resultado."""
+
+    def __init__(self, tasa: float = TASA_INICIAL, minima: float = TASA_MIN, maxima: float = TASA_MAX):
+        self.minima, self.maxima = minima, max(minima, maxima)
+        self.tasa = min(max(tasa, self.minima), self.maxima)
+        self.paso = 0.1 * self.tasa          # Aumento por acierto
+        self._fichas = 1.0
+        self._ultimo = time.monotonic()
+        self._latencia = None        # Media móvil (EWMA) de la latencia
+        self._mejor = None           # Mejor media observada (host sano)
+        self._lock = threading.Lock()
+
+    def _rellenar(self, ahora: float):
+        # Ráfaga máxima de un segundo de peticiones
+        self._fichas = min(max(1.0, self.tasa), self._fichas + (ahora - self._ultimo) * self.tasa)
+        self._ultimo = ahora
+
+    def tomar(self):
+        """Bloquea hasta que haya una ficha libre."""
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                self._rellenar(ahora)
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return
+                espera = (1 - self._fichas) / self.tasa
+            time.sleep(espera)
+
+    def exito(self, latencia: float):
+        with self._lock:
+            self._latencia = latencia if self._latencia is None else 0.8 * self._latencia + 0.2 * latencia
+            # La referencia sube despacio: una latencia mayor pero estable pasa a ser la normal
+            self._mejor = self._latencia if self._mejor is None else min(self._mejor * 1.02, self._latencia)
+            if self._latencia > max(LATENCIA_LENTA, FACTOR_LENTITUD * self._mejor):
+                self.tasa = max(self.minima, self.tasa * 0.8)
+            else:
+                self.tasa = min(self.maxima, self.tasa + self.paso)
+
+    def fallo(self):
+        with self._lock:
+            self.tasa = max(self.minima, self.tasa * 0.7)
+
+
+# =====================================================
+# 🔌 DISYUNTOR
+# =====================================================
+class Disyuntor:
+    """
+    Cerrado: todo pasa. Abierto: todos esperan a que termine la pausa.
+    Semiabierto: pasa una sola petición de prueba; si sale bien se cierra,
+    si falla se vuelve a abrir con el doble de pausa.
+    """
+
+    def __init__(self, umbral: int = CIRCUITO_FALLOS, pausa: float = CIRCUITO_PAUSA,
+                 max_aperturas: int = CIRCUITO_APERTURAS):
+        self.umbral, self.pausa, self.max_aperturas = umbral, pausa, max_aperturas
+        self.fallos_seguidos = 0
+        self.aperturas = 0           # Aperturas seguidas sin ningún acierto
+        self.abierto_hasta = 0.0
+        self._probando = False
+        self._cond = threading.Condition()
+
+    @property
+    def estado(self) -> str:
+        if self.aperturas == 0:
+            return "cerrado"
+        return "abierto" if time.monotonic() < self.abierto_hasta else "semiabierto"
+
+    def esperar(self):
+        """Deja pasar cuando el circuito lo permite; PortalNoDisponible si el host se dio por caído."""
+        with self._cond:
+            while True:
+                if self.aperturas == 0:
+                    return
+                restante = self.abierto_hasta - time.monotonic()
+                if restante > 0:
+                    if self.aperturas >= self.max_aperturas:
+                        raise PortalNoDisponible(
+                            f"sin respuesta tras {self.aperturas} pausas; reintente en {restante:.0f} s"
+                        )
+                    self._cond.wait(restante)
+                elif not self._probando:
+                    self._probando = True
+                    return
+                else:
+                    self._cond.wait()
+
+    def exito(self):
+        with self._cond:
+            self.fallos_seguidos = self.aperturas = 0
+            self._probando = False
+            self._cond.notify_all()
+
+    def fallo(self) -> bool:
+        """Anota un fallo; True si con él se abrió el circuito."""
+        with self._cond:
+            self.fallos_seguidos += 1
+            if not (self._probando or (self.aperturas == 0 and self.fallos_seguidos >= self.umbral)):
+                return False
+            self._probando = False
+            self.aperturas += 1
+            self.abierto_hasta = time.monotonic() + self.pausa * 2 ** (self.aperturas - 1)
+            self._cond.notify_all()
+            return True
+
+
+# =====================================================
+# 🚦 GOBERNADOR POR HOST
+# =====================================================
+class Gobernador:
+    """Cubeta + disyuntor + reintentos para las peticiones a un host."""
+
+    def __init__(self, host: str, reintentos: int = REINTENTOS, tasa: float = TASA_INICIAL,
+                 tasa_max: float = TASA_MAX):
+        self.host = host
+        self.reintentos = reintentos
+        self.cubeta = CubetaAdaptativa(tasa, maxima=tasa_max)
+        self.disyuntor = Disyuntor()
+
+    def espera(self, intento: int) -> float:
+        """Espera exponencial con jitter completo antes del reintento `intento` (1, 2, …)."""
+        return random.uniform(0, min(ESPERA_MAX, ESPERA_BASE * 2 ** intento))
+
+    def ejecutar(self, funcion, *args, metricas=None, **kwargs):
+        """
+        Llama `funcion(*args, **kwargs)` respetando el ritmo y el disyuntor del host,
+        con hasta `reintentos` reintentos. Devuelve su resultado o relanza el último error.
+        """
+        intento = 0
+        while True:
+            self.disyuntor.esperar()
+            self.cubeta.tomar()
+            inicio = time.monotonic()
+            try:
+                resultado = funcion(*args, **kwargs)
+            except ErrorDefinitivo:
+                self.disyuntor.exito()
+                raise
+            except Exception:
+                self.cubeta.fallo()
+                if self.disyuntor.fallo() and metricas:
+                    metricas.contar("circuito_abierto")
+                if intento >= self.reintentos:
+                    raise
+                intento += 1
+                if metricas:
+                    metricas.contar("reintentos")
+                time.sleep(self.espera(intento))
+                continue
+            self.cubeta.exito(time.monotonic() - inicio)
+            self.disyuntor.exito()
+            return resultado
+
+    def estado(self) -> dict:
+        return {"host": self.host, "tasa": round(self.cubeta.tasa, 2), "circuito": self.disyuntor.estado}
+
+
+_GOBERNADORES = {}
+_LOCK_GOBERNADORES = threading.Lock()
+
+
+def gobernador(url: str, **opciones) -> Gobernador:
+    """
+    Gobernador compartido del host de `url` (o de un host ya extraído).
+    `opciones` (tasa, tasa_max, reintentos) solo cuentan al crearlo.
+    """
+    host = urlsplit(url).netloc or url
+    with _LOCK_GOBERNADORES:
+        g = _GOBERNADORES.get(host)
+        if g is None:
+            g = _GOBERNADORES[host] = Gobernador(host, **opciones)
+        return g
@@ -2,25 +2,151 @@
 # 📜 MÓDULO: HISTORIAL DE DESCARGAS Y AUDITORÍA
 # =====================================================
 # Guarda y recupera el historial de ejecuciones del robot.
-# Estructura de archivo: historial_descargas.json
+# Almacenamiento: historial_descargas.sqlite3 (SQLite en modo WAL),
+# con índices por RUC/período/fecha y consultas paginadas.
+# El antiguo historial_descargas.json se migra una sola vez.
 # =====================================================
 
 import json
+import sqlite3
+import threading
 from datetime import datetime
 from pathlib import Path
 import pandas as pd
 
 # Ruta base (Render / Docker / local)
 BASE_DIR = Path(__file__).resolve().parent.parent
-HIST_PATH = BASE_DIR / "historial_descargas.json"
+HIST_PATH = BASE_DIR / "historial_descargas.json"          # formato anterior (solo migración)
+HIST_DB = BASE_DIR / "historial_descargas.sqlite3"
+
+COLUMNAS = ["timestamp", "ruc", "origen", "anio", "mes", "tipo",
+            "estado", "n_xml", "n_pdf", "n_registros"]
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS descargas (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp   TEXT    NOT NULL,
+    ruc         TEXT    NOT NULL,
+    origen      TEXT,
+    anio        INTEGER,
+    mes         INTEGER,
+    tipo        TEXT,
+    estado      TEXT,
+    n_xml       INTEGER DEFAULT 0,
+    n_pdf       INTEGER DEFAULT 0,
+    n_registros INTEGER DEFAULT 0,
+    metricas    TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_descargas_ruc_periodo ON descargas (ruc, anio, mes, timestamp);
+CREATE INDEX IF NOT EXISTS ix_descargas_periodo ON descargas (anio, mes, timestamp);
+CREATE INDEX IF NOT EXISTS ix_descargas_timestamp ON descargas (timestamp);
+CREATE TABLE IF NOT EXISTS migraciones (
+    nombre TEXT PRIMARY KEY,
+    fecha  TEXT NOT NULL
+);
+"""
+
+# Marca en la tabla migraciones del import de historial_descargas.json
+_MIGRACION_JSON = "historial_json"
+
+_init_lock = threading.Lock()
+_inicializado = set()
+
+
+# =====================================================
+# 🔌 CONEXIÓN Y MIGRACIÓN
+# =====================================================
+def _conectar() -> sqlite3.Connection:
+    """
+    Abre una conexión nueva (una por llamada: Streamlit atiende cada sesión
+    en su propio hilo). WAL permite lectores concurrentes mientras se escribe.
+    """
+    conn = sqlite3.connect(HIST_DB, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    db = str(HIST_DB)
+    if db not in _inicializado:
+        with _init_lock:
+            if db not in _inicializado:
+                conn.executescript(_ESQUEMA)
+                # Bases creadas antes de guardar métricas por ejecución
+                if "metricas" not in {c[1] for c in conn.execute("PRAGMA table_info(descargas)")}:
+                    conn.execute("ALTER TABLE descargas ADD COLUMN metricas TEXT")
+                _migrar_json(conn)
+                _inicializado.add(db)
+    return conn
+
+
+def _migrar_json(conn: sqlite3.Connection):
+    """
+    Importa historial_descargas.json (si existe) y lo renombra a .migrado.
+    Las filas y la marca de migración se escriben en una sola transacción
+    BEGIN IMMEDIATE: con varios procesos arrancando a la vez solo uno importa.
+    """
+    if not HIST_PATH.exists():
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        hecha = conn.execute("SELECT 1 FROM migraciones WHERE nombre = ?", (_MIGRACION_JSON,)).fetchone()
+        if hecha or not HIST_PATH.exists():
+            conn.rollback()
+            _renombrar_migrado()
+            return
+        try:
+            with open(HIST_PATH, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if not isinstance(data, list):
+                data = []
+        except FileNotFoundError:
+            conn.rollback()
+            return
+        except Exception:
+            conn.rollback()
+            print(f"[WARN] No se pudo leer {HIST_PATH.name} para migrarlo; se conserva intacto.")
+            return
+
+        filas = [
+            tuple(r.get(c, 0 if c.startswith("n_") else None) for c in COLUMNAS)
+            for r in data if isinstance(r, dict) and r.get("timestamp") and r.get("ruc")
+        ]
+        conn.executemany(
+            f"INSERT INTO descargas ({', '.join(COLUMNAS)}) VALUES ({', '.join('?' * len(COLUMNAS))})",
+            filas,
+        )
+        conn.execute("INSERT INTO migraciones (nombre, fecha) VALUES (?, ?)",
+                     (_MIGRACION_JSON, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    _renombrar_migrado()
+
+
+def _renombrar_migrado():
+    # Otro proceso pudo renombrarlo ya; la marca en la base es lo que cuenta
+    try:
+        HIST_PATH.replace(HIST_PATH.with_suffix(".json.migrado"))
+    except FileNotFoundError:
+        pass
+
+
+def _filtros_sql(ruc=None, origen=None, anio=None, mes=None):
+    condiciones, params = [], []
+    for columna, valor in (("ruc", ruc), ("origen", origen), ("anio", anio), ("mes", mes)):
+        if valor not in (None, ""):
+            condiciones.append(f"{columna} = ?")
+            params.append(valor)
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    return where, params
+
 
 # =====================================================
 # 🧾 REGISTRAR DESCARGA
 # =====================================================
 def registrar_descarga(ruc, origen, anio, mes, tipo, resultado):
     """
-    Registra una ejecución del robot en el archivo JSON.
-    Crea el historial si no existe.
+    Registra una ejecución del robot en el historial.
+    La inserción es atómica y segura con varias sesiones a la vez.
     """
     registro = {
         "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
@@ -35,22 +161,17 @@ def registrar_descarga(ruc, origen, anio, mes, tipo, resultado):
         "n_registros": resultado.get("n_registros", 0),
     }
 
-    # Leer historial existente o iniciar lista vacía
-    if HIST_PATH.exists():
-        try:
-            with open(HIST_PATH, "r", encoding="utf-8") as f:
-                historial = json.load(f)
-                if not isinstance(historial, list):
-                    historial = []
-        except Exception:
-            historial = []
-    else:
-        historial = []
-
-    # Agregar nuevo registro y guardar
-    historial.append(registro)
-    with open(HIST_PATH, "w", encoding="utf-8") as f:
-        json.dump(historial, f, ensure_ascii=False, indent=2)
+    metricas = resultado.get("metricas")
+    conn = _conectar()
+    try:
+        with conn:
+            conn.execute(
+                f"INSERT INTO descargas ({', '.join(COLUMNAS)}, metricas) "
+                f"VALUES ({', '.join('?' * (len(COLUMNAS) + 1))})",
+                tuple(registro[c] for c in COLUMNAS) + (json.dumps(metricas) if metricas else None,),
+            )
+    finally:
+        conn.close()
 
     return registro
 
@@ -58,23 +179,66 @@ def registrar_descarga(ruc, origen, anio, mes, tipo, resultado):
 # =====================================================
 # 📊 OBTENER HISTORIAL
 # =====================================================
-def obtener_historial():
+def obtener_historial(ruc=None, origen=None, anio=None, mes=None, limite=None, desplazamiento=0):
     """
     Devuelve el historial como DataFrame ordenado (más recientes primero).
-    Si no existe, devuelve un DataFrame vacío.
+    Admite filtros por RUC/origen/período y paginación (limite/desplazamiento).
+    Si no hay registros, devuelve un DataFrame vacío.
     """
-    if not HIST_PATH.exists():
-        return pd.DataFrame()
+    where, params = _filtros_sql(ruc, origen, anio, mes)
+    sql = f"SELECT {', '.join(COLUMNAS)} FROM descargas {where} ORDER BY timestamp DESC, id DESC"
+    if limite:
+        sql += " LIMIT ? OFFSET ?"
+        params += [int(limite), int(desplazamiento)]
+
+    conn = _conectar()
+    try:
+        df = pd.read_sql_query(sql, conn, params=params)
+    finally:
+        conn.close()
+    return df
+
 
+def contar_historial(ruc=None, origen=None, anio=None, mes=None) -> int:
+    """Número de ejecuciones que cumplen los filtros (para paginar en la UI)."""
+    where, params = _filtros_sql(ruc, origen, anio, mes)
+    conn = _conectar()
     try:
-        with open(HIST_PATH, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        if not isinstance(data, list):
-            return pd.DataFrame()
-        df = pd.DataFrame(data)
-        if not df.empty:
-            df = df.sort_values(by="timestamp", ascending=False).reset_index(drop=True)
-        return df
-    except Exception:
-        # Si el JSON está corrupto, devolver vacío
-        return pd.DataFrame()
+        return conn.execute(f"SELECT COUNT(*) FROM descargas {where}", params).fetchone()[0]
+    finally:
+        conn.close()
+
+
+# =====================================================
+# ⚡ MÉTRICAS DE RENDIMIENTO
+# =====================================================
+def obtener_metricas(ruc=None, origen=None, anio=None, mes=None, limite=50):
+    """
+    Ejecuciones con métricas (más recientes primero), con una columna por fase
+    (segundos) y por contador, más la latencia media por clave.
+    """
+    where, params = _filtros_sql(ruc, origen, anio, mes)
+    where = f"{where} AND metricas IS NOT NULL" if where else "WHERE metricas IS NOT NULL"
+    sql = (f"SELECT timestamp, ruc, origen, anio, mes, tipo, metricas FROM descargas {where} "
+           f"ORDER BY timestamp DESC, id DESC LIMIT ?")
+
+    conn = _conectar()
+    try:
+        filas = conn.execute(sql, params + [int(limite)]).fetchall()
+    finally:
+        conn.close()
+
+    registros = []
+    for timestamp, ruc_, origen_, anio_, mes_, tipo, metricas in filas:
+        try:
+            m = json.loads(metricas)
+        except Exception:
+            continue
+        r = {"timestamp": timestamp, "ruc": ruc_, "origen": origen_, "anio": anio_, "mes": mes_, "tipo": tipo}
+        r.update({f"seg_{k}": v for k, v in m.get("fases", {}).items()})
+        r.update(m.get("contadores", {}))
+        h = m.get("histogramas", {}).get("clave_segundos")
+        if h and h.get("n"):
+            r["seg_por_clave"] = round(h["suma"] / h["n"], 3)
+        registros.append(r)
+    return pd.DataFrame(registros)
@@ -0,0 +1,210 @@
+# =====================================================
+# 🔑 MÓDULO: ÍNDICE GLOBAL DE CLAVES DE ACCESO
+# =====================================================
+# Una fila por (claveAcceso, formato) con la ubicación canónica
+# del archivo (RUC, período, ruta), su hash y el estado del
+# parseo. Evita volver a descargar un comprobante que ya está
+# en otro período, permite quitar duplicados de los reportes y
+# buscar cualquier comprobante por su clave en todas las
+# descargas. Almacenamiento: indice_claves.sqlite3 (WAL).
+# =====================================================
+
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+INDICE_DB = BASE_DIR / "indice_claves.sqlite3"
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS claves (
+    clave         TEXT NOT NULL,
+    formato       TEXT NOT NULL,
+    ruc           TEXT,
+    anio          INTEGER,
+    mes           INTEGER,
+    ruta          TEXT NOT NULL,
+    tamano        INTEGER,
+    sha256        TEXT,
+    estado_parseo TEXT,
+    error         TEXT,
+    actualizado   TEXT,
+    PRIMARY KEY (clave, formato)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ix_claves_periodo ON claves (ruc, anio, mes);
+"""
+
+COLUMNAS = ["clave", "formato", "ruc", "anio", "mes", "ruta", "tamano", "sha256",
+            "estado_parseo", "error", "actualizado"]
+
+LOTE_CONSULTA = 500         # Claves por consulta IN (límite de parámetros de SQLite)
+
+_init_lock = threading.Lock()
+_inicializado = set()
+
+
+# =====================================================
+# 🔌 CONEXIÓN
+# =====================================================
+def _conectar() -> sqlite3.Connection:
+    conn = sqlite3.connect(INDICE_DB, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    db = str(INDICE_DB)
+    if db not in _inicializado:
+        with _init_lock:
+            if db not in _inicializado:
+                conn.executescript(_ESQUEMA)
+                _inicializado.add(db)
+    return conn
+
+
+def _periodo(destino: Path) -> tuple:
+    """(ruc, anio, mes) de una carpeta descargas/<ruc>/<anio>/<mes>; None donde no aplica."""
+    partes = Path(destino).parts[-3:]
+    if len(partes) < 3:
+        return None, None, None
+    ruc, anio, mes = partes
+    try:
+        return ruc, int(anio), int(mes)
+    except ValueError:
+        return ruc, None, None
+
+
+def _ahora() -> str:
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+# =====================================================
+# 🧾 REGISTRO
+# =====================================================
+def registrar(clave: str, formato: str, destino: Path, ruta: Path, tamano: int = None, sha256: str = None) -> dict:
+    """
+    Anota `ruta` como ubicación de (clave, formato). Si la clave ya tiene una
+    ubicación canónica distinta y ese archivo sigue existiendo, se conserva la
+    anterior (la primera descarga manda). Devuelve la entrada vigente.
+    """
+    ruta = str(Path(ruta).resolve())
+    ruc, anio, mes = _periodo(destino)
+    conn = _conectar()
+    try:
+        with conn:
+            fila = conn.execute("SELECT ruta FROM claves WHERE clave = ? AND formato = ?",
+                                (clave, formato)).fetchone()
+            if fila and fila[0] != ruta and Path(fila[0]).exists():
+                return buscar(clave, formato, conn)
+            conn.execute(
+                "INSERT OR REPLACE INTO claves (clave, formato, ruc, anio, mes, ruta, tamano, sha256, "
+                "estado_parseo, error, actualizado) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'pendiente', NULL, ?)",
+                (clave, formato, ruc, anio, mes, ruta, tamano, sha256, _ahora()),
+            )
+        return buscar(clave, formato, conn)
+    finally:
+        conn.close()
+
+
+def registrar_existentes(destino: Path, entradas: list):
+    """
+    Incorpora de una vez archivos ya descargados (p. ej. los del manifiesto de
+    una corrida anterior al índice). No reemplaza ubicaciones ya conocidas.
+    `entradas`: dicts con clave, formato, ruta y opcionalmente tamano/sha256.
+    """
+    if not entradas:
+        return
+    ruc, anio, mes = _periodo(destino)
+    ahora = _ahora()
+    conn = _conectar()
+    try:
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO claves (clave, formato, ruc, anio, mes, ruta, tamano, sha256, "
+                "estado_parseo, actualizado) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'pendiente', ?)",
+                [(e["clave"], e["formato"], ruc, anio, mes, str(Path(e["ruta"]).resolve()),
+                  e.get("tamano"), e.get("sha256"), ahora) for e in entradas],
+            )
+    finally:
+        conn.close()
+
+
+def marcar_parseo(filas: list, carpeta_xml: Path):
+    """
+    Guarda el estado del parseo ('ok' / 'error') de las filas de un reporte.
+    Solo toca las entradas cuyo XML canónico está en `carpeta_xml`.
+    """
+    carpeta = str(Path(carpeta_xml).resolve())
+    datos = [
+        ("error" if f.get("error") else "ok", f.get("error"), Path(f["archivo"]).stem,
+         str(Path(carpeta, f["archivo"])))
+        for f in filas if f.get("archivo")
+    ]
+    if not datos:
+        return
+    conn = _conectar()
+    try:
+        with conn:
+            conn.executemany(
+                "UPDATE claves SET estado_parseo = ?, error = ? WHERE clave = ? AND formato = 'XML' AND ruta = ?",
+                datos,
+            )
+    finally:
+        conn.close()
+
+
+# =====================================================
+# 🔎 CONSULTAS
+# =====================================================
+def buscar(clave: str, formato: str = None, conn: sqlite3.Connection = None):
+    """
+    Búsqueda directa por clave primaria. Con `formato`, la entrada (dict) o None;
+    sin él, {formato: entrada} con todo lo que se tiene de la clave.
+    """
+    propia = conn is None
+    conn = conn or _conectar()
+    try:
+        if formato:
+            fila = conn.execute(f"SELECT {', '.join(COLUMNAS)} FROM claves WHERE clave = ? AND formato = ?",
+                                (clave.strip(), formato)).fetchone()
+            return dict(zip(COLUMNAS, fila)) if fila else None
+        filas = conn.execute(f"SELECT {', '.join(COLUMNAS)} FROM claves WHERE clave = ?",
+                             (clave.strip(),)).fetchall()
+        return {f[1]: dict(zip(COLUMNAS, f)) for f in filas}
+    finally:
+        if propia:
+            conn.close()
+
+
+def en_otra_carpeta(clave: str, formato: str, destino: Path):
+    """
+    Ruta del archivo de (clave, formato) si ya está descargado fuera de
+    `destino` y sigue en disco; None si hay que descargarlo aquí.
+    """
+    return en_otras_carpetas([clave], formato, destino).get(clave)
+
+
+def en_otras_carpetas(claves: list, formato: str, destino: Path) -> dict:
+    """en_otra_carpeta para muchas claves con una sola conexión: {clave: ruta}."""
+    carpeta = Path(destino).resolve()
+    res = {}
+    for clave, ruta in ubicaciones(claves, formato).items():
+        ruta = Path(ruta)
+        if carpeta not in ruta.parents and ruta.exists():
+            res[clave] = ruta
+    return res
+
+
+def ubicaciones(claves: list, formato: str = "XML") -> dict:
+    """{clave: ruta canónica} para las claves indexadas de la lista."""
+    claves = [c for c in dict.fromkeys(claves) if c]
+    res = {}
+    conn = _conectar()
+    try:
+        for i in range(0, len(claves), LOTE_CONSULTA):
+            parte = claves[i:i + LOTE_CONSULTA]
+            res.update(conn.execute(
+                f"SELECT clave, ruta FROM claves WHERE formato = ? AND clave IN ({', '.join('?' * len(parte))})",
+                [formato] + parte,
+            ).fetchall())
+    finally:
+        conn.close()
+    return res
@@ -0,0 +1,165 @@
+# =====================================================
+# 🗂️ MÓDULO: MANIFIESTO DE DESCARGAS (REANUDABLES)
+# =====================================================
+# Registra, por carpeta destino (descargas/<ruc>/<anio>/<mes>),
+# qué claves ya tienen su XML/PDF guardado y válido.
+# Estructura de archivo: manifiesto.jsonl (una línea por evento,
+# solo se agrega al final → sobrevive a caídas a mitad de corrida).
+# =====================================================
+
+import hashlib
+import json
+import threading
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from pathlib import Path
+
+from robot import indice
+
+MANIFIESTO_NOMBRE = "manifiesto.jsonl"
+
+# Carpeta y extensión de cada formato dentro del destino
+FORMATOS = {
+    "XML": ("XML", ".xml"),
+    "PDF": ("PDF", ".pdf"),
+}
+
+
+# =====================================================
+# ✅ VALIDACIÓN DE CONTENIDO
+# =====================================================
+def _contenido_valido(formato: str, data: bytes) -> bool:
+    """
+    Comprueba que el archivo sea realmente lo que dice ser: el portal devuelve
+    a veces una página HTML de error que se guarda con extensión .xml/.pdf.
+    """
+    if formato == "PDF":
+        return data[:5] == b"%PDF-"
+
+    cabecera = data[:512].lstrip(b"\xef\xbb\xbf \t\r\n").lower()
+    if not cabecera.startswith(b"<"):
+        return False
+    if cabecera.startswith((b"<!doctype html", b"<html")) or b"<html" in cabecera:
+        return False
+    # Un XML truncado o con basura no debe contar como descargado
+    try:
+        ET.fromstring(data)
+        return True
+    except Exception:
+        return False
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+# =====================================================
+# 📒 MANIFIESTO POR CARPETA DESTINO
+# =====================================================
+class Manifiesto:
+    """
+    Estado de descarga de cada (clave, formato) en una carpeta destino.
+    Seguro para varios hilos de descarga dentro del mismo proceso.
+    """
+
+    def __init__(self, destino: Path, al_registrar=None):
+        self.destino = Path(destino)
+        self.ruta = self.destino / MANIFIESTO_NOMBRE
+        # al_registrar(ruta): aviso de cada archivo válido recién guardado (p. ej. el ZIP)
+        self.al_registrar = al_registrar
+        self._lock = threading.Lock()
+        self._entradas = {}
+        self._cargar()
+
+    def _cargar(self):
+        if not self.ruta.exists():
+            return
+        with open(self.ruta, "r", encoding="utf-8") as f:
+            for linea in f:
+                try:
+                    e = json.loads(linea)
+                    self._entradas[(e["clave"], e["formato"])] = e
+                except Exception:
+                    # Última línea a medio escribir tras una caída: se ignora
+                    continue
+
+    def indexar(self):
+        """Lleva al índice global los archivos válidos ya anotados en este manifiesto."""
+        with self._lock:
+            entradas = [
+                {**e, "ruta": self.ruta_archivo(e["clave"], e["formato"])}
+                for e in self._entradas.values() if e.get("estado") == "ok" and e["formato"] in FORMATOS
+            ]
+        indice.registrar_existentes(self.destino, entradas)
+
+    def ruta_archivo(self, clave: str, formato: str) -> Path:
+        carpeta, ext = FORMATOS[formato]
+        return self.destino / carpeta / f"{clave}{ext}"
+
+    def completo(self, clave: str, formato: str) -> bool:
+        """
+        True si el archivo existe y coincide con lo registrado (tamaño + hash).
+        Archivos presentes sin registro (corridas anteriores al manifiesto) se
+        validan por contenido y se incorporan al manifiesto.
+        """
+        ruta = self.ruta_archivo(clave, formato)
+        try:
+            stat = ruta.stat()
+        except OSError:
+            return False
+
+        entrada = self._entradas.get((clave, formato))
+        if entrada and entrada.get("estado") == "ok":
+            if entrada.get("tamano") != stat.st_size:
+                return False
+            # Mismo tamaño y mtime → se confía en el hash registrado sin releer
+            if entrada.get("mtime") == stat.st_mtime:
+                return True
+            return _sha256(ruta.read_bytes()) == entrada.get("sha256")
+
+        try:
+            self.registrar(clave, formato)
+            return True
+        except ValueError:
+            return False
+
+    def pendientes(self, clave: str, formatos: list) -> list:
+        """Formatos de `formatos` que aún faltan para la clave."""
+        return [f for f in formatos if f in FORMATOS and not self.completo(clave, f)]
+
+    def registrar(self, clave: str, formato: str) -> dict:
+        """
+        Valida el archivo recién guardado y lo anota en el manifiesto.
+        Si el contenido no es válido, borra el archivo y lanza ValueError.
+        """
+        ruta = self.ruta_archivo(clave, formato)
+        data = ruta.read_bytes()
+        if not _contenido_valido(formato, data):
+            ruta.unlink(missing_ok=True)
+            self._anotar({"clave": clave, "formato": formato, "estado": "invalido", "tamano": len(data)})
+            raise ValueError(f"{formato} inválido para {clave} (¿página de error del portal?)")
+
+        entrada = self._anotar({
+            "clave": clave,
+            "formato": formato,
+            "estado": "ok",
+            "tamano": len(data),
+            "mtime": ruta.stat().st_mtime,
+            "sha256": _sha256(data),
+        })
+        try:
+            indice.registrar(clave, formato, self.destino, ruta, entrada["tamano"], entrada["sha256"])
+        except Exception as e:
+            # El índice es un extra: el archivo ya quedó guardado y anotado
+            print(f"[WARN] No se pudo indexar {clave} ({formato}): {e}")
+        if self.al_registrar:
+            self.al_registrar(ruta)
+        return entrada
+
+    def _anotar(self, entrada: dict) -> dict:
+        entrada["timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock:
+            self._entradas[(entrada["clave"], entrada["formato"])] = entrada
+            with open(self.ruta, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entrada, ensure_ascii=False) + "\n")
+        return entrada
@@ -0,0 +1,99 @@
+# =====================================================
+# ⚡ MÓDULO: MÉTRICAS DE RENDIMIENTO POR EJECUCIÓN
+# =====================================================
+# Temporizadores por fase (login, captcha, TXT, claves, parseo,
+# Excel, ZIP), histograma de latencia por clave y contadores
+# (bytes, reintentos, fallos). Se guardan con el registro del
+# historial y se exportan como JSON o texto Prometheus.
+# =====================================================
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# Límites superiores (segundos) del histograma de latencia por clave
+CUBETAS_CLAVE = [0.5, 1, 2, 5, 10, 30, 60]
+
+
+class Metricas:
+    """Acumulador de métricas de una ejecución. Seguro entre hilos."""
+
+    def __init__(self, cubetas: list = None):
+        self._lock = threading.Lock()
+        self.fases = {}          # fase → segundos acumulados
+        self.contadores = {}     # nombre → valor
+        self.cubetas = list(cubetas or CUBETAS_CLAVE)
+        self.histogramas = {}    # nombre → {"cubetas": [...], "suma": s, "n": n}
+
+    @contextmanager
+    def fase(self, nombre: str):
+        """Mide el tiempo de un bloque y lo acumula en `nombre`."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar_fase(nombre, time.perf_counter() - inicio)
+
+    def registrar_fase(self, nombre: str, segundos: float):
+        """Acumula una duración ya medida (p. ej. la entrada a un with ajeno)."""
+        with self._lock:
+            self.fases[nombre] = self.fases.get(nombre, 0.0) + segundos
+
+    def contar(self, nombre: str, n: float = 1):
+        with self._lock:
+            self.contadores[nombre] = self.contadores.get(nombre, 0) + n
+
+    def observar(self, nombre: str, valor: float):
+        """Agrega una observación (p. ej. segundos por clave) al histograma `nombre`."""
+        with self._lock:
+            h = self.histogramas.setdefault(nombre, {"cubetas": [0] * len(self.cubetas), "suma": 0.0, "n": 0})
+            for i, limite in enumerate(self.cubetas):
+                if valor <= limite:
+                    h["cubetas"][i] += 1
+            h["suma"] += valor
+            h["n"] += 1
+
+    # ---------- Exportación ----------
+    def a_dict(self) -> dict:
+        with self._lock:
+            return {
+                "fases": {k: round(v, 3) for k, v in self.fases.items()},
+                "contadores": dict(self.contadores),
+                "histogramas": {
+                    k: {"limites": self.cubetas, "cubetas": list(h["cubetas"]),
+                        "suma": round(h["suma"], 3), "n": h["n"]}
+                    for k, h in self.histogramas.items()
+                },
+            }
+
+    def a_prometheus(self, etiquetas: dict = None) -> str:
+        """Texto en formato de exposición de Prometheus (para node_exporter textfile)."""
+        base = ",".join(f'{k}="{v}"' for k, v in (etiquetas or {}).items())
+        sep = "," if base else ""
+        datos = self.a_dict()
+        lineas = ["# TYPE sri_fase_segundos gauge"]
+        for fase, seg in datos["fases"].items():
+            lineas.append(f'sri_fase_segundos{{{base}{sep}fase="{fase}"}} {seg}')
+        for nombre, valor in datos["contadores"].items():
+            lineas.append(f"# TYPE sri_{nombre}_total counter")
+            lineas.append(f"sri_{nombre}_total{{{base}}} {valor}")
+        for nombre, h in datos["histogramas"].items():
+            lineas.append(f"# TYPE sri_{nombre} histogram")
+            for limite, n in zip(h["limites"], h["cubetas"]):
+                lineas.append(f'sri_{nombre}_bucket{{{base}{sep}le="{limite}"}} {n}')
+            lineas.append(f'sri_{nombre}_bucket{{{base}{sep}le="+Inf"}} {h["n"]}')
+            lineas.append(f"sri_{nombre}_sum{{{base}}} {h['suma']}")
+            lineas.append(f"sri_{nombre}_count{{{base}}} {h['n']}")
+        return "\n".join(lineas) + "\n"
+
+    def exportar(self, destino: Path, etiquetas: dict = None) -> dict:
+        """Escribe metricas.json y metricas.prom en `destino`; devuelve sus rutas."""
+        destino = Path(destino)
+        ruta_json = destino / "metricas.json"
+        ruta_prom = destino / "metricas.prom"
+        ruta_json.write_text(json.dumps({"etiquetas": etiquetas or {}, **self.a_dict()}, indent=2),
+                             encoding="utf-8")
+        ruta_prom.write_text(self.a_prometheus(etiquetas), encoding="utf-8")
+        return {"json": str(ruta_json), "prom": str(ruta_prom)}
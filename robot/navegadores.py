@@ -0,0 +1,308 @@
+# =====================================================
+# 🌐 MÓDULO: POOL DE NAVEGADORES CHROMIUM
+# =====================================================
+# Mantiene Chromium "caliente" entre llamadas a descargar_sri.
+# La API síncrona de Playwright solo puede usarse desde el hilo
+# que la inició, así que cada hilo de larga vida (trabajadores de
+# tareas) conserva su propio navegador y recibe un contexto nuevo
+# y aislado en cada uso. Todos los navegadores abiertos quedan en
+# un registro con tope global; los hilos de vida corta los
+# liberan al terminar y los de hilos muertos se recogen.
+# Modo liviano: un filtro de peticiones corta imágenes, fuentes,
+# CSS y hosts de terceros (menos red y memoria por página).
+# =====================================================
+
+import atexit
+import os
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from playwright.sync_api import sync_playwright
+
+ARGS_CHROMIUM = ["--no-sandbox", "--disable-setuid-sandbox", "--disable-dev-shm-usage", "--disable-gpu"]
+
+# Reciclar el navegador tras N contextos (fugas de memoria de Chromium)
+USOS_MAX = max(1, int(os.environ.get("SRI_NAVEGADOR_USOS", "25") or 25))
+# Tope de memoria (MB) sumando todos los procesos Chromium de este proceso; 0 = sin tope
+MEMORIA_MAX_MB = int(os.environ.get("SRI_NAVEGADOR_MEMORIA_MB", "3072") or 0)
+# Cada cuánto (s) se vuelve a medir la memoria: recorrer /proc en cada uso cuesta
+MEMORIA_INTERVALO_SEG = float(os.environ.get("SRI_NAVEGADOR_MEMORIA_SEG", "30") or 30)
+# Chromium abiertos a la vez en todo el proceso, y cuánto esperar (s) por un cupo
+NAVEGADORES_MAX = max(1, int(os.environ.get("SRI_NAVEGADORES_MAX", "12") or 12))
+ESPERA_CUPO_SEG = float(os.environ.get("SRI_NAVEGADOR_ESPERA_SEG", "300") or 300)
+
+# Modo liviano: tipos de recurso que no hacen falta para consultar y descargar,
+# y dominios propios (con sus subdominios); el resto de hosts se corta
+RECURSOS_BLOQUEADOS = frozenset(
+    t.strip() for t in os.environ.get(
+        "SRI_LIVIANO_RECURSOS", "image,media,font,stylesheet,texttrack,manifest"
+    ).split(",") if t.strip()
+)
+HOSTS_PROPIOS = [h.strip().lower() for h in os.environ.get("SRI_LIVIANO_HOSTS", "sri.gob.ec").split(",")
+                 if h.strip()]
+
+
+# =====================================================
+# 📏 PROCESOS CHROMIUM Y DRIVERS (Linux /proc)
+# =====================================================
+def _procesos() -> dict:
+    """{pid: (pid del padre, RSS en bytes)} de todo el sistema; vacío sin /proc."""
+    proc = Path("/proc")
+    if not proc.exists():
+        return {}
+    res = {}
+    for d in proc.iterdir():
+        if not d.name.isdigit():
+            continue
+        try:
+            stat = (d / "stat").read_text()
+            # El nombre va entre paréntesis y puede contener espacios
+            campos = stat[stat.rindex(")") + 2:].split()
+            res[int(d.name)] = (int(campos[1]), int(campos[21]) * os.sysconf("SC_PAGE_SIZE"))
+        except Exception:
+            continue
+    return res
+
+
+def memoria_chromium_mb() -> float:
+    """
+    RSS total (MB) de los procesos descendientes de este proceso.
+    En sistemas sin /proc devuelve 0 y el tope de memoria no aplica.
+    """
+    procesos = _procesos()
+    raiz = os.getpid()
+    total = 0
+    for pid, (_, rss) in procesos.items():
+        actual, visto = procesos.get(pid, (None,))[0], 0
+        while actual and actual != raiz and visto < 64:
+            actual, visto = procesos.get(actual, (None,))[0], visto + 1
+        if actual == raiz and pid != raiz:
+            total += rss
+    return total / 1_048_576
+
+
+def _drivers() -> set:
+    """Pids de los drivers de Playwright (hijos directos `run-driver`) de este proceso."""
+    raiz = os.getpid()
+    pids = set()
+    for pid, (padre, _) in _procesos().items():
+        if padre != raiz:
+            continue
+        try:
+            if b"run-driver" in Path(f"/proc/{pid}/cmdline").read_bytes():
+                pids.add(pid)
+        except OSError:
+            continue
+    return pids
+
+
+# =====================================================
+# 🪶 MODO LIVIANO: FILTRO DE PETICIONES
+# =====================================================
+def _host_propio(host: str, propios: list) -> bool:
+    return any(host == p or host.endswith("." + p) for p in propios)
+
+
+def aplicar_modo_liviano(context, hosts: list = (), al_bloquear=None):
+    """
+    Corta en `context` los recursos de RECURSOS_BLOQUEADOS y todo lo que no venga
+    de `hosts` o HOSTS_PROPIOS. Lo relacionado con el captcha siempre pasa (el
+    login puede repetirse a mitad de un lote). `al_bloquear()` se llama por cada
+    petición cortada. Nota: con un filtro activo Chromium no usa su caché HTTP;
+    por eso el modo liviano también evita recargar la página en cada clave.
+    """
+    propios = [h.lower() for h in hosts if h] + HOSTS_PROPIOS
+
+    def _filtrar(route):
+        peticion = route.request
+        url = peticion.url
+        if "captcha" in url.lower() or (
+            peticion.resource_type not in RECURSOS_BLOQUEADOS
+            and _host_propio((urlsplit(url).hostname or "").lower(), propios)
+        ):
+            route.continue_()
+            return
+        route.abort("blockedbyclient")
+        if al_bloquear:
+            al_bloquear()
+
+    context.route("**/*", _filtrar)
+
+
+# =====================================================
+# ♻️ POOL POR HILO CON REGISTRO GLOBAL
+# =====================================================
+class _Entrada:
+    """Playwright y Chromium de un hilo, con el pid de su driver para poder recogerlos."""
+
+    def __init__(self, hilo: threading.Thread, playwright, drivers: set):
+        self.hilo = hilo
+        self.playwright = playwright
+        self.drivers = drivers
+        self.browser = None
+        self.usos = 0
+
+
+class PoolNavegadores:
+    """
+    Entrega contextos de navegador aislados sobre un Chromium reutilizado
+    por hilo. El navegador se recicla tras `usos_max` contextos, si se
+    desconecta (caída) o si la memoria total supera `memoria_max_mb`.
+    Como mucho `maximo` navegadores abiertos a la vez en el proceso.
+    """
+
+    def __init__(self, usos_max: int = USOS_MAX, memoria_max_mb: int = MEMORIA_MAX_MB,
+                 maximo: int = NAVEGADORES_MAX):
+        self.usos_max = usos_max
+        self.memoria_max_mb = memoria_max_mb
+        self.maximo = maximo
+        self._lock = threading.Lock()
+        self._entradas = {}                 # ident del hilo → _Entrada
+        self._cupos = threading.BoundedSemaphore(maximo)
+        self._memoria = (float("-inf"), 0.0)
+
+    # ---------- Registro ----------
+    def abiertos(self) -> int:
+        """Navegadores Chromium abiertos ahora en el proceso."""
+        with self._lock:
+            return sum(e.browser is not None for e in self._entradas.values())
+
+    def _propia(self) -> _Entrada:
+        with self._lock:
+            entrada = self._entradas.get(threading.get_ident())
+        if entrada is None:
+            # El pid del driver se reconoce por diferencia: un arranque a la vez
+            with self._lock:
+                antes = _drivers()
+                playwright = sync_playwright().start()
+                entrada = _Entrada(threading.current_thread(), playwright, _drivers() - antes)
+                self._entradas[threading.get_ident()] = entrada
+        return entrada
+
+    def _recoger_huerfanos(self):
+        """
+        Hilos que terminaron sin liberar su navegador: su Playwright ya no puede
+        usarse desde otro hilo, así que se termina su driver (que cierra su Chromium).
+        """
+        with self._lock:
+            muertas = [i for i, e in self._entradas.items() if not e.hilo.is_alive()]
+            entradas = [self._entradas.pop(i) for i in muertas]
+        for entrada in entradas:
+            print(f"[WARN] El hilo {entrada.hilo.name} terminó sin liberar su navegador; se cierra.")
+            self._terminar_drivers(entrada)
+            if entrada.browser is not None:
+                entrada.browser = None
+                self._cupos.release()
+
+    @staticmethod
+    def _terminar_drivers(entrada: _Entrada):
+        for pid in entrada.drivers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+
+    # ---------- Navegador del hilo ----------
+    def _navegador(self):
+        entrada = self._propia()
+        if entrada.browser is not None and not entrada.browser.is_connected():
+            self._cerrar(entrada)
+        if entrada.browser is None:
+            self._recoger_huerfanos()
+            if not self._cupos.acquire(timeout=ESPERA_CUPO_SEG):
+                raise RuntimeError(f"Tope de {self.maximo} navegadores abiertos (SRI_NAVEGADORES_MAX)")
+            try:
+                entrada.browser = entrada.playwright.chromium.launch(headless=True, args=ARGS_CHROMIUM)
+            except Exception:
+                self._cupos.release()
+                raise
+            entrada.usos = 0
+        return entrada
+
+    def _cerrar(self, entrada: _Entrada):
+        browser, entrada.browser = entrada.browser, None
+        if browser is not None:
+            try:
+                browser.close()
+            except Exception:
+                pass
+            self._cupos.release()
+
+    def liberar(self):
+        """Cierra el navegador y el Playwright del hilo actual (hilos de vida corta, al terminar)."""
+        with self._lock:
+            entrada = self._entradas.pop(threading.get_ident(), None)
+        if entrada is None:
+            return
+        self._cerrar(entrada)
+        try:
+            entrada.playwright.stop()
+        except Exception:
+            pass
+
+    def cerrar_todos(self):
+        """
+        Cierra todo lo registrado (al salir del proceso): el navegador del hilo
+        actual por la API; el de los demás hilos, terminando su driver.
+        """
+        self.liberar()
+        with self._lock:
+            entradas = list(self._entradas.values())
+            self._entradas.clear()
+        for entrada in entradas:
+            self._terminar_drivers(entrada)
+
+    # ---------- Reciclaje ----------
+    def _memoria_mb(self) -> float:
+        # Medición compartida entre hilos, como mucho una cada MEMORIA_INTERVALO_SEG
+        with self._lock:
+            momento, mb = self._memoria
+            if time.monotonic() - momento < MEMORIA_INTERVALO_SEG:
+                return mb
+            self._memoria = (time.monotonic(), mb)
+        mb = memoria_chromium_mb()
+        with self._lock:
+            self._memoria = (time.monotonic(), mb)
+        return mb
+
+    def _debe_reciclar(self, entrada: _Entrada) -> bool:
+        if entrada.usos >= self.usos_max:
+            return True
+        return bool(self.memoria_max_mb) and self._memoria_mb() > self.memoria_max_mb
+
+    @contextmanager
+    def contexto(self, **opciones):
+        """
+        Contexto nuevo (cookies y almacenamiento propios) sobre el navegador
+        caliente de este hilo. `opciones` se pasan a browser.new_context.
+        """
+        entrada = self._navegador()
+        context = entrada.browser.new_context(**opciones)
+        try:
+            yield context
+        finally:
+            try:
+                context.close()
+            except Exception:
+                pass
+            entrada.usos += 1
+            if not entrada.browser.is_connected() or self._debe_reciclar(entrada):
+                self._cerrar(entrada)
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def pool_navegadores() -> PoolNavegadores:
+    """Pool compartido por todo el proceso; se cierra al salir."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = PoolNavegadores()
+            atexit.register(_POOL.cerrar_todos)
+        return _POOL
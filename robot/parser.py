@@ -1,12 +1,18 @@
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
 import pandas as pd
-import xml.etree.ElementTree as ET
-from openpyxl.utils import get_column_letter
-from openpyxl import load_workbook
-from openpyxl.chart import BarChart, Reference
-from openpyxl.chart.shapes import GraphicalProperties
-from openpyxl.drawing.colors import ColorChoice
-from openpyxl.chart.label import DataLabelList
+
+from robot import almacen, conciliacion, indice
+from robot.almacen import guardar_seguro
+from robot.extractor_xml import extraer
+from robot.metricas import Metricas
+from robot.reporte_excel import escribir_reporte
 
 
 # ============================================================
@@ -14,67 +20,252 @@ from openpyxl.chart.label import DataLabelList
 # ============================================================
 def _leer_xml(xml_path: Path) -> dict:
     """
-    Lee un archivo XML del SRI (Recibidos o Emitidos) y extrae campos clave.
+    Lee un archivo XML del SRI (Recibidos o Emitidos) y extrae campos clave,
+    líneas de detalle y retenciones en un solo recorrido (ver extractor_xml).
     Devuelve un diccionario con la información del comprobante.
     """
-    d = {"archivo": xml_path.name}
+    return extraer(xml_path)
+
+
+# ============================================================
+# PARSEO EN PARALELO CON CACHÉ PERSISTENTE
+# ============================================================
+CACHE_NOMBRE = ".cache_parseo.json"
+CACHE_VERSION = 2           # Subir si cambia la forma de las filas de _leer_xml
+LOTE_PARSEO = 256           # XMLs por tarea enviada al pool de procesos
+MIN_PARA_POOL = 500         # Por debajo de esto el pool cuesta más de lo que ahorra
+PROCESOS_PARSEO = int(os.environ.get("SRI_PARSER_PROCESOS", "0") or 0) or (os.cpu_count() or 1)
+
+
+def _leer_lote(rutas: list) -> list:
+    return [_leer_xml(Path(r)) for r in rutas]
+
+
+def _cargar_cache(ruta_cache: Path) -> dict:
     try:
-        root = ET.parse(xml_path).getroot()
-        ns = {"ns": root.tag.split("}")[0].strip("{")} if "}" in root.tag else {}
-
-        # --- Campos generales ---
-        d["fechaEmision"] = root.findtext(".//ns:fechaEmision", default="", namespaces=ns).strip()
-        d["rucEmisor"] = root.findtext(".//ns:ruc", default="", namespaces=ns).strip()
-        d["razonSocial"] = root.findtext(".//ns:razonSocial", default="", namespaces=ns).strip()
-        d["rucReceptor"] = root.findtext(".//ns:identificacionComprador", default="", namespaces=ns).strip()
-        d["razonSocialReceptor"] = root.findtext(".//ns:razonSocialComprador", default="", namespaces=ns).strip()
-        d["claveAcceso"] = root.findtext(".//ns:claveAcceso", default="", namespaces=ns).strip()
-        d["tipoDocumento"] = root.findtext(".//ns:codDoc", default="", namespaces=ns).strip()
-
-        # --- Conversión segura a float ---
-        def _num(val):
-            try:
-                return float(val.replace(",", "").strip()) if val else 0.0
-            except Exception:
-                return 0.0
-
-        # --- Totales ---
-        d["subtotal"] = _num(root.findtext(".//ns:totalSinImpuestos", default="0", namespaces=ns))
-        d["total"] = _num(root.findtext(".//ns:importeTotal", default="0", namespaces=ns))
-        d["iva"] = 0.0
-
-        # --- Detección de IVA (código 2) ---
-        for imp in root.findall(".//ns:totalImpuesto", namespaces=ns):
-            codigo = imp.findtext("ns:codigo", default="", namespaces=ns)
-            valor = imp.findtext("ns:valor", default="0", namespaces=ns)
-            if codigo == "2":
-                d["iva"] += _num(valor)
+        data = json.loads(ruta_cache.read_text(encoding="utf-8"))
+        if data.get("version") == CACHE_VERSION:
+            return data.get("entradas", {})
+    except Exception:
+        pass
+    return {}
 
-    except Exception as e:
-        d["error"] = f"Error leyendo {xml_path.name}: {e}"
-    return d
+
+def _guardar_cache(ruta_cache: Path, entradas: dict):
+    tmp = ruta_cache.with_suffix(".tmp")
+    try:
+        tmp.write_text(json.dumps({"version": CACHE_VERSION, "entradas": entradas}, ensure_ascii=False),
+                       encoding="utf-8")
+        os.replace(tmp, ruta_cache)
+    except Exception:
+        # La caché es opcional: si no se puede escribir, el reporte sigue igual
+        pass
+
+
+def _leer_xmls(carpeta_mes: Path, xmls: list) -> list:
+    """
+    Devuelve las filas de _leer_xml para `xmls`, en el mismo orden.
+    Reutiliza la caché (ruta, mtime, tamaño) y parsea solo los archivos
+    nuevos o modificados, repartidos en lotes entre varios procesos.
+    """
+    ruta_cache = carpeta_mes / CACHE_NOMBRE
+    cache = _cargar_cache(ruta_cache)
+    nuevo_cache = {}
+    filas = [None] * len(xmls)
+    faltantes = []
+
+    for i, xml in enumerate(xmls):
+        clave = str(xml.relative_to(carpeta_mes))
+        try:
+            st = xml.stat()
+            firma = [st.st_mtime_ns, st.st_size]
+        except OSError:
+            firma = None
+        entrada = cache.get(clave)
+        if firma and entrada and entrada.get("firma") == firma:
+            filas[i] = entrada["fila"]
+            nuevo_cache[clave] = entrada
+        else:
+            faltantes.append((i, clave, firma))
+
+    rutas = [str(xmls[i]) for i, _, _ in faltantes]
+    if len(rutas) >= MIN_PARA_POOL and PROCESOS_PARSEO > 1:
+        lotes = [rutas[j:j + LOTE_PARSEO] for j in range(0, len(rutas), LOTE_PARSEO)]
+        try:
+            # spawn: un fork copiaría los hilos de Playwright/ReporteIncremental y
+            # las conexiones SQLite abiertas del proceso padre
+            with ProcessPoolExecutor(max_workers=PROCESOS_PARSEO,
+                                     mp_context=multiprocessing.get_context("spawn")) as pool:
+                parseadas = [fila for lote in pool.map(_leer_lote, lotes) for fila in lote]
+        except Exception as e:
+            print(f"[WARN] Parseo en paralelo no disponible, se usa modo secuencial: {e}")
+            parseadas = _leer_lote(rutas)
+    else:
+        parseadas = _leer_lote(rutas)
+
+    for (i, clave, firma), fila in zip(faltantes, parseadas):
+        filas[i] = fila
+        if firma:
+            nuevo_cache[clave] = {"firma": firma, "fila": fila}
+
+    if faltantes or len(nuevo_cache) != len(cache):
+        _guardar_cache(ruta_cache, nuevo_cache)
+    return filas
 
 
 # ============================================================
 # FUNCIÓN PRINCIPAL — CONSTRUCCIÓN DE REPORTE DESDE XML
 # ============================================================
-def construir_reporte(carpeta_mes: Path, excel_salida: Path):
+def construir_reporte(carpeta_mes: Path, excel_salida: Path, metricas: Metricas = None,
+                      ruc: str = None, anio: int = None, mes: int = None, semillas: list = None,
+                      duplicadas: dict = None):
     """
     Genera un Excel con:
       - Detalle de comprobantes (por cada XML)
       - Totales por emisor
       - Hoja de errores (si aplica)
+      - Conciliación contra los TXT `semillas` y los Emitidos del almacén (si aplica)
       - Gráfico de barras con estilo SRI
+    Con `ruc`, `anio` y `mes` guarda además las filas en el almacén Parquet.
+    `duplicadas` ({clave: ruta}) son las claves que el downloader no bajó porque
+    ya estaban en otra carpeta: van a la hoja Duplicados y cuentan como descargadas.
+    Devuelve el DataFrame de detalle (None si no hay XML).
     """
-    rows = []
-    for xml in carpeta_mes.rglob("*.xml"):
-        rows.append(_leer_xml(xml))
+    metricas = metricas or Metricas()
+    with metricas.fase("parseo_xml"):
+        rows = _leer_xmls(carpeta_mes, list(carpeta_mes.rglob("*.xml")))
+    metricas.contar("xml_parseados", len(rows))
 
     if not rows:
         print("⚠️ No se encontraron archivos XML en la carpeta.")
         return
 
-    df = pd.DataFrame(rows)
+    with metricas.fase("duplicados"):
+        rows, duplicados = _deduplicar(rows, carpeta_mes)
+        if duplicadas:
+            duplicados = _agregar_externos(duplicados, duplicadas, rows)
+        try:
+            indice.marcar_parseo(rows, carpeta_mes)
+        except Exception as e:
+            print(f"[WARN] No se pudo actualizar el índice de claves: {e}")
+    metricas.contar("duplicados", len(duplicados))
+    df, lineas, retenciones = _desanidar(rows)
+    cruce = None
+    if semillas or (anio and mes):
+        with metricas.fase("conciliacion"):
+            cruce = _conciliar(df, duplicados, semillas, anio, mes)
+        if cruce is not None:
+            metricas.contar("conciliacion_novedades", len(cruce))
+    with metricas.fase("excel"):
+        _escribir_reporte_recibidos(df, excel_salida, lineas, retenciones, duplicados, cruce)
+    print(f"✅ Reporte generado: {excel_salida.name}")
+    if ruc and anio and mes:
+        with metricas.fase("almacen"):
+            guardar_seguro(df, ruc, anio, mes, "Recibidos")
+    return df
+
+
+def _deduplicar(rows: list, carpeta_mes: Path) -> tuple:
+    """
+    Deja un solo comprobante por claveAcceso: quita los repetidos dentro de la
+    carpeta (se prefiere el que se leyó sin error) y los que el índice global
+    ubica en otra carpeta (otro período o RUC), para no contarlos dos veces.
+    Devuelve (filas, DataFrame de duplicados con el motivo).
+    """
+    # Fila elegida por clave: la primera sin error (o la primera, si todas fallaron).
+    # Las filas conservan su orden original.
+    elegida = {}
+    for i, fila in enumerate(rows):
+        clave = fila.get("claveAcceso")
+        if clave and (clave not in elegida or (rows[elegida[clave]].get("error") and not fila.get("error"))):
+            elegida[clave] = i
+    unicas, duplicados = [], []
+    for i, fila in enumerate(rows):
+        clave = fila.get("claveAcceso")
+        if clave and elegida[clave] != i:
+            duplicados.append({**fila, "motivo": "repetido en esta carpeta"})
+        else:
+            unicas.append(fila)
+
+    try:
+        rutas = indice.ubicaciones([f.get("claveAcceso") for f in unicas])
+    except Exception as e:
+        print(f"[WARN] No se pudo consultar el índice de claves: {e}")
+        rutas = {}
+    carpeta = Path(carpeta_mes).resolve()
+    filas = []
+    for fila in unicas:
+        ruta = rutas.get(fila.get("claveAcceso"))
+        if ruta and carpeta not in Path(ruta).parents and Path(ruta).exists():
+            duplicados.append({**fila, "motivo": f"ya está en {'/'.join(Path(ruta).parts[-5:-2])}"})
+        else:
+            filas.append(fila)
+    planos = [{k: v for k, v in d.items() if k not in ("detalles", "retenciones")} for d in duplicados]
+    return filas, pd.DataFrame(planos)
+
+
+def _agregar_externos(duplicados: pd.DataFrame, duplicadas: dict, rows: list) -> pd.DataFrame:
+    """Suma a `duplicados` las claves que solo están en otra carpeta, leídas de su XML."""
+    presentes = {f.get("claveAcceso") for f in rows} | set(duplicados.get("claveAcceso", []))
+    externos = []
+    for clave, ruta in duplicadas.items():
+        ruta = Path(ruta)
+        if clave in presentes or not ruta.exists():
+            continue
+        fila = {k: v for k, v in _leer_xml(ruta).items() if k not in ("detalles", "retenciones")}
+        externos.append({**fila, "motivo": f"ya está en {'/'.join(ruta.parts[-5:-2])}"})
+    if not externos:
+        return duplicados
+    externos = pd.DataFrame(externos)
+    return externos if duplicados.empty else pd.concat([duplicados, externos], ignore_index=True)
+
+
+def _conciliar(df: pd.DataFrame, duplicados: pd.DataFrame, semillas: list,
+               anio: int, mes: int) -> pd.DataFrame:
+    """
+    Cruce del detalle con los TXT semilla y con los Emitidos del período
+    que el almacén tenga de sus emisores (None si no hay con qué cruzar).
+    Los duplicados cuentan como descargados: su XML está en otra carpeta.
+    """
+    semilla = conciliacion.leer_semillas(semillas or [])
+    reporte = pd.concat([df, duplicados], ignore_index=True) if not duplicados.empty else df
+    emitidos = None
+    if anio and mes:
+        emisores = set(semilla["rucEmisor"].dropna().astype(str).str.strip())
+        if "rucEmisor" in reporte.columns:
+            emisores |= set(reporte["rucEmisor"].dropna().astype(str).str.strip())
+        emisores.discard("")
+        try:
+            if emisores:
+                emitidos = almacen.consultar(sorted(emisores), "Emitidos", desde=(anio, mes), hasta=(anio, mes),
+                                             columnas=["ruc", "numero", "total", "estado"])
+        except Exception as e:
+            print(f"[WARN] No se pudieron leer los Emitidos del almacén: {e}")
+    if semilla.empty and (emitidos is None or emitidos.empty):
+        return None
+    return conciliacion.conciliar(semilla, reporte, emitidos)
+
+
+def _desanidar(rows: list) -> tuple:
+    """
+    Separa las listas anidadas de cada fila: (comprobantes, líneas de detalle,
+    retenciones), las dos últimas con la clave y el emisor de su comprobante.
+    """
+    lineas, retenciones = [], []
+    planas = []
+    for fila in rows:
+        fila = dict(fila)
+        ref = {"claveAcceso": fila.get("claveAcceso", ""), "rucEmisor": fila.get("rucEmisor", ""),
+               "numero": fila.get("numero", "")}
+        lineas.extend({**ref, **d} for d in fila.pop("detalles", None) or [])
+        retenciones.extend({**ref, **r} for r in fila.pop("retenciones", None) or [])
+        planas.append(fila)
+    return pd.DataFrame(planas), pd.DataFrame(lineas), pd.DataFrame(retenciones)
+
+
+def _escribir_reporte_recibidos(df: pd.DataFrame, excel_salida: Path, lineas: pd.DataFrame = None,
+                                retenciones: pd.DataFrame = None, duplicados: pd.DataFrame = None,
+                                cruce: pd.DataFrame = None):
     errores = df[df.get("error").notna()] if "error" in df.columns else pd.DataFrame()
 
     # --- Agrupar totales por emisor ---
@@ -84,16 +275,99 @@ def construir_reporte(carpeta_mes: Path, excel_salida: Path):
         .reset_index()
     )
 
-    # --- Guardar Excel con múltiples hojas ---
-    with pd.ExcelWriter(excel_salida, engine="openpyxl") as xls:
-        df.to_excel(xls, index=False, sheet_name="Detalle")
-        piv.to_excel(xls, index=False, sheet_name="Totales por Emisor")
-        if not errores.empty:
-            errores.to_excel(xls, index=False, sheet_name="Errores")
+    # --- Guardar Excel con múltiples hojas (una sola pasada) ---
+    hojas = [("Detalle", df), ("Totales por Emisor", piv)]
+    if lineas is not None and not lineas.empty:
+        hojas.append(("Líneas de Detalle", lineas))
+    if retenciones is not None and not retenciones.empty:
+        hojas.append(("Retenciones", retenciones))
+    if duplicados is not None and not duplicados.empty:
+        hojas.append(("Duplicados", duplicados))
+    if not errores.empty:
+        hojas.append(("Errores", errores))
+    if cruce is not None:
+        hojas.append(("Conciliación", cruce))
+    escribir_reporte(excel_salida, hojas, "Totales por Emisor", ("razonSocial", "total"))
 
-    _ajustar_columnas_excel(excel_salida)
-    _insertar_grafico_corporativo(excel_salida)
-    print(f"✅ Reporte generado: {excel_salida.name}")
+
+# ============================================================
+# REPORTE INCREMENTAL — PARSEO MIENTRAS SE DESCARGA
+# ============================================================
+INTERVALO_PARCIAL = float(os.environ.get("SRI_REPORTE_PARCIAL_SEG", "30") or 30)
+
+
+def ruta_reporte_parcial(destino: Path) -> Path:
+    """Excel parcial del mes en curso (destino = descargas/<ruc>/<anio>/<mes>)."""
+    return destino / f"reporte_{destino.parent.name}_{destino.name}_parcial.xlsx"
+
+
+class ReporteIncremental:
+    """
+    Parsea en un hilo propio cada XML apenas se guarda y acumula sus filas,
+    solapando el parseo con la descarga. Cada `intervalo` segundos deja un
+    Excel parcial con lo parseado hasta el momento. Al cerrar, vuelca las filas
+    a la caché de parseo: construir_reporte arma el reporte final sin reparsear.
+    """
+
+    def __init__(self, carpeta_mes: Path, excel_parcial: Path = None, intervalo: float = INTERVALO_PARCIAL):
+        self.carpeta_mes = Path(carpeta_mes)
+        self.excel_parcial = Path(excel_parcial) if excel_parcial else None
+        self.intervalo = intervalo
+        self.parseados = 0
+        self._ruta_cache = self.carpeta_mes / CACHE_NOMBRE
+        self._entradas = _cargar_cache(self._ruta_cache)
+        self._cola = queue.Queue()
+        self._hilo = threading.Thread(target=self._trabajar, name="parseo-incremental", daemon=True)
+        self._hilo.start()
+
+    def agregar(self, ruta: Path):
+        ruta = Path(ruta)
+        if ruta.suffix.lower() == ".xml":
+            self._cola.put(ruta)
+
+    def _trabajar(self):
+        ultimo_parcial = time.monotonic()
+        while True:
+            try:
+                ruta = self._cola.get(timeout=1)
+                if ruta is None:
+                    return
+                self._parsear(ruta)
+            except queue.Empty:
+                pass
+            if (self.excel_parcial and self.parseados
+                    and time.monotonic() - ultimo_parcial >= self.intervalo):
+                self._escribir_parcial()
+                ultimo_parcial = time.monotonic()
+
+    def _parsear(self, ruta: Path):
+        try:
+            clave = str(ruta.relative_to(self.carpeta_mes))
+            st = ruta.stat()
+        except (ValueError, OSError):
+            return
+        self._entradas[clave] = {"firma": [st.st_mtime_ns, st.st_size], "fila": _leer_xml(ruta)}
+        self.parseados += 1
+
+    def _escribir_parcial(self):
+        tmp = self.excel_parcial.with_name(f".{self.excel_parcial.name}")
+        try:
+            filas, duplicados = _deduplicar([e["fila"] for e in self._entradas.values()], self.carpeta_mes)
+            df, lineas, retenciones = _desanidar(filas)
+            _escribir_reporte_recibidos(df, tmp, lineas, retenciones, duplicados)
+            os.replace(tmp, self.excel_parcial)
+        except Exception as e:
+            print(f"[WARN] No se pudo escribir el reporte parcial: {e}")
+
+    def cerrar(self) -> int:
+        """Termina el parseo pendiente, guarda la caché y borra el Excel parcial."""
+        self._cola.put(None)
+        self._hilo.join()
+        if self.parseados:
+            _guardar_cache(self._ruta_cache, self._entradas)
+        if self.excel_parcial:
+            self.excel_parcial.unlink(missing_ok=True)
+        return self.parseados
 
 
 # ============================================================
@@ -121,73 +395,11 @@ def construir_reporte_emitidos(df_emitidos: pd.DataFrame, excel_salida: Path):
         .reset_index()
     )
 
-    # --- Exportar a Excel ---
-    with pd.ExcelWriter(excel_salida, engine="openpyxl") as xls:
-        df_emitidos.to_excel(xls, index=False, sheet_name="Detalle Emitidos")
-        piv.to_excel(xls, index=False, sheet_name="Totales por Cliente")
-
-    _ajustar_columnas_excel(excel_salida)
-    _insertar_grafico_corporativo(excel_salida)
+    # --- Exportar a Excel (una sola pasada) ---
+    escribir_reporte(
+        excel_salida,
+        [("Detalle Emitidos", df_emitidos), ("Totales por Cliente", piv)],
+        "Totales por Cliente", ("Cliente", "Total"),
+    )
     print(f"✅ Reporte Emitidos generado: {excel_salida.name}")
 
-
-# ============================================================
-# AJUSTE AUTOMÁTICO DE ANCHO DE COLUMNAS
-# ============================================================
-def _ajustar_columnas_excel(archivo_excel: Path):
-    wb = load_workbook(archivo_excel)
-    for ws in wb.worksheets:
-        for col in ws.columns:
-            max_length = 0
-            column = get_column_letter(col[0].column)
-            for cell in col:
-                try:
-                    if cell.value:
-                        max_length = max(max_length, len(str(cell.value)))
-                except Exception:
-                    pass
-            ws.column_dimensions[column].width = max(10, min(max_length + 2, 50))
-    wb.save(archivo_excel)
-
-
-# ============================================================
-# INSERCIÓN DE GRÁFICO CORPORATIVO SRI
-# ============================================================
-def _insertar_grafico_corporativo(archivo_excel: Path):
-    wb = load_workbook(archivo_excel)
-    hoja_grafico = None
-    for nombre in ["Totales por Emisor", "Totales por Cliente"]:
-        if nombre in wb.sheetnames:
-            hoja_grafico = nombre
-            break
-    if not hoja_grafico:
-        return
-
-    ws = wb[hoja_grafico]
-    num_filas = ws.max_row
-    if num_filas < 2:
-        wb.save(archivo_excel)
-        return
-
-    chart = BarChart()
-    chart.title = "Totales por Emisor/Cliente (SRI Audit)"
-    chart.x_axis.title = "Entidad"
-    chart.y_axis.title = "Total ($)"
-    chart.height = 10
-    chart.width = 20
-
-    data = Reference(ws, min_col=4, min_row=1, max_row=num_filas)
-    cats = Reference(ws, min_col=2, min_row=2, max_row=num_filas)
-    chart.add_data(data, titles_from_data=True)
-    chart.set_categories(cats)
-
-    # --- Estilo corporativo SRI ---
-    azul_sri = "1E4AA8"
-    gris_suave = "A0A0A0"
-    chart.graphicalProperties = GraphicalProperties(ln=ColorChoice(prstClr=gris_suave))
-    chart.graphicalProperties.solidFill = azul_sri
-    chart.dataLabels = DataLabelList()
-    chart.dataLabels.showVal = True
-
-    ws.add_chart(chart, "H2")
-    wb.save(archivo_excel)
@@ -0,0 +1,150 @@
+# =====================================================
+# 📗 MÓDULO: ESCRITURA DE REPORTES EXCEL EN UNA SOLA PASADA
+# =====================================================
+# Escribe todas las hojas, anchos de columna y el gráfico
+# corporativo con openpyxl en modo write_only (memoria constante),
+# sin volver a abrir el archivo para post-procesarlo.
+# =====================================================
+
+from pathlib import Path
+
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.chart import BarChart, Reference
+from openpyxl.chart.label import DataLabelList
+from openpyxl.chart.shapes import GraphicalProperties
+from openpyxl.drawing.line import LineProperties
+from openpyxl.styles import Alignment, Border, Font, Side
+from openpyxl.utils import get_column_letter
+
+# Límite de filas de Excel (incluye la fila de encabezado)
+MAX_FILAS_EXCEL = 1_048_576
+
+ANCHO_MIN = 10
+ANCHO_MAX = 50
+
+_LADO = Side(style="thin")
+_BORDE_ENCABEZADO = Border(left=_LADO, right=_LADO, top=_LADO, bottom=_LADO)
+_FUENTE_ENCABEZADO = Font(bold=True)
+_ALINEACION_ENCABEZADO = Alignment(horizontal="center", vertical="top")
+
+
+# =====================================================
+# 📏 ANCHO DE COLUMNAS (VECTORIZADO)
+# =====================================================
+def _anchos_columnas(df: pd.DataFrame) -> list:
+    """
+    Ancho de cada columna = largo del texto más largo (encabezado incluido) + 2,
+    acotado entre ANCHO_MIN y ANCHO_MAX. Se calcula sobre el DataFrame,
+    sin recorrer celdas de openpyxl.
+    """
+    anchos = []
+    for col in df.columns:
+        serie = df[col]
+        valores = serie[serie.notna()]
+        if valores.dtype == object:
+            valores = valores[valores.astype(bool)]
+        else:
+            valores = valores[valores != 0]
+        largo = int(valores.astype(str).str.len().max()) if not valores.empty else 0
+        largo = max(largo, len(str(col)))
+        anchos.append(max(ANCHO_MIN, min(largo + 2, ANCHO_MAX)))
+    return anchos
+
+
+# =====================================================
+# 📊 GRÁFICO CORPORATIVO SRI
+# =====================================================
+def _grafico_corporativo(ws, num_filas: int, col_categoria: int, col_valor: int):
+    chart = BarChart()
+    chart.title = "Totales por Emisor/Cliente (SRI Audit)"
+    chart.x_axis.title = "Entidad"
+    chart.y_axis.title = "Total ($)"
+    chart.height = 10
+    chart.width = 20
+
+    data = Reference(ws, min_col=col_valor, min_row=1, max_row=num_filas)
+    cats = Reference(ws, min_col=col_categoria, min_row=2, max_row=num_filas)
+    chart.add_data(data, titles_from_data=True)
+    chart.set_categories(cats)
+
+    # --- Estilo corporativo SRI ---
+    azul_sri = "1E4AA8"
+    gris_suave = "A0A0A0"
+    # (prstClr solo acepta colores con nombre: el hex va como solidFill de las barras)
+    for serie in chart.series:
+        serie.graphicalProperties = GraphicalProperties(solidFill=azul_sri, ln=LineProperties(solidFill=gris_suave))
+    chart.dataLabels = DataLabelList()
+    chart.dataLabels.showVal = True
+
+    ws.add_chart(chart, "H2")
+
+
+# =====================================================
+# 🧾 ESCRITURA DE HOJAS
+# =====================================================
+def _nombre_parte(nombre: str, parte: int) -> str:
+    if parte == 1:
+        return nombre
+    sufijo = f" ({parte})"
+    return nombre[:31 - len(sufijo)] + sufijo
+
+
+def _escribir_hoja(wb, nombre: str, df: pd.DataFrame, anchos: list, grafico: tuple = None):
+    ws = wb.create_sheet(title=nombre[:31])
+    for i, ancho in enumerate(anchos, start=1):
+        ws.column_dimensions[get_column_letter(i)].width = ancho
+
+    encabezado = []
+    for col in df.columns:
+        celda = WriteOnlyCell(ws, value=str(col))
+        celda.font = _FUENTE_ENCABEZADO
+        celda.border = _BORDE_ENCABEZADO
+        celda.alignment = _ALINEACION_ENCABEZADO
+        encabezado.append(celda)
+    ws.append(encabezado)
+
+    # NaN → celda vacía, igual que DataFrame.to_excel
+    valores = df.astype(object).where(df.notna(), None)
+    for fila in valores.itertuples(index=False, name=None):
+        ws.append(fila)
+
+    if grafico and len(df) >= 1:
+        col_categoria, col_valor = grafico
+        _grafico_corporativo(ws, len(df) + 1, col_categoria, col_valor)
+
+
+def escribir_reporte(excel_salida: Path, hojas: list, hoja_grafico: str = None,
+                     columnas_grafico: tuple = None):
+    """
+    Escribe un libro Excel en una sola pasada.
+
+    hojas: lista de (nombre_hoja, DataFrame). Las hojas vacías se omiten.
+           Si una hoja supera el límite de filas de Excel se reparte en
+           "Nombre", "Nombre (2)", ...
+    hoja_grafico / columnas_grafico: hoja y (columna categoría, columna valor)
+           donde se inserta el gráfico corporativo.
+    """
+    wb = Workbook(write_only=True)
+    max_datos = MAX_FILAS_EXCEL - 1
+
+    for nombre, df in hojas:
+        if df is None or (df.empty and len(df.columns) == 0):
+            continue
+        anchos = _anchos_columnas(df)
+
+        grafico = None
+        if nombre == hoja_grafico and columnas_grafico:
+            cols = list(df.columns)
+            cat, val = columnas_grafico
+            if cat in cols and val in cols:
+                grafico = (cols.index(cat) + 1, cols.index(val) + 1)
+
+        partes = max(1, -(-len(df) // max_datos))
+        for parte in range(partes):
+            trozo = df.iloc[parte * max_datos:(parte + 1) * max_datos]
+            _escribir_hoja(wb, _nombre_parte(nombre, parte + 1), trozo, anchos,
+                           grafico if parte == 0 else None)
+
+    wb.save(excel_salida)
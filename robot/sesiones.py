@@ -0,0 +1,71 @@
+# =====================================================
+# 🔐 MÓDULO: CACHÉ DE SESIONES SRI POR RUC
+# =====================================================
+# Guarda el storage_state completo de Playwright (cookies +
+# localStorage) de cada RUC con una fecha de expiración, para
+# que ejecuciones seguidas del mismo contribuyente no repitan
+# el login ni la espera del captcha. La sesión solo se reutiliza
+# si la clave ingresada coincide con la del login que la creó
+# (se guarda su hash scrypt con sal propia, nunca la clave).
+# Estructura: <SRI_SESIONES_DIR>/<ruc>.json
+# =====================================================
+
+import hashlib
+import hmac
+import json
+import os
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+SESIONES_DIR = Path(os.environ.get("SRI_SESIONES_DIR", BASE_DIR / ".sesiones"))
+
+# Vida útil de una sesión guardada (minutos)
+SESION_TTL_MIN = int(os.environ.get("SRI_SESION_TTL_MIN", "30") or 30)
+
+
+def _ruta(ruc: str) -> Path:
+    return SESIONES_DIR / f"{''.join(c for c in str(ruc) if c.isalnum())}.json"
+
+
+def _hash_clave(clave: str, sal: bytes) -> bytes:
+    return hashlib.scrypt(str(clave or "").encode("utf-8"), salt=sal, n=2 ** 14, r=8, p=1, dklen=32)
+
+
+def cargar_sesion(ruc: str, clave: str):
+    """
+    Devuelve el storage_state guardado del RUC, o None si no existe, expiró
+    o `clave` no es la del login que la guardó (en ese caso se ingresa de nuevo).
+    """
+    ruta = _ruta(ruc)
+    try:
+        data = json.loads(ruta.read_text(encoding="utf-8"))
+        sal, esperado = bytes.fromhex(data["sal"]), bytes.fromhex(data["hash"])
+    except Exception:
+        return None
+    if data.get("expira", 0) <= time.time():
+        invalidar_sesion(ruc)
+        return None
+    if not hmac.compare_digest(_hash_clave(clave, sal), esperado):
+        return None
+    return data.get("storage_state")
+
+
+def guardar_sesion(ruc: str, clave: str, storage_state: dict, ttl_min: int = SESION_TTL_MIN):
+    """Guarda (de forma atómica y solo legible por el usuario) la sesión del RUC."""
+    SESIONES_DIR.mkdir(parents=True, exist_ok=True)
+    ruta = _ruta(ruc)
+    tmp = ruta.with_suffix(".tmp")
+    sal = os.urandom(16)
+    try:
+        tmp.write_text(json.dumps({"expira": time.time() + ttl_min * 60, "sal": sal.hex(),
+                                   "hash": _hash_clave(clave, sal).hex(), "storage_state": storage_state}),
+                       encoding="utf-8")
+        os.chmod(tmp, 0o600)
+        os.replace(tmp, ruta)
+    except Exception as e:
+        print(f"[WARN] No se pudo guardar la sesión de {ruc}: {e}")
+
+
+def invalidar_sesion(ruc: str):
+    _ruta(ruc).unlink(missing_ok=True)
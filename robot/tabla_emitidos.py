@@ -0,0 +1,126 @@
+# =====================================================
+# 📋 MÓDULO: EXTRACCIÓN DE LA TABLA DE COMPROBANTES EMITIDOS
+# =====================================================
+# Lee las filas de la tabla de resultados (PrimeFaces/JSF) con
+# lxml y recorre todas las páginas del paginador.
+# =====================================================
+
+from lxml import html as lxml_html
+
+from robot.esperas import esperar_ajax, esperar_resultados
+
+COLUMNAS_EMITIDOS = ["Fecha Emisión", "Tipo", "Número", "RUC Receptor", "Razón Social", "Total", "Estado"]
+
+# Selectores del datatable PrimeFaces usado por el portal
+SEL_CUERPO_TABLA = "tbody[id$='_data']"
+SEL_SIGUIENTE = ".ui-paginator-next:not(.ui-state-disabled)"
+SEL_FILAS_POR_PAGINA = "select.ui-paginator-rpp-options"
+
+MAX_PAGINAS = 1000          # Corte de seguridad ante un paginador que no termina
+
+
+# =====================================================
+# 🔎 PARSEO DE FILAS (HTML → REGISTROS)
+# =====================================================
+def _texto(td) -> str:
+    return " ".join(td.text_content().split())
+
+
+def extraer_filas(html: str) -> list:
+    """
+    Devuelve una lista de registros (dict) con las filas de datos de la tabla.
+    Solo considera <tr> del cuerpo del datatable; si no lo encuentra, usa filas
+    con al menos 6 celdas propias y sin tablas anidadas (descarta las de maquetación).
+    """
+    if not html or not html.strip():
+        return []
+    doc = lxml_html.fromstring(html)
+
+    filas = doc.xpath("//tbody[contains(@id,'_data')]/tr")
+    if not filas:
+        filas = [tr for tr in doc.xpath("//tr") if not tr.xpath(".//table")]
+
+    registros = []
+    for tr in filas:
+        cols = [_texto(td) for td in tr.xpath("./td")]
+        # Fila "Sin registros" del datatable vacío: una sola celda con colspan
+        if len(cols) < 6:
+            continue
+        registros.append({
+            "Fecha Emisión": cols[0],
+            "Tipo": cols[1],
+            "Número": cols[2],
+            "RUC Receptor": cols[3],
+            "Razón Social": cols[4],
+            "Total": cols[5],
+            "Estado": cols[6] if len(cols) > 6 else "",
+        })
+    return registros
+
+
+# =====================================================
+# 📄 RECORRIDO DEL PAGINADOR
+# =====================================================
+def _html_tabla(page) -> str:
+    """HTML solo del cuerpo de la tabla (evita transferir la página completa)."""
+    cuerpo = page.locator(SEL_CUERPO_TABLA)
+    if cuerpo.count():
+        return f"<table>{cuerpo.first.evaluate('e => e.outerHTML')}</table>"
+    return page.content()
+
+
+def _maximizar_filas_por_pagina(page) -> bool:
+    """Elige la opción más alta del selector de filas por página, si existe."""
+    try:
+        sel = page.locator(SEL_FILAS_POR_PAGINA).first
+        if not sel.count():
+            return False
+        opciones = sel.locator("option").evaluate_all("os => os.map(o => o.value)")
+        numericas = [o for o in opciones if str(o).isdigit()]
+        if not numericas:
+            return False
+        _esperar_reemplazo(page, lambda: sel.select_option(value=max(numericas, key=int)))
+        return True
+    except Exception:
+        return False
+
+
+def _esperar_reemplazo(page, accion):
+    """
+    Ejecuta `accion` y espera a que PrimeFaces reemplace las filas actuales
+    (la primera fila vieja se desprende del DOM) antes de leer la nueva página.
+    """
+    primera = page.locator(f"{SEL_CUERPO_TABLA} > tr").first
+    vieja = primera.element_handle(timeout=1000) if primera.count() else None
+    esperar_ajax(page, accion)
+    if vieja is not None:
+        try:
+            vieja.wait_for_element_state("hidden", timeout=10000)
+        except Exception:
+            pass
+    esperar_resultados(page)
+
+
+def _ir_a_siguiente(page) -> bool:
+    boton = page.locator(SEL_SIGUIENTE)
+    if not boton.count():
+        return False
+    _esperar_reemplazo(page, lambda: boton.first.click())
+    return True
+
+
+def iterar_paginas(page):
+    """
+    Genera los registros de cada página de resultados, de la primera a la última.
+    Se detiene si el paginador repite la misma página (portal que ignora el clic).
+    """
+    _maximizar_filas_por_pagina(page)
+    anterior = None
+    for _ in range(MAX_PAGINAS):
+        registros = extraer_filas(_html_tabla(page))
+        if registros and registros == anterior:
+            break
+        yield from registros
+        anterior = registros
+        if not _ir_a_siguiente(page):
+            break
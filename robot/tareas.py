@@ -0,0 +1,446 @@
+# =====================================================
+# ⏱️ MÓDULO: TAREAS EN SEGUNDO PLANO
+# =====================================================
+# Ejecuta el robot (descarga + reporte + ZIP) fuera de la sesión
+# de Streamlit: cola con límite de tareas simultáneas por RUC,
+# pool acotado de trabajadores y estado persistido en SQLite.
+# La clave del SRI solo vive en memoria; nunca se persiste.
+# =====================================================
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from robot.downloader import ARCHIVO_DUPLICADAS, descargar_sri, descargar_sri_lote, leer_duplicadas
+from robot.empaquetador import Empaquetadores
+from robot.historial import registrar_descarga
+from robot.metricas import Metricas
+from robot.parser import ReporteIncremental, construir_reporte, ruta_reporte_parcial
+from robot.reporte_excel import escribir_reporte
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+TAREAS_DB = BASE_DIR / "tareas.sqlite3"
+
+MAX_TAREAS = max(1, int(os.environ.get("SRI_MAX_TAREAS", "2") or 2))
+MAX_TAREAS_POR_RUC = max(1, int(os.environ.get("SRI_TAREAS_POR_RUC", "1") or 1))
+
+# Intervalo mínimo entre escrituras de avance en la base (segundos)
+_INTERVALO_PERSISTENCIA = 1.0
+
+EN_COLA, EJECUTANDO, FINALIZADA, ERROR, INTERRUMPIDA = (
+    "en_cola", "ejecutando", "finalizada", "error", "interrumpida"
+)
+
+_CAMPOS = ["id", "ruc", "origen", "anio", "mes", "tipo", "formatos", "estado",
+           "creada", "iniciada", "terminada", "hechas", "total", "bytes", "eta_seg",
+           "resultado", "error", "lote"]
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS tareas (
+    id TEXT PRIMARY KEY,
+    ruc TEXT, origen TEXT, anio INTEGER, mes INTEGER, tipo TEXT, formatos TEXT,
+    estado TEXT, creada TEXT, iniciada TEXT, terminada TEXT,
+    hechas INTEGER DEFAULT 0, total INTEGER DEFAULT 0, bytes INTEGER DEFAULT 0,
+    eta_seg REAL, resultado TEXT, error TEXT, lote TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_tareas_creada ON tareas (creada);
+"""
+
+
+def _ahora() -> str:
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+# =====================================================
+# 🔀 ARCHIVOS GUARDADOS → ZIP Y PARSEO EN CURSO
+# =====================================================
+class _AlGuardar:
+    """
+    Callback al_guardar(destino, ruta) del downloader: cada archivo va al ZIP
+    incremental de su carpeta y, si es XML, al parseo incremental de su mes.
+    """
+
+    def __init__(self):
+        self.zips = Empaquetadores()
+        self._reportes = {}
+        self._lock = threading.Lock()
+
+    def _reporte(self, destino: Path) -> ReporteIncremental:
+        with self._lock:
+            if destino not in self._reportes:
+                self._reportes[destino] = ReporteIncremental(destino / "XML", ruta_reporte_parcial(destino))
+            return self._reportes[destino]
+
+    def __call__(self, destino: Path, ruta: Path):
+        self.zips(destino, ruta)
+        if Path(ruta).suffix.lower() == ".xml":
+            self._reporte(Path(destino)).agregar(ruta)
+
+    def cerrar_parseo(self, destino: Path = None):
+        """Espera el parseo en curso de `destino` (o de todos) y vuelca su caché."""
+        with self._lock:
+            destinos = [Path(destino)] if destino else list(self._reportes)
+            reportes = [self._reportes.pop(d) for d in destinos if d in self._reportes]
+        for r in reportes:
+            r.cerrar()
+
+
+# =====================================================
+# 🧩 PROCESO COMPLETO DE UNA EJECUCIÓN
+# =====================================================
+def semillas_del_mes(destino: Path) -> list:
+    """
+    TXT semilla de todos los tipos descargados en la carpeta del mes: la
+    carpeta XML junta los de corridas anteriores, y la conciliación debe
+    verlos todos para no marcarlos como sobrantes.
+    """
+    return sorted(p for p in Path(destino).glob("*.txt") if p.name not in ("claves_fallidas.txt", ARCHIVO_DUPLICADAS))
+
+
+def procesar_periodo(ruc, clave, anio, mes, tipo, formatos, destino: Path, origen="Recibidos",
+                     concurrencia=None, progreso=None) -> dict:
+    """
+    Descarga, registra en el historial y genera los artefactos (Excel y ZIP).
+    Devuelve el resultado de descargar_sri ampliado con las rutas generadas.
+    """
+    destino.mkdir(parents=True, exist_ok=True)
+    metricas = Metricas()
+    inicio = time.perf_counter()
+    # ZIP y parseo avanzan mientras llegan los archivos; al final solo falta el reporte
+    al_guardar = _AlGuardar()
+    resultado = None
+    try:
+        resultado = descargar_sri(ruc, clave, anio, mes, tipo, formatos, destino, origen=origen,
+                                  concurrencia=concurrencia, progreso=progreso, metricas=metricas,
+                                  al_guardar=al_guardar)
+    finally:
+        with metricas.fase("parseo_incremental"):
+            al_guardar.cerrar_parseo()
+        if resultado is None:
+            # La descarga falló: el ZIP queda legible con lo que alcanzó a llegar
+            al_guardar.zips.liberar()
+
+    if origen != "Emitidos" and resultado.get("estado") != "sin_descargas":
+        if resultado.get("n_xml", 0) > 0:
+            excel_path = destino / f"reporte_{anio}_{mes:02d}.xlsx"
+            construir_reporte(destino / "XML", excel_path, metricas, ruc=ruc, anio=anio, mes=mes,
+                              semillas=semillas_del_mes(destino), duplicadas=leer_duplicadas(destino))
+            if excel_path.exists():
+                resultado["reporte_excel"] = str(excel_path)
+
+        with metricas.fase("zip"):
+            zip_path = al_guardar.zips.cerrar(destino)
+        if zip_path.exists():
+            resultado["zip"] = str(zip_path)
+    else:
+        # Emitidos o sin descargas: sin reporte que esperar, el ZIP se cierra como está
+        al_guardar.zips.liberar()
+
+    metricas.registrar_fase("total", time.perf_counter() - inicio)
+    resultado["metricas"] = metricas.a_dict()
+    resultado["archivos_metricas"] = metricas.exportar(
+        destino, {"ruc": ruc, "anio": anio, "mes": f"{mes:02d}", "origen": origen, "tipo": tipo}
+    )
+    registrar_descarga(ruc, origen, anio, mes, tipo, resultado)
+    return resultado
+
+
+def procesar_lote(ruc, clave, periodos, tipos, origenes, formatos, desc_dir: Path,
+                  concurrencia=None, progreso=None) -> dict:
+    """
+    Ejecuta un lote (varios períodos/tipos/orígenes) con un solo login, registra
+    cada combinación en el historial, genera el reporte y ZIP de cada mes de
+    Recibidos y un Excel consolidado del lote.
+    """
+    if not periodos or not tipos or not origenes:
+        raise ValueError("El lote necesita al menos un período, un tipo y un origen")
+    metricas = Metricas()
+    inicio = time.perf_counter()
+    al_guardar = _AlGuardar()
+    lote = None
+    try:
+        lote = descargar_sri_lote(ruc, clave, periodos, tipos, origenes, formatos, desc_dir,
+                                  concurrencia=concurrencia, progreso=progreso, metricas=metricas,
+                                  al_guardar=al_guardar)
+    finally:
+        with metricas.fase("parseo_incremental"):
+            al_guardar.cerrar_parseo()
+        if lote is None:
+            al_guardar.zips.liberar()
+    for r in lote["resultados"]:
+        registrar_descarga(ruc, r["origen"], r["anio"], r["mes"], r["tipo"], r)
+
+    # Un reporte y un ZIP por mes de Recibidos (varios tipos comparten carpeta)
+    detalles = []
+    meses = {(r["anio"], r["mes"]): Path(r["destino"])
+             for r in lote["resultados"] if r["origen"] != "Emitidos" and r.get("estado") == "ok"}
+    for (anio, mes), destino in sorted(meses.items()):
+        artefactos = {}
+        if (destino / "XML").exists():
+            excel_path = destino / f"reporte_{anio}_{mes:02d}.xlsx"
+            df = construir_reporte(destino / "XML", excel_path, metricas,
+                                   ruc=ruc, anio=anio, mes=mes, semillas=semillas_del_mes(destino),
+                                   duplicadas=leer_duplicadas(destino))
+            if df is not None:
+                detalles.append(df.assign(anio=anio, mes=mes))
+            if excel_path.exists():
+                artefactos["reporte_excel"] = str(excel_path)
+        with metricas.fase("zip"):
+            zip_path = al_guardar.zips.cerrar(destino)
+        if zip_path.exists():
+            artefactos["zip"] = str(zip_path)
+        for r in lote["resultados"]:
+            if (r["anio"], r["mes"]) == (anio, mes) and r["origen"] != "Emitidos" and r.get("estado") == "ok":
+                r.update(artefactos)
+    # Meses sin reporte (solo Emitidos o con errores): sus ZIP se cierran como están
+    al_guardar.zips.liberar()
+
+    # --- Excel consolidado del lote ---
+    (a0, m0), (a1, m1) = min(periodos), max(periodos)
+    excel_lote = desc_dir / ruc / f"lote_{a0:04d}{m0:02d}_{a1:04d}{m1:02d}.xlsx"
+    resumen = pd.DataFrame(lote["resultados"]).drop(columns=["destino"], errors="ignore")
+    hojas = [("Resumen", resumen)]
+    if detalles:
+        detalle = pd.concat(detalles, ignore_index=True)
+        piv = (
+            detalle.groupby(["rucEmisor", "razonSocial"], dropna=False)[["subtotal", "iva", "total"]]
+            .sum()
+            .reset_index()
+        )
+        hojas += [("Detalle", detalle), ("Totales por Emisor", piv)]
+    with metricas.fase("excel"):
+        escribir_reporte(excel_lote, hojas, "Totales por Emisor", ("razonSocial", "total"))
+    lote["reporte_lote"] = str(excel_lote)
+
+    # Las métricas corresponden al lote completo, no a cada combinación del historial
+    metricas.registrar_fase("total", time.perf_counter() - inicio)
+    lote["metricas"] = metricas.a_dict()
+    lote["archivos_metricas"] = metricas.exportar(excel_lote.parent, {"ruc": ruc, "lote": excel_lote.stem})
+    return lote
+
+
+# =====================================================
+# 🗃️ GESTOR DE TAREAS
+# =====================================================
+class GestorTareas:
+    """
+    Cola de tareas con `max_trabajadores` hilos y como máximo `max_por_ruc`
+    tareas del mismo RUC ejecutándose a la vez. Una instancia por proceso.
+    """
+
+    def __init__(self, max_trabajadores: int = MAX_TAREAS, max_por_ruc: int = MAX_TAREAS_POR_RUC,
+                 db_path: Path = TAREAS_DB, ejecutor=procesar_periodo, ejecutor_lote=procesar_lote):
+        self.max_por_ruc = max_por_ruc
+        self.db_path = Path(db_path)
+        self._ejecutor = ejecutor
+        self._ejecutor_lote = ejecutor_lote
+        self._cond = threading.Condition()
+        self._cola = deque()
+        self._en_curso = {}           # ruc → tareas ejecutándose
+        self._tareas = {}             # id → dict de estado (vista en memoria)
+        self._claves = {}             # id → clave SRI (solo en memoria)
+        self._ultima_escritura = {}
+
+        self._iniciar_db()
+        self._hilos = [
+            threading.Thread(target=self._trabajar, name=f"tarea-{i}", daemon=True)
+            for i in range(max(1, max_trabajadores))
+        ]
+        for h in self._hilos:
+            h.start()
+
+    # ---------- Persistencia ----------
+    def _conectar(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _iniciar_db(self):
+        conn = self._conectar()
+        try:
+            conn.executescript(_ESQUEMA)
+            # Bases creadas antes de existir los lotes
+            if "lote" not in {c[1] for c in conn.execute("PRAGMA table_info(tareas)")}:
+                conn.execute("ALTER TABLE tareas ADD COLUMN lote TEXT")
+            # Lo que estaba en cola o en curso cuando se reinició el proceso
+            # no puede continuar: la clave del SRI no se guardó.
+            with conn:
+                conn.execute(
+                    "UPDATE tareas SET estado = ?, terminada = ?, error = ? WHERE estado IN (?, ?)",
+                    (INTERRUMPIDA, _ahora(), "Proceso reiniciado antes de terminar", EN_COLA, EJECUTANDO),
+                )
+        finally:
+            conn.close()
+
+    def _persistir(self, tarea: dict, forzar: bool = True):
+        ahora = time.monotonic()
+        if not forzar and ahora - self._ultima_escritura.get(tarea["id"], 0) < _INTERVALO_PERSISTENCIA:
+            return
+        self._ultima_escritura[tarea["id"]] = ahora
+        fila = {c: tarea[c] for c in _CAMPOS}
+        fila["formatos"] = json.dumps(fila["formatos"])
+        fila["resultado"] = json.dumps(fila["resultado"], ensure_ascii=False) if fila["resultado"] else None
+        fila["lote"] = json.dumps(fila["lote"], ensure_ascii=False) if fila["lote"] else None
+        conn = self._conectar()
+        try:
+            with conn:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO tareas ({', '.join(_CAMPOS)}) "
+                    f"VALUES ({', '.join('?' * len(_CAMPOS))})",
+                    tuple(fila[c] for c in _CAMPOS),
+                )
+        finally:
+            conn.close()
+
+    # ---------- API pública ----------
+    def enviar(self, ruc, clave, anio, mes, tipo, formatos, destino: Path, origen="Recibidos",
+               concurrencia=None, lote: dict = None) -> str:
+        """
+        Encola una ejecución y devuelve su id de tarea. Si se pasa `lote`
+        ({"periodos", "tipos", "origenes"}), `destino` es la carpeta base de
+        descargas y anio/mes/tipo/origen solo describen la tarea.
+        """
+        if lote is not None and not (lote.get("periodos") and lote.get("tipos") and lote.get("origenes")):
+            raise ValueError("El lote necesita al menos un período, un tipo y un origen")
+        tarea = {
+            "id": uuid.uuid4().hex[:12],
+            "ruc": ruc, "origen": origen, "anio": int(anio), "mes": int(mes), "tipo": tipo,
+            "formatos": list(formatos), "estado": EN_COLA,
+            "creada": _ahora(), "iniciada": None, "terminada": None,
+            "hechas": 0, "total": 0, "bytes": 0, "eta_seg": None,
+            "resultado": None, "error": None, "lote": lote,
+            "destino": str(destino), "concurrencia": concurrencia,
+        }
+        self._persistir(tarea)
+        with self._cond:
+            self._tareas[tarea["id"]] = tarea
+            self._claves[tarea["id"]] = clave
+            self._cola.append(tarea["id"])
+            self._cond.notify_all()
+        return tarea["id"]
+
+    def obtener(self, id_tarea: str) -> dict:
+        with self._cond:
+            tarea = self._tareas.get(id_tarea)
+            if tarea:
+                return {c: tarea[c] for c in _CAMPOS}
+        return next(iter(self.listar(id_tarea=id_tarea)), None)
+
+    def listar(self, limite: int = 50, id_tarea: str = None) -> list:
+        """
+        Tareas más recientes primero. Las de este proceso se leen de memoria
+        (avance en vivo); el resto, de la base.
+        """
+        conn = self._conectar()
+        conn.row_factory = sqlite3.Row
+        try:
+            if id_tarea:
+                filas = conn.execute("SELECT * FROM tareas WHERE id = ?", (id_tarea,)).fetchall()
+            else:
+                filas = conn.execute("SELECT * FROM tareas ORDER BY creada DESC LIMIT ?", (limite,)).fetchall()
+        finally:
+            conn.close()
+
+        resultado = []
+        with self._cond:
+            for f in filas:
+                viva = self._tareas.get(f["id"])
+                if viva:
+                    resultado.append({c: viva[c] for c in _CAMPOS})
+                    continue
+                d = dict(f)
+                d["formatos"] = json.loads(d["formatos"] or "[]")
+                d["resultado"] = json.loads(d["resultado"]) if d["resultado"] else None
+                d["lote"] = json.loads(d["lote"]) if d.get("lote") else None
+                resultado.append(d)
+        return resultado
+
+    # ---------- Planificación ----------
+    def _siguiente(self):
+        """Primera tarea en cola cuyo RUC no haya alcanzado su límite (con _cond tomado)."""
+        for id_tarea in self._cola:
+            ruc = self._tareas[id_tarea]["ruc"]
+            if self._en_curso.get(ruc, 0) < self.max_por_ruc:
+                self._cola.remove(id_tarea)
+                self._en_curso[ruc] = self._en_curso.get(ruc, 0) + 1
+                return id_tarea
+        return None
+
+    def _trabajar(self):
+        while True:
+            with self._cond:
+                id_tarea = self._siguiente()
+                while id_tarea is None:
+                    self._cond.wait()
+                    id_tarea = self._siguiente()
+                tarea = self._tareas[id_tarea]
+                clave = self._claves.pop(id_tarea, "")
+            try:
+                self._ejecutar(tarea, clave)
+            except Exception as e:
+                # Un fallo fuera de la ejecución no debe matar al trabajador
+                print(f"[WARN] Trabajador de tareas: error con {id_tarea}: {e}")
+            finally:
+                with self._cond:
+                    self._en_curso[tarea["ruc"]] -= 1
+                    self._tareas.pop(id_tarea, None)
+                    self._ultima_escritura.pop(id_tarea, None)
+                    self._cond.notify_all()
+
+    def _persistir_seguro(self, tarea: dict, forzar: bool = True) -> bool:
+        """_persistir sin propagar errores de SQLite (base bloqueada, disco lleno...)."""
+        try:
+            self._persistir(tarea, forzar)
+            return True
+        except Exception as e:
+            print(f"[WARN] No se pudo guardar el estado de la tarea {tarea['id']}: {e}")
+            return False
+
+    def _ejecutar(self, tarea: dict, clave: str):
+        tarea["estado"] = EJECUTANDO
+        tarea["iniciada"] = _ahora()
+        inicio = time.monotonic()
+
+        def _progreso(hechas, total, n_bytes):
+            tarea["hechas"], tarea["total"], tarea["bytes"] = hechas, total, n_bytes
+            transcurrido = time.monotonic() - inicio
+            if 0 < hechas < total:
+                tarea["eta_seg"] = round(transcurrido / hechas * (total - hechas), 1)
+            elif hechas >= total:
+                tarea["eta_seg"] = 0.0
+            self._persistir_seguro(tarea, forzar=False)
+
+        try:
+            self._persistir(tarea)
+            if tarea["lote"]:
+                lote = tarea["lote"]
+                tarea["resultado"] = self._ejecutor_lote(
+                    tarea["ruc"], clave, [tuple(p) for p in lote["periodos"]], lote["tipos"], lote["origenes"],
+                    tarea["formatos"], Path(tarea["destino"]), concurrencia=tarea["concurrencia"],
+                    progreso=_progreso,
+                )
+            else:
+                tarea["resultado"] = self._ejecutor(
+                    tarea["ruc"], clave, tarea["anio"], tarea["mes"], tarea["tipo"], tarea["formatos"],
+                    Path(tarea["destino"]), origen=tarea["origen"], concurrencia=tarea["concurrencia"],
+                    progreso=_progreso,
+                )
+            tarea["estado"] = FINALIZADA
+        except Exception as e:
+            tarea["estado"] = ERROR
+            tarea["error"] = str(e)
+            print(f"[WARN] Tarea {tarea['id']} ({tarea['ruc']}) falló: {e}")
+        tarea["terminada"] = _ahora()
+        if not self._persistir_seguro(tarea) and tarea["estado"] != ERROR:
+            # Sin el estado final guardado la tarea quedaría "ejecutando" para siempre
+            tarea["estado"] = ERROR
+            tarea["error"] = "no se pudo guardar el resultado de la tarea"
+            self._persistir_seguro(tarea)
@@ -0,0 +1,246 @@
+# =====================================================
+# 📑 MÓDULO: LECTURA DEL TXT SEMILLA DE RECIBIDOS
+# =====================================================
+# El TXT de "Descargar reporte" trae una fila por comprobante
+# (clave de acceso, tipo, emisor, fechas, total). Se lee en
+# bloques de bytes cortados en fin de línea; cada bloque pasa
+# por el lector CSV de Arrow y se filtra/limpia con funciones
+# vectorizadas sobre columnas enteras. Encabezado, delimitador,
+# posición de las columnas y codificación se detectan una sola
+# vez. Memoria acotada aunque el reporte tenga 500k filas.
+# =====================================================
+
+import csv
+import io
+import re
+import unicodedata
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+
+BLOQUE_BYTES = 4 << 20      # ~4 MB por bloque (≈ 15k filas del reporte del SRI)
+
+# Columnas que se devuelven → nombres con que aparecen en el encabezado del SRI
+COLUMNAS = {
+    "clave": ("CLAVE_ACCESO", "CLAVE_DE_ACCESO"),
+    "tipo": ("COMPROBANTE", "TIPO_COMPROBANTE", "TIPO"),
+    "serie": ("SERIE_COMPROBANTE", "SERIE", "NUMERO_COMPROBANTE"),
+    "fecha": ("FECHA_EMISION",),
+    "rucEmisor": ("RUC_EMISOR",),
+    "razonSocialEmisor": ("RAZON_SOCIAL_EMISOR",),
+    "total": ("IMPORTE_TOTAL", "VALOR_TOTAL", "TOTAL"),
+}
+# Si CLAVE_ACCESO viene vacía, el número de autorización (49 dígitos) es la misma clave
+_RESPALDO_CLAVE = ("NUMERO_AUTORIZACION",)
+
+_PATRON_CLAVE = r"\d{49}"
+_PATRON_FECHA = r"\d{2}/\d{2}/\d{4}"
+_PREFIJOS_TIPO = ("factura", "comprobante", "nota", "liquidaci")
+_MUESTRA = 50               # Líneas usadas para detectar el formato
+
+
+def _normalizar(nombre: str) -> str:
+    nombre = unicodedata.normalize("NFKD", nombre).encode("ascii", "ignore").decode()
+    return re.sub(r"[^A-Z0-9]+", "_", nombre.strip().upper()).strip("_")
+
+
+def _bloques(txt_path: Path, tamano: int):
+    """
+    (bytes, codificación) del archivo en bloques que terminan en fin de línea.
+    El portal entrega UTF-8 o Latin-1 según el reporte: se valida cada bloque
+    como UTF-8 y, desde el primero que no lo es, el resto se toma como Latin-1.
+    """
+    codificacion = "utf8"
+
+    def _detectar(bloque: bytes) -> str:
+        nonlocal codificacion
+        if codificacion == "utf8":
+            try:
+                bloque.decode("utf-8")
+            except UnicodeDecodeError:
+                codificacion = "latin-1"
+        return codificacion
+
+    resto = b""
+    with open(txt_path, "rb") as f:
+        while True:
+            datos = f.read(tamano)
+            if not datos:
+                break
+            datos = resto + datos
+            corte = datos.rfind(b"\n") + 1
+            bloque, resto = datos[:corte], datos[corte:]
+            if bloque.strip():
+                yield bloque, _detectar(bloque)
+    if resto.strip():
+        yield resto, _detectar(resto)
+
+
+# =====================================================
+# 🧭 FORMATO: DELIMITADOR, ENCABEZADO Y COLUMNAS
+# =====================================================
+class _Formato:
+    """Delimitador y posición de cada columna, detectados con las primeras líneas."""
+
+    def __init__(self, lineas: list):
+        muestra = "\n".join(lineas)
+        conteo = {sep: muestra.count(sep) for sep in ("\t", ";", ",", "|")}
+        self.sep = max(conteo, key=conteo.get) if any(conteo.values()) else ";"
+        filas = [next(csv.reader([l], delimiter=self.sep)) for l in lineas]
+        self.posiciones = {}
+        self.respaldo_clave = None
+        self.con_encabezado = False
+
+        encabezado = [_normalizar(c) for c in filas[0]]
+        for campo, nombres in COLUMNAS.items():
+            pos = next((encabezado.index(n) for n in nombres if n in encabezado), None)
+            if pos is not None:
+                self.posiciones[campo] = pos
+        if "clave" in self.posiciones:
+            self.con_encabezado = True
+            self.respaldo_clave = next((encabezado.index(n) for n in _RESPALDO_CLAVE if n in encabezado), None)
+            datos = filas[1:]
+        else:
+            # Sin encabezado reconocible: se deduce cada columna por su contenido
+            self.posiciones = self._por_contenido(filas)
+            datos = filas
+        # Ancho habitual de una fila; las que no lo tienen se leen aparte (_irregulares)
+        anchos = [len(f) for f in datos] or [len(filas[0])]
+        self.n_columnas = max(set(anchos), key=anchos.count)
+
+    @staticmethod
+    def _por_contenido(filas: list) -> dict:
+        ancho = max(len(f) for f in filas)
+        columnas = [[(f[i] if i < len(f) else "").strip() for f in filas] for i in range(ancho)]
+
+        def _mejor(prueba):
+            puntajes = [sum(map(prueba, col)) for col in columnas]
+            return puntajes.index(max(puntajes)) if max(puntajes) else None
+
+        posiciones = {
+            "clave": _mejor(lambda v: bool(re.fullmatch(_PATRON_CLAVE, v))),
+            "tipo": _mejor(lambda v: v.lower().startswith(_PREFIJOS_TIPO)),
+            "fecha": _mejor(lambda v: bool(re.fullmatch(_PATRON_FECHA, v))),
+        }
+        return {k: v for k, v in posiciones.items() if v is not None}
+
+    def posicion(self, campo: str):
+        """Posición de `campo` dentro del ancho habitual, o None."""
+        pos = self.respaldo_clave if campo == "respaldo" else self.posiciones.get(campo)
+        return pos if pos is not None and pos < self.n_columnas else None
+
+    def leer(self, bloque: bytes, codificacion: str, saltar: int):
+        """(tabla Arrow con las columnas usadas, líneas con otro número de columnas)."""
+        irregulares = []
+
+        def _irregular(fila):
+            irregulares.append(fila.text)
+            return "skip"
+
+        nombres = [f"c{i}" for i in range(self.n_columnas)]
+        usadas = sorted({self.posicion(c) for c in [*COLUMNAS, "respaldo"]} - {None})
+        tabla = pacsv.read_csv(
+            io.BytesIO(bloque),
+            read_options=pacsv.ReadOptions(column_names=nombres, skip_rows=saltar, encoding=codificacion),
+            parse_options=pacsv.ParseOptions(delimiter=self.sep, quote_char=False,
+                                             invalid_row_handler=_irregular),
+            convert_options=pacsv.ConvertOptions(
+                include_columns=[nombres[i] for i in usadas],
+                column_types={nombres[i]: pa.string() for i in usadas},
+                strings_can_be_null=False,
+            ),
+        )
+        return tabla, irregulares
+
+
+# =====================================================
+# ⚙️ BLOQUE → DATAFRAME (VECTORIZADO)
+# =====================================================
+def _columnas(tabla: pa.Table, formato: _Formato) -> dict:
+    vacia = pa.array([""] * tabla.num_rows, pa.string())
+    cols = {}
+    for campo in COLUMNAS:
+        pos = formato.posicion(campo)
+        cols[campo] = vacia if pos is None else pc.utf8_trim_whitespace(tabla[f"c{pos}"])
+    pos = formato.posicion("respaldo")
+    if pos is not None:
+        respaldo = pc.utf8_trim_whitespace(tabla[f"c{pos}"])
+        cols["clave"] = pc.if_else(pc.equal(cols["clave"], ""), respaldo, cols["clave"])
+    return cols
+
+
+def _irregulares(lineas: list, formato: _Formato) -> dict:
+    """Filas con otro número de columnas (pocas): se reparten a mano."""
+    cols = {campo: [] for campo in COLUMNAS}
+    for fila in csv.reader(lineas, delimiter=formato.sep):
+        for campo in COLUMNAS:
+            pos = formato.posiciones.get(campo)
+            cols[campo].append(fila[pos].strip() if pos is not None and pos < len(fila) else "")
+        pos = formato.respaldo_clave
+        if not cols["clave"][-1] and pos is not None and pos < len(fila):
+            cols["clave"][-1] = fila[pos].strip()
+    return {campo: pa.array(valores, pa.string()) for campo, valores in cols.items()}
+
+
+def _limpiar(cols: dict) -> pd.DataFrame:
+    """Solo filas con clave de 49 dígitos; fecha dd/mm/aaaa o vacía; total numérico."""
+    tabla = pa.table(cols)
+    tabla = tabla.filter(pc.match_substring_regex(tabla["clave"], f"^{_PATRON_CLAVE}$"))
+    fecha = tabla["fecha"]
+    fecha = pc.if_else(pc.match_substring_regex(fecha, f"^{_PATRON_FECHA}$"), fecha, "")
+    # Separador de miles "," (1,234.56) o coma decimal (12,50)
+    total = tabla["total"]
+    total = pc.if_else(pc.match_substring(total, "."), pc.replace_substring(total, ",", ""),
+                       pc.replace_substring(total, ",", "."))
+    df = tabla.drop_columns(["fecha", "total"]).to_pandas()
+    df.insert(list(COLUMNAS).index("fecha"), "fecha", fecha.to_pandas())
+    df["total"] = pd.to_numeric(total.to_pandas(), errors="coerce").fillna(0.0)
+    return df
+
+
+def _tabla(bloque: bytes, codificacion: str, formato: _Formato, saltar: int = 0) -> pd.DataFrame:
+    tabla, irregulares = formato.leer(bloque, codificacion, saltar)
+    df = _limpiar(_columnas(tabla, formato))
+    if irregulares:
+        extra = _limpiar(_irregulares(irregulares, formato))
+        df = pd.concat([df, extra], ignore_index=True) if not df.empty else extra
+    return df
+
+
+# =====================================================
+# 📤 API
+# =====================================================
+def leer_bloques(txt_path: Path, tamano: int = BLOQUE_BYTES):
+    """
+    Genera DataFrames (uno por bloque) con columnas clave, tipo, serie, fecha,
+    rucEmisor, razonSocialEmisor y total, solo para filas con clave válida.
+    """
+    formato = None
+    for bloque, codificacion in _bloques(Path(txt_path), tamano):
+        saltar = 0
+        if formato is None:
+            bloque = bloque.removeprefix(b"\xef\xbb\xbf").lstrip(b"\r\n")
+            muestra = bloque[:1 << 16].decode("utf-8" if codificacion == "utf8" else codificacion, "replace")
+            formato = _Formato([l for l in muestra.splitlines()[:_MUESTRA] if l.strip()])
+            # El encabezado no es un comprobante
+            saltar = 1 if formato.con_encabezado else 0
+        df = _tabla(bloque, codificacion, formato, saltar)
+        if not df.empty:
+            yield df
+
+
+def iterar_claves(txt_path: Path, tamano: int = BLOQUE_BYTES):
+    """Genera un dict por comprobante del TXT, de a un bloque en memoria."""
+    campos = list(COLUMNAS)
+    for df in leer_bloques(txt_path, tamano):
+        for valores in zip(*(df[c].tolist() for c in campos)):
+            yield dict(zip(campos, valores))
+
+
+def leer_txt(txt_path: Path) -> pd.DataFrame:
+    """TXT completo en un DataFrame (para conciliaciones; la descarga usa iterar_claves)."""
+    bloques = list(leer_bloques(txt_path))
+    return pd.concat(bloques, ignore_index=True) if bloques else pd.DataFrame(columns=list(COLUMNAS))
@@ -0,0 +1,20 @@
+# =====================================================
+# 🧪 CONFIGURACIÓN COMÚN DE LAS PRUEBAS
+# =====================================================
+# Ninguna prueba toca las bases reales del repositorio: índice
+# de claves, historial, almacén y sesiones van a tmp_path.
+# =====================================================
+
+import pytest
+
+from robot import almacen, historial, indice, sesiones
+
+
+@pytest.fixture(autouse=True)
+def bases_temporales(tmp_path, monkeypatch):
+    monkeypatch.setattr(indice, "INDICE_DB", tmp_path / "indice_claves.sqlite3")
+    monkeypatch.setattr(historial, "HIST_PATH", tmp_path / "historial_descargas.json")
+    monkeypatch.setattr(historial, "HIST_DB", tmp_path / "historial_descargas.sqlite3")
+    monkeypatch.setattr(almacen, "ALMACEN_DIR", tmp_path / "almacen")
+    monkeypatch.setattr(sesiones, "SESIONES_DIR", tmp_path / ".sesiones")
+    return tmp_path
@@ -0,0 +1,48 @@
+# =====================================================
+# 🧪 WEB SERVICE DE AUTORIZACIÓN CONTRA EL PORTAL SIMULADO
+# =====================================================
+
+import pytest
+
+from benchmarks.portal_simulado import RUTA_WS, ConfigPortal, PortalSimulado
+from robot.autorizacion_ws import ClienteAutorizacion
+from robot.extractor_xml import extraer
+from robot.manifiesto import Manifiesto
+
+RUC = "1790012345001"
+
+
+@pytest.fixture
+def portal():
+    with PortalSimulado(ConfigPortal(n_comprobantes=20)) as p:
+        yield p
+
+
+def test_descarga_todas_las_claves_del_periodo(tmp_path, portal):
+    claves = [c["clave"] for c in portal.datos.periodo("Recibidos", RUC, 2024, 1)]
+    manifiesto = Manifiesto(tmp_path)
+    cliente = ClienteAutorizacion(portal.url + RUTA_WS, max_conexiones=4)
+    try:
+        obtenidos = cliente.descargar(claves, manifiesto)
+    finally:
+        cliente.cerrar()
+
+    assert set(obtenidos) == set(claves)
+    assert portal.estadisticas["ws"] == len(claves)
+    for clave in claves:
+        assert manifiesto.completo(clave, "XML")
+        fila = extraer(manifiesto.ruta_archivo(clave, "XML"))
+        assert "error" not in fila and fila["claveAcceso"] == clave
+
+
+def test_clave_desconocida_se_avisa_y_se_omite(tmp_path, portal, capsys):
+    conocida = portal.datos.periodo("Recibidos", RUC, 2024, 1)[0]["clave"]
+    desconocida = "9" * 49
+    cliente = ClienteAutorizacion(portal.url + RUTA_WS, max_conexiones=2)
+    try:
+        obtenidos = cliente.descargar([conocida, desconocida], Manifiesto(tmp_path))
+    finally:
+        cliente.cerrar()
+
+    assert set(obtenidos) == {conocida}
+    assert f"[WARN] Web service sin XML para {desconocida}" in capsys.readouterr().out
@@ -0,0 +1,83 @@
+# =====================================================
+# 🧪 CONCILIACIÓN TXT ↔ XML ↔ EMITIDOS
+# =====================================================
+
+import pandas as pd
+
+from robot import conciliacion as cc
+
+EMISOR = "0990000000001"
+
+
+def _clave(i: int) -> str:
+    return f"{i:049d}"
+
+
+def _semilla(filas: list) -> pd.DataFrame:
+    return pd.DataFrame([
+        {"clave": _clave(i), "tipo": "Factura", "serie": f"001-001-{i:09d}", "fecha": "05/01/2024",
+         "rucEmisor": EMISOR, "razonSocialEmisor": "Emisor S.A.", "total": total}
+        for i, total in filas
+    ])
+
+
+def _reporte(filas: list) -> pd.DataFrame:
+    return pd.DataFrame([
+        {"archivo": f"{_clave(i)}.xml", "claveAcceso": _clave(i), "numero": f"001-001-{i:09d}",
+         "tipoDocumento": "01", "rucEmisor": EMISOR, "razonSocial": "Emisor S.A.",
+         "fechaEmision": "05/01/2024", "total": total, "retenido": 0.0, "error": error}
+        for i, total, error in filas
+    ])
+
+
+def _por_clave(res: pd.DataFrame) -> dict:
+    return dict(zip(res["claveAcceso"], res["estado"]))
+
+
+def test_solo_lista_novedades():
+    semilla = _semilla([(1, 100.0), (2, 50.0), (3, 10.0), (4, 20.0)])
+    reporte = _reporte([(1, 100.0, ""), (2, 50.5, ""), (4, 0.0, "Error leyendo"), (5, 7.0, "")])
+
+    res = cc.conciliar(semilla, reporte)
+
+    assert list(res.columns) == cc.COLUMNAS
+    assert _por_clave(res) == {
+        _clave(2): cc.DIFERENCIA_TXT,
+        _clave(3): cc.FALTA_XML,
+        _clave(4): cc.XML_CON_ERROR,
+        _clave(5): cc.SIN_FILA_TXT,
+    }
+    assert res.set_index("claveAcceso").loc[_clave(2), "diferencia"] == -0.5
+    assert cc.resumen(res) == {cc.DIFERENCIA_TXT: 1, cc.FALTA_XML: 1, cc.XML_CON_ERROR: 1, cc.SIN_FILA_TXT: 1}
+
+
+def test_tolerancia():
+    semilla = _semilla([(1, 100.0)])
+    assert cc.conciliar(semilla, _reporte([(1, 100.01, "")])).empty
+    assert not cc.conciliar(semilla, _reporte([(1, 100.02, "")]), tolerancia=0.01).empty
+
+
+def test_sin_semilla_no_busca_faltantes():
+    assert cc.conciliar(None, _reporte([(1, 100.0, "")])).empty
+    assert cc.conciliar().empty
+
+
+def test_cruce_con_emitidos_de_ruc_propios():
+    semilla = _semilla([(1, 100.0), (2, 50.0), (3, 30.0)])
+    reporte = _reporte([(1, 100.0, ""), (2, 50.0, ""), (3, 30.0, "")])
+    emitidos = pd.DataFrame({
+        "ruc": [EMISOR, EMISOR, EMISOR],
+        "Número": ["001-001-000000001", "001001000000002", "001-001-000000009"],
+        "Total": ["100.00", "55.00", "1.00"],
+        "Estado": ["AUTORIZADO", "AUTORIZADO", "ANULADO"],
+    })
+
+    res = cc.conciliar(semilla, reporte, emitidos)
+
+    assert _por_clave(res) == {_clave(2): cc.DIFERENCIA_EMITIDOS, _clave(3): cc.FALTA_EMITIDOS}
+
+
+def test_emitidos_de_otros_emisores_no_se_cruzan():
+    semilla = _semilla([(1, 100.0)])
+    emitidos = pd.DataFrame({"ruc": ["1790000000001"], "Número": ["001-001-000000001"], "Total": [1.0]})
+    assert cc.conciliar(semilla, _reporte([(1, 100.0, "")]), emitidos).empty
@@ -0,0 +1,137 @@
+# =====================================================
+# 🧪 CONSOLA: VALIDACIÓN DEL LOTE Y CÓDIGOS DE SALIDA
+# =====================================================
+
+import json
+from datetime import date
+
+import pytest
+
+from robot import consola
+
+RUC = "1790012345001"
+OTRO_RUC = "0991234567001"
+
+
+def _config(tmp_path, config: dict):
+    ruta = tmp_path / "lote.json"
+    ruta.write_text(json.dumps(config), encoding="utf-8")
+    return str(ruta)
+
+
+# ---------- Configuración → trabajos ----------
+def test_un_trabajo_por_ruc_con_opciones_propias():
+    trabajos = consola.cargar_trabajos({
+        "periodos": "mes_anterior", "tipos": ["Facturas"],
+        "rucs": [RUC, {"ruc": OTRO_RUC, "periodos": {"desde": "2023-11", "hasta": "2024-02"},
+                       "clave_archivo": "/run/secrets/sri"}],
+    }, hoy=date(2024, 1, 15))
+
+    assert [t["ruc"] for t in trabajos] == [RUC, OTRO_RUC]
+    assert trabajos[0]["periodos"] == [(2023, 12)]
+    assert trabajos[0]["fuente_clave"] == {"tipo": "env", "nombre": f"SRI_CLAVE_{RUC}"}
+    assert trabajos[1]["periodos"] == [(2023, 11), (2023, 12), (2024, 1), (2024, 2)]
+    assert trabajos[1]["fuente_clave"] == {"tipo": "archivo", "nombre": "/run/secrets/sri"}
+
+
+def test_concurrencia_recortada_al_tope_de_navegadores():
+    trabajo, = consola.cargar_trabajos({"rucs": [RUC], "concurrencia": 8}, navegadores=4)
+    assert trabajo["concurrencia"] == 3
+    assert trabajo["navegadores"] == 4
+
+
+@pytest.mark.parametrize("config", [
+    [],
+    {"rucs": []},
+    {"rucs": "1790012345001"},
+    {"rucs": ["123"]},
+    {"rucs": [RUC, RUC]},
+    {"rucs": [RUC], "clave": "secreta"},
+    {"rucs": [{"ruc": RUC, "clave": "secreta"}]},
+    {"rucs": [RUC], "periodos": ["2024-13"]},
+    {"rucs": [RUC], "periodos": {"desde": "2024-05", "hasta": "2024-01"}},
+    {"rucs": [RUC], "tipos": ["Facturitas"]},
+    {"rucs": [RUC], "origenes": []},
+    {"rucs": [RUC], "formatos": ["DOCX"]},
+    {"rucs": [RUC], "concurrencia": "muchas"},
+])
+def test_configuracion_invalida(config):
+    with pytest.raises(consola.ConfiguracionInvalida):
+        consola.cargar_trabajos(config)
+
+
+# ---------- Códigos de salida ----------
+def test_validar_ok(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv(f"SRI_CLAVE_{RUC}", "s3cr3ta")
+    assert consola.main([_config(tmp_path, {"rucs": [RUC]}), "--validar"]) == consola.SALIDA_OK
+    texto = capsys.readouterr().out
+    assert json.loads(texto)["estado"] == "valido"
+    assert "s3cr3ta" not in texto                # la clave se valida pero no se muestra
+
+
+def test_validar_sin_clave(tmp_path, monkeypatch, capsys):
+    monkeypatch.delenv(f"SRI_CLAVE_{RUC}", raising=False)
+    assert consola.main([_config(tmp_path, {"rucs": [RUC]}), "--validar"]) == consola.SALIDA_CONFIG
+    assert json.loads(capsys.readouterr().out)["estado"] == "config_invalida"
+
+
+@pytest.mark.parametrize("contenido", ["{no es json", json.dumps({"rucs": ["123"]})])
+def test_archivo_invalido(tmp_path, contenido):
+    ruta = tmp_path / "lote.json"
+    ruta.write_text(contenido, encoding="utf-8")
+    assert consola.main([str(ruta), "--validar"]) == consola.SALIDA_CONFIG
+
+
+def test_archivo_inexistente(tmp_path):
+    assert consola.main([str(tmp_path / "no_existe.json")]) == consola.SALIDA_CONFIG
+
+
+@pytest.mark.parametrize("estados, codigo", [
+    (["ok", "ok"], consola.SALIDA_OK),
+    (["ok", "parcial"], consola.SALIDA_FALLOS),
+    (["error", "error"], consola.SALIDA_FALLOS),
+])
+def test_codigo_segun_el_resultado(tmp_path, monkeypatch, capsys, estados, codigo):
+    def _ejecutar(trabajos, procesos, navegadores):
+        return [{"ruc": t["ruc"], "estado": e, "corridas": []} for t, e in zip(trabajos, estados)]
+
+    monkeypatch.setattr(consola, "ejecutar_trabajos", _ejecutar)
+    salida = tmp_path / "resumen.json"
+    argv = [_config(tmp_path, {"rucs": [RUC, OTRO_RUC]}), "--salida", str(salida)]
+    assert consola.main(argv) == codigo
+    assert json.loads(salida.read_text(encoding="utf-8")) == json.loads(capsys.readouterr().out)
+
+
+# ---------- Un lote (un login) por RUC ----------
+def test_cada_ruc_es_un_solo_lote(monkeypatch):
+    monkeypatch.setenv(f"SRI_CLAVE_{RUC}", "clave")
+    trabajo, = consola.cargar_trabajos({"rucs": [RUC], "periodos": ["2024-01", "2024-02"],
+                                        "tipos": ["Facturas", "Retenciones"]})
+    llamadas = []
+
+    def _lote(ruc, clave, periodos, tipos, origenes, formatos, base, concurrencia=None):
+        llamadas.append((ruc, clave, periodos, tipos))
+        return {"reporte_lote": "lote.xlsx", "resultados": [
+            {"origen": "Recibidos", "anio": a, "mes": m, "tipo": t, "destino": "x",
+             "estado": "error" if t == "Retenciones" else "ok", "n_xml": 2}
+            for a, m in periodos for t in tipos
+        ]}
+
+    resultado = consola.ejecutar_ruc(trabajo, _lote)
+
+    assert llamadas == [(RUC, "clave", [(2024, 1), (2024, 2)], ["Facturas", "Retenciones"])]
+    assert len(resultado["corridas"]) == 4
+    assert resultado["estado"] == "parcial"
+    assert resultado["reporte_lote"] == "lote.xlsx"
+
+
+def test_ruc_sin_login_falla_entero(monkeypatch):
+    monkeypatch.setenv(f"SRI_CLAVE_{RUC}", "clave")
+    trabajo, = consola.cargar_trabajos({"rucs": [RUC]})
+
+    def _sin_login(*args, **kwargs):
+        raise RuntimeError("No se pudo iniciar sesión")
+
+    resultado = consola.ejecutar_ruc(trabajo, _sin_login)
+    assert resultado["estado"] == "error"
+    assert "iniciar sesión" in resultado["error"]
@@ -0,0 +1,79 @@
+# =====================================================
+# 🧪 EMPAQUETADOR: ZIP INCREMENTAL Y RECONSTRUCCIÓN
+# =====================================================
+
+import os
+import zipfile
+
+from robot.empaquetador import EmpaquetadorZip, Empaquetadores
+
+
+def _carpeta(tmp_path):
+    carpeta = tmp_path / "01"
+    (carpeta / "XML").mkdir(parents=True)
+    (carpeta / "PDF").mkdir()
+    (carpeta / "XML" / "a.xml").write_text("<factura>a</factura>" * 50)
+    (carpeta / "XML" / "b.xml").write_text("<factura>b</factura>" * 50)
+    (carpeta / "PDF" / "a.pdf").write_bytes(b"%PDF-1.4 a")
+    (carpeta / "manifiesto.jsonl").write_text("{}")
+    (carpeta / ".sesion").write_text("oculto")
+    return carpeta
+
+
+def _contenido(ruta_zip) -> dict:
+    with zipfile.ZipFile(ruta_zip) as zf:
+        assert zf.testzip() is None
+        return {i.filename: zf.read(i) for i in zf.infolist()}
+
+
+def test_agrega_archivos_a_medida_que_llegan(tmp_path):
+    carpeta = _carpeta(tmp_path)
+    zips = Empaquetadores()
+    for ruta in ("XML/a.xml", "PDF/a.pdf", "manifiesto.jsonl", ".sesion"):
+        zips(carpeta, carpeta / ruta)
+    zips(carpeta, tmp_path / "fuera.xml")                    # fuera de la carpeta: se ignora
+    ruta_zip = zips.cerrar(carpeta)
+
+    assert ruta_zip == tmp_path / "01.zip"
+    assert set(_contenido(ruta_zip)) == {"XML/a.xml", "XML/b.xml", "PDF/a.pdf"}
+    with zipfile.ZipFile(ruta_zip) as zf:
+        assert zf.getinfo("PDF/a.pdf").compress_type == zipfile.ZIP_STORED
+        assert zf.getinfo("XML/a.xml").compress_type == zipfile.ZIP_DEFLATED
+
+
+def test_reconstruye_sin_lo_modificado_ni_lo_borrado(tmp_path):
+    carpeta = _carpeta(tmp_path)
+    EmpaquetadorZip(carpeta).cerrar()
+
+    (carpeta / "XML" / "a.xml").write_text("<factura>nueva</factura>")
+    os.utime(carpeta / "XML" / "a.xml", (1_700_000_000, 1_700_000_000))
+    (carpeta / "XML" / "b.xml").unlink()
+    (carpeta / "reporte.xlsx").write_bytes(b"PK excel")
+    ruta_zip = EmpaquetadorZip(carpeta).cerrar()
+
+    contenido = _contenido(ruta_zip)
+    assert set(contenido) == {"XML/a.xml", "PDF/a.pdf", "reporte.xlsx"}
+    assert contenido["XML/a.xml"] == b"<factura>nueva</factura>"
+    assert not (tmp_path / "01.zip.tmp").exists()
+
+
+def test_reemplaza_una_entrada_al_agregarla_de_nuevo(tmp_path):
+    carpeta = _carpeta(tmp_path)
+    zip_ = EmpaquetadorZip(carpeta)
+    zip_.agregar(carpeta / "XML" / "a.xml")
+    zip_.agregar(carpeta / "XML" / "b.xml")
+    (carpeta / "XML" / "a.xml").write_text("<factura>otra</factura>")
+    zip_.agregar(carpeta / "XML" / "a.xml")
+    zip_.liberar()
+
+    with zipfile.ZipFile(zip_.ruta_zip) as zf:
+        nombres = [i.filename for i in zf.infolist()]
+    assert sorted(nombres) == ["XML/a.xml", "XML/b.xml"]      # sin entradas duplicadas
+    assert _contenido(zip_.ruta_zip)["XML/a.xml"] == b"<factura>otra</factura>"
+
+
+def test_zip_danado_se_vuelve_a_generar(tmp_path):
+    carpeta = _carpeta(tmp_path)
+    (tmp_path / "01.zip").write_bytes(b"PK\x03\x04 a medio escribir")
+    ruta_zip = EmpaquetadorZip(carpeta).cerrar()
+    assert set(_contenido(ruta_zip)) == {"XML/a.xml", "XML/b.xml", "PDF/a.pdf"}
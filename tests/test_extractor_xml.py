@@ -0,0 +1,60 @@
+# =====================================================
+# 🧪 EXTRACTOR XML: VARIANTES DE COMPROBANTES DEL SRI
+# =====================================================
+
+import pytest
+
+from benchmarks.corpus import comprobantes, xml_comprobante
+from robot.extractor_xml import extraer
+
+RUC_RECEPTOR = "1790012345001"
+
+
+def _primero(cod_doc: str) -> dict:
+    return next(c for c in comprobantes(200, ruc_receptor=RUC_RECEPTOR) if c["codDoc"] == cod_doc)
+
+
+def _escribir(tmp_path, c: dict, variante: str):
+    ruta = tmp_path / f"{c['clave']}_{variante}.xml"
+    ruta.write_text(xml_comprobante(c, RUC_RECEPTOR, variante), encoding="utf-8")
+    return ruta
+
+
+@pytest.mark.parametrize("variante", ["plano", "namespace", "autorizacion"])
+def test_factura_en_todas_sus_variantes(tmp_path, variante):
+    c = _primero("01")
+    fila = extraer(_escribir(tmp_path, c, variante))
+
+    assert "error" not in fila
+    assert fila["claveAcceso"] == c["clave"]
+    assert fila["tipoDocumento"] == "01"
+    assert fila["rucEmisor"] == c["ruc"]
+    assert fila["rucReceptor"] == RUC_RECEPTOR
+    assert fila["fechaEmision"] == f"{c['fecha']:%d/%m/%Y}"
+    assert fila["numero"] == f"{c['serie'][:3]}-{c['serie'][3:]}-{c['secuencial']:09d}"
+    assert (fila["subtotal"], fila["iva"], fila["total"]) == (c["subtotal"], c["iva"], c["total"])
+    assert len(fila["detalles"]) == len(c["detalles"])
+    if variante == "autorizacion":
+        assert fila["numeroAutorizacion"] == c["clave"]
+        assert fila["fechaAutorizacion"].startswith(f"{c['fecha']:%Y-%m-%d}")
+
+
+def test_retencion_suma_lo_retenido(tmp_path):
+    c = _primero("07")
+    fila = extraer(_escribir(tmp_path, c, "plano"))
+
+    assert fila["tipoDocumento"] == "07"
+    assert len(fila["retenciones"]) == 2
+    esperado = float(f"{c['subtotal'] * 0.0175:.2f}") + float(f"{c['iva'] * 0.3:.2f}")
+    assert fila["retenido"] == pytest.approx(esperado)
+
+
+def test_archivo_danado_devuelve_error(tmp_path):
+    fila = extraer(_escribir(tmp_path, _primero("01"), "danado"))
+    assert fila["error"].startswith("Error leyendo")
+
+
+def test_raiz_desconocida_devuelve_error(tmp_path):
+    ruta = tmp_path / "otro.xml"
+    ruta.write_text("<?xml version='1.0'?><pedido><numero>1</numero></pedido>", encoding="utf-8")
+    assert "no reconocido" in extraer(ruta)["error"]
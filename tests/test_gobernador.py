@@ -0,0 +1,124 @@
+# =====================================================
+# 🧪 GOBERNADOR: CUBETA ADAPTATIVA, DISYUNTOR Y REINTENTOS
+# =====================================================
+
+import threading
+import time
+
+import pytest
+
+from robot.gobernador import CubetaAdaptativa, Disyuntor, ErrorDefinitivo, Gobernador, PortalNoDisponible
+
+
+# ---------- Cubeta ----------
+def test_cubeta_respeta_el_ritmo():
+    cubeta = CubetaAdaptativa(tasa=20, minima=1, maxima=20)
+    inicio = time.monotonic()
+    for _ in range(6):
+        cubeta.tomar()
+    # Una ficha al arrancar; las otras cinco llegan a 20 por segundo
+    assert time.monotonic() - inicio >= 0.2
+
+
+def test_cubeta_sube_con_aciertos_y_baja_con_fallos():
+    cubeta = CubetaAdaptativa(tasa=4, minima=1, maxima=5)
+    for _ in range(50):
+        cubeta.exito(0.05)
+    assert cubeta.tasa == 5                      # no pasa del máximo
+
+    cubeta.fallo()
+    assert cubeta.tasa == pytest.approx(3.5)
+    for _ in range(20):
+        cubeta.fallo()
+    assert cubeta.tasa == 1                      # ni baja del mínimo
+
+
+def test_cubeta_frena_si_la_latencia_crece():
+    cubeta = CubetaAdaptativa(tasa=10, minima=1, maxima=20)
+    for _ in range(10):
+        cubeta.exito(0.2)
+    antes = cubeta.tasa
+    for _ in range(5):
+        cubeta.exito(3.0)
+    assert cubeta.tasa < antes
+
+
+# ---------- Disyuntor ----------
+def test_disyuntor_se_abre_tras_el_umbral():
+    d = Disyuntor(umbral=3, pausa=0.05, max_aperturas=3)
+    assert not d.fallo() and not d.fallo()
+    assert d.estado == "cerrado"
+    assert d.fallo()
+    assert d.estado == "abierto"
+
+    inicio = time.monotonic()
+    d.esperar()                                  # espera la pausa y pasa como prueba
+    assert time.monotonic() - inicio >= 0.04
+    assert d.estado == "semiabierto"
+    d.exito()
+    assert d.estado == "cerrado"
+
+
+def test_disyuntor_deja_pasar_una_sola_prueba():
+    d = Disyuntor(umbral=1, pausa=0.01, max_aperturas=3)
+    d.fallo()
+    d.esperar()                                  # esta es la prueba
+    pasaron = []
+    hilo = threading.Thread(target=lambda: (d.esperar(), pasaron.append(True)))
+    hilo.start()
+    time.sleep(0.1)
+    assert not pasaron                           # los demás esperan el resultado
+    d.exito()
+    hilo.join(1)
+    assert pasaron
+
+
+def test_disyuntor_da_el_host_por_caido():
+    d = Disyuntor(umbral=1, pausa=0.01, max_aperturas=2)
+    d.fallo()
+    d.esperar()
+    assert d.fallo()                             # falla la prueba: se reabre con el doble de pausa
+    assert d.aperturas == 2
+    with pytest.raises(PortalNoDisponible):
+        d.esperar()
+
+
+# ---------- Gobernador ----------
+def _gobernador(monkeypatch, reintentos=2) -> Gobernador:
+    g = Gobernador("sri.test", reintentos=reintentos, tasa=1000, tasa_max=1000)
+    monkeypatch.setattr(g, "espera", lambda intento: 0)
+    return g
+
+
+def test_reintenta_hasta_que_sale_bien(monkeypatch):
+    g = _gobernador(monkeypatch)
+    intentos = []
+
+    def _inestable():
+        intentos.append(1)
+        if len(intentos) < 3:
+            raise ConnectionError("caída")
+        return "ok"
+
+    assert g.ejecutar(_inestable) == "ok"
+    assert len(intentos) == 3
+    assert g.disyuntor.estado == "cerrado"
+
+
+def test_relanza_el_ultimo_error(monkeypatch):
+    g = _gobernador(monkeypatch, reintentos=1)
+    with pytest.raises(ConnectionError):
+        g.ejecutar(lambda: (_ for _ in ()).throw(ConnectionError("caída")))
+
+
+def test_error_definitivo_no_se_reintenta(monkeypatch):
+    g = _gobernador(monkeypatch)
+    intentos = []
+
+    def _definitivo():
+        intentos.append(1)
+        raise ErrorDefinitivo("falta el botón")
+
+    with pytest.raises(ErrorDefinitivo):
+        g.ejecutar(_definitivo)
+    assert len(intentos) == 1
@@ -0,0 +1,33 @@
+# =====================================================
+# 🧪 MANIFIESTO: VALIDACIÓN DE CONTENIDO DESCARGADO
+# =====================================================
+
+import pytest
+
+from robot.manifiesto import _contenido_valido
+
+XML_OK = b'<?xml version="1.0" encoding="UTF-8"?><factura><infoTributaria/></factura>'
+
+
+@pytest.mark.parametrize("formato, data", [
+    ("XML", XML_OK),
+    ("XML", b"\xef\xbb\xbf" + XML_OK),                        # con BOM
+    ("XML", b"\r\n  <factura/>"),                            # espacios antes, sin declaración
+    ("PDF", b"%PDF-1.4\n%%EOF"),
+])
+def test_contenido_valido(formato, data):
+    assert _contenido_valido(formato, data)
+
+
+@pytest.mark.parametrize("formato, data", [
+    ("XML", b"<!DOCTYPE html><html><body>Error</body></html>"),
+    ("XML", b"<html><body>Sesi\xc3\xb3n expirada</body></html>"),
+    ("XML", b'<?xml version="1.0"?><html><body/></html>'),
+    ("XML", XML_OK[:40]),                                    # truncado
+    ("XML", b"Service Unavailable"),
+    ("XML", b""),
+    ("PDF", b"<html>no es un PDF</html>"),
+    ("PDF", b""),
+])
+def test_contenido_invalido(formato, data):
+    assert not _contenido_valido(formato, data)
@@ -0,0 +1,97 @@
+# =====================================================
+# 🧪 PARSER: MISMOS VALORES Y ORDEN QUE EL LECTOR ORIGINAL
+# =====================================================
+
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import pandas as pd
+
+from benchmarks.corpus import generar_xmls
+from robot import indice, parser
+from robot.extractor_xml import extraer
+
+
+def _leer_xml_original(xml_path: Path) -> dict:
+    """Lector de la primera versión de parser.py (ElementTree), como referencia."""
+    d = {"archivo": xml_path.name}
+    try:
+        root = ET.parse(xml_path).getroot()
+        ns = {"ns": root.tag.split("}")[0].strip("{")} if "}" in root.tag else {}
+
+        def _texto(campo):
+            return root.findtext(f".//ns:{campo}", default="", namespaces=ns).strip()
+
+        def _num(val):
+            try:
+                return float(val.replace(",", "").strip()) if val else 0.0
+            except Exception:
+                return 0.0
+
+        d["fechaEmision"] = _texto("fechaEmision")
+        d["rucEmisor"] = _texto("ruc")
+        d["razonSocial"] = _texto("razonSocial")
+        d["rucReceptor"] = _texto("identificacionComprador")
+        d["razonSocialReceptor"] = _texto("razonSocialComprador")
+        d["claveAcceso"] = _texto("claveAcceso")
+        d["tipoDocumento"] = _texto("codDoc")
+        d["subtotal"] = _num(root.findtext(".//ns:totalSinImpuestos", default="0", namespaces=ns))
+        d["total"] = _num(root.findtext(".//ns:importeTotal", default="0", namespaces=ns))
+        d["iva"] = 0.0
+        for imp in root.findall(".//ns:totalImpuesto", namespaces=ns):
+            if imp.findtext("ns:codigo", default="", namespaces=ns) == "2":
+                d["iva"] += _num(imp.findtext("ns:valor", default="0", namespaces=ns))
+    except Exception as e:
+        d["error"] = f"Error leyendo {xml_path.name}: {e}"
+    return d
+
+
+def test_facturas_mismos_valores_que_el_lector_original(tmp_path):
+    # El lector original solo entendía XML con espacio de nombres; ahí debe coincidir exacto
+    generar_xmls(tmp_path, 300)
+    comparadas = 0
+    for xml in sorted(tmp_path.glob("*.xml")):
+        original = _leer_xml_original(xml)
+        if "error" in original or original["tipoDocumento"] != "01":
+            continue
+        nueva = extraer(xml)
+        assert {k: nueva[k] for k in original} == original, xml.name
+        comparadas += 1
+    assert comparadas > 0
+
+
+def test_deduplicar_conserva_el_orden(tmp_path):
+    filas = [
+        {"claveAcceso": "A", "error": "dañado", "n": 0},
+        {"claveAcceso": "B", "n": 1},
+        {"claveAcceso": "A", "n": 2},
+        {"claveAcceso": "", "n": 3},
+        {"claveAcceso": "", "n": 4},
+        {"claveAcceso": "B", "n": 5},
+    ]
+    unicas, duplicados = parser._deduplicar(filas, tmp_path)
+    # De A se queda la fila sin error; las demás no cambian de lugar
+    assert [f["n"] for f in unicas] == [1, 2, 3, 4]
+    assert duplicados["n"].tolist() == [0, 5]
+    assert set(duplicados["motivo"]) == {"repetido en esta carpeta"}
+
+
+def test_deduplicar_quita_lo_que_el_indice_tiene_en_otra_carpeta(tmp_path):
+    otra = tmp_path / "1790012345001" / "2024" / "01"
+    esta = tmp_path / "1790012345001" / "2024" / "02"
+    (otra / "XML").mkdir(parents=True)
+    (esta / "XML").mkdir(parents=True)
+    (otra / "XML" / "A.xml").write_text("<a/>")
+    indice.registrar_existentes(otra, [{"clave": "A", "formato": "XML", "ruta": otra / "XML" / "A.xml"}])
+
+    unicas, duplicados = parser._deduplicar([{"claveAcceso": "A"}, {"claveAcceso": "B"}], esta / "XML")
+    assert [f["claveAcceso"] for f in unicas] == ["B"]
+    assert duplicados["motivo"].tolist() == ["ya está en 1790012345001/2024/01"]
+
+
+def test_reporte_igual_con_y_sin_cache(tmp_path):
+    carpeta = tmp_path / "XML"
+    generar_xmls(carpeta, 40)
+    frio = parser.construir_reporte(carpeta, tmp_path / "a.xlsx")
+    caliente = parser.construir_reporte(carpeta, tmp_path / "b.xlsx")
+    pd.testing.assert_frame_equal(frio, caliente)
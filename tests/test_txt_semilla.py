@@ -0,0 +1,54 @@
+# =====================================================
+# 🧪 TXT SEMILLA: FORMATO, BLOQUES E IMPORTES
+# =====================================================
+
+import pytest
+
+from benchmarks.corpus import COLUMNAS_TXT, comprobantes, generar_txt
+from robot import txt_semilla
+
+
+@pytest.mark.parametrize("encoding", ["utf-8", "latin-1"])
+def test_lee_el_reporte_del_portal(tmp_path, encoding):
+    ruta = generar_txt(tmp_path / "recibidos.txt", 120, encoding=encoding)
+    esperados = list(comprobantes(120))
+
+    df = txt_semilla.leer_txt(ruta)
+
+    assert list(df.columns) == list(txt_semilla.COLUMNAS)
+    assert df["clave"].tolist() == [c["clave"] for c in esperados]
+    assert df["total"].tolist() == [c["total"] for c in esperados]
+    assert df["razonSocialEmisor"].tolist() == [c["razonSocial"] for c in esperados]
+
+
+def test_bloques_pequenos_dan_lo_mismo_que_uno_solo(tmp_path):
+    ruta = generar_txt(tmp_path / "recibidos.txt", 300)
+    claves = [f["clave"] for f in txt_semilla.iterar_claves(ruta, tamano=2048)]
+    assert claves == txt_semilla.leer_txt(ruta)["clave"].tolist()
+
+
+def test_importes_y_filas_invalidas(tmp_path):
+    c = next(comprobantes(1))
+    fila = ["Factura", "001-001-000000001", c["ruc"], "Emisor", "05/01/2024", "05/01/2024 10:00:00",
+            "NORMAL", "1790012345001"]
+    lineas = [
+        "\t".join(COLUMNAS_TXT),
+        "\t".join(fila + [c["clave"], c["clave"], "1,234.56"]),
+        "\t".join(fila + [c["clave"][:-1] + "0", "", "12,50"]),
+        "\t".join(fila + ["123", "123", "9.99"]),                 # clave corta: se descarta
+        "\t".join(fila[:4] + ["fecha?"] + fila[5:] + [c["clave"][:-2] + "00", "", "abc"]),
+    ]
+    ruta = tmp_path / "recibidos.txt"
+    ruta.write_text("\r\n".join(lineas) + "\r\n", encoding="utf-8")
+
+    df = txt_semilla.leer_txt(ruta)
+
+    assert len(df) == 3
+    assert df["total"].tolist() == [1234.56, 12.5, 0.0]
+    assert df["fecha"].tolist() == ["05/01/2024", "05/01/2024", ""]
+
+
+def test_sin_filas(tmp_path):
+    ruta = tmp_path / "vacio.txt"
+    ruta.write_text("\t".join(COLUMNAS_TXT) + "\r\n", encoding="utf-8")
+    assert txt_semilla.leer_txt(ruta).empty